@@ -1,28 +1,11 @@
+# Remplacé par scripts/preprocess.py (lecture parallèle des feuilles, sortie CSV Airbyte / CSV / Parquet,
+# feuilles inchangées ignorées) ; conservé comme point d'entrée historique.
 import os
-import pandas as pd
+import sys
 
-def convert_date(sheet_name):
-    if len(sheet_name) == 6 and sheet_name.isdigit():
-        day = sheet_name[:2]
-        month = sheet_name[2:4]
-        year = '20' + sheet_name[4:]
-        return f"{year}-{month}-{day}"
-    return None
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
 
-data_dir = "data"
-for filename in os.listdir(data_dir):
-    if filename.endswith(".xlsx") and ("Weather" in filename):
-        file_path = os.path.join(data_dir, filename)
-        xls = pd.ExcelFile(file_path)
-        writer = pd.ExcelWriter(file_path.replace(".xlsx", "_with_date.xlsx"), engine="openpyxl")
-        for sheet in xls.sheet_names:
-     
-            date_str = convert_date(sheet)
-            df = pd.read_excel(xls, sheet_name=sheet)
-            if date_str and 'Time' in df.columns:
+from preprocess import main
 
-                df['Time'] = date_str + ' ' + df['Time'].astype(str)
-                print(f"  Feuille '{sheet}' -> Date: {date_str}")
-            df.to_excel(writer, sheet_name=sheet, index=False)
-        writer.close()
-        print(f"{file_path.replace('.xlsx', '_with_date.xlsx')} créé avec la date+heure spécifique à chaque feuille.")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -3,19 +3,53 @@
 from . import config
 from . import database
 from . import utils
+from . import storage
+from . import units
+from . import decoders
 from . import normalizer
+from . import metrics
+from . import batch_writer
+from . import weather_store
+from . import geo
+from . import readers
+from . import s3_listing
 from . import station_manager
+from . import sync_manifest
+from . import staging_cache
+from . import sync_events
+from . import rollups
 from . import importer
+from . import parallel_import
+from . import preprocess
+from . import async_importer
 from . import analyzer
+from . import interpolation
 from . import main
 
 __all__ = [
     'config',
     'database', 
     'utils',
+    'storage',
+    'units',
+    'decoders',
     'normalizer',
+    'metrics',
+    'batch_writer',
+    'weather_store',
+    'geo',
+    'readers',
+    's3_listing',
     'station_manager',
+    'sync_manifest',
+    'staging_cache',
+    'sync_events',
+    'rollups',
     'importer',
+    'parallel_import',
+    'preprocess',
+    'async_importer',
     'analyzer',
+    'interpolation',
     'main'
 ]
@@ -1,128 +1,162 @@
 import time
+from dataclasses import dataclass, field, asdict
 from database import db_connector
+from weather_store import weather_collection, reading_stages
+
+# Champs critiques contrôlés sur les collections (nom du rapport -> chemin MongoDB)
+STATION_FIELDS = {
+    "id": ["$id"],
+    "name": ["$name"],
+    "coordinates": ["$latitude", "$longitude"]
+}
+# Champs des mesures à plat (reading_stages), quel que soit le mode de stockage
+WEATHER_FIELDS = {
+    "station_id": ["$station_id"],
+    "dh_utc": ["$dh_utc"],
+    "temperature": ["$temperature"],
+    "pressure": ["$pressure"],
+    "humidity": ["$humidity"]
+}
+
+def _mean(rollup, name):
+    """Moyenne d'une grandeur d'un agrégat (somme / nombre de valeurs)."""
+    count = rollup.get(f"{name}_count")
+    return rollup[f"{name}_sum"] / count if count else None
+
+def _null_counters(fields):
+    """Accumulateurs $group comptant les documents dont un des chemins est absent, null ou vide."""
+    return {
+        name: {"$sum": {"$cond": [
+            {"$or": [{"$in": [{"$ifNull": [path, None]}, [None, ""]]} for path in paths]},
+            1, 0
+        ]}}
+        for name, paths in fields.items()
+    }
+
+@dataclass
+class QualityReport:
+    """Résultat structuré de la mesure de qualité des données."""
+    total_stations: int = 0
+    total_weather: int = 0
+    station_types: list = field(default_factory=list)
+    weather_underground_stations: list = field(default_factory=list)
+    station_nulls: dict = field(default_factory=dict)
+    weather_nulls: dict = field(default_factory=dict)
+    sources: list = field(default_factory=list)
+    
+    def station_null_ratio(self, name):
+        """Part des stations sans le champ `name` (0 à 1)."""
+        return self.station_nulls.get(name, 0) / self.total_stations if self.total_stations else 0
+    
+    def weather_null_ratio(self, name):
+        """Part des mesures sans le champ `name` (0 à 1)."""
+        return self.weather_nulls.get(name, 0) / self.total_weather if self.total_weather else 0
+    
+    @property
+    def error_rate(self):
+        """Taux d'erreur global (%) sur les champs critiques des mesures."""
+        if self.total_weather == 0:
+            return 0
+        total_fields_checked = self.total_weather * len(WEATHER_FIELDS)
+        return sum(self.weather_nulls.values()) / total_fields_checked * 100
+    
+    def to_dict(self):
+        """Représentation dictionnaire du rapport (avec le taux d'erreur)."""
+        report = asdict(self)
+        report["error_rate"] = self.error_rate
+        return report
 
 class DataQualityAnalyzer:
     """Analyseur de qualité des données météorologiques."""
     
-    def __init__(self):
-        self.db = db_connector.get_database()
+    def __init__(self, connector=None):
+        connector = connector or db_connector
+        self.db = connector.get_database()
+        self.stations = connector.get_station_registry()
     
     def measure_data_quality(self):
         """Mesure la qualité des données après migration."""
-        print("\n____MESURE DE QUALITÉ DES DONNÉES____")
-        print("=" * 50)
-        
-        # Comptage général
-        total_stations = self.db['stations'].count_documents({})
-        total_weather = self.db['weather'].count_documents({})
-        print(f"=> Total stations : {total_stations}")
-        print(f"=> Total mesures météo : {total_weather}")
-        
-        # Répartition des stations par type/source
-        self._analyze_station_types()
-        
-        # Lister les stations Weather Underground
-        self._list_weather_underground_stations()
-        
-        # Qualité des stations
-        self._analyze_station_quality(total_stations)
-        
-        # Qualité des données météo
-        self._analyze_weather_quality(total_weather)
-        
-        # Répartition par source
-        self._analyze_sources()
-        
-        # Calcul du taux d'erreur global
-        error_rate = self._calculate_error_rate(total_weather)
-        
-        return {
-            "total_stations": total_stations,
-            "total_weather": total_weather,
-            "error_rate": error_rate
-        }
+        report = self.compute_quality_report()
+        self.print_quality_report(report)
+        return report
     
-    def _analyze_station_types(self):
-        """Analyse les types de stations."""
-        print(f"\n____RÉPARTITION DES STATIONS :____")
-        station_types = self.db['stations'].aggregate([
-            {"$group": {"_id": "$type", "count": {"$sum": 1}}},
+    def compute_quality_report(self):
+        """Calcule le rapport de qualité : une seule agrégation (un seul scan) par collection."""
+        report = QualityReport()
+        
+        # Stations : types, champs manquants et liste Weather Underground en une passe
+        stations = next(self.db['stations'].aggregate([
+            {"$facet": {
+                "types": [
+                    {"$group": {"_id": "$type", "count": {"$sum": 1}, **_null_counters(STATION_FIELDS)}},
+                    {"$sort": {"count": -1}}
+                ],
+                "weather_underground": [
+                    {"$match": {"type": "weather_underground"}},
+                    {"$project": {"_id": 0, "id": 1, "name": 1, "city": 1}}
+                ]
+            }}
+        ]), {"types": [], "weather_underground": []})
+        for group in stations["types"]:
+            report.total_stations += group["count"]
+            report.station_types.append((group["_id"], group["count"]))
+            for name in STATION_FIELDS:
+                report.station_nulls[name] = report.station_nulls.get(name, 0) + group[name]
+        report.weather_underground_stations = stations["weather_underground"]
+        
+        # Mesures : un $group par fichier source porte les totaux et les champs manquants
+        sources = self.db[weather_collection()].aggregate(reading_stages() + [
+            {"$group": {"_id": "$source_file", "count": {"$sum": 1}, **_null_counters(WEATHER_FIELDS)}},
             {"$sort": {"count": -1}}
         ])
-        for station_type in station_types:
-            type_name = station_type['_id'] if station_type['_id'] else "Unknown"
-            print(f"Type {type_name} : {station_type['count']} stations")
+        for group in sources:
+            report.total_weather += group["count"]
+            report.sources.append({
+                "source_file": group["_id"],
+                "count": group["count"],
+                "nulls": {name: group[name] for name in WEATHER_FIELDS}
+            })
+            for name in WEATHER_FIELDS:
+                report.weather_nulls[name] = report.weather_nulls.get(name, 0) + group[name]
+        
+        return report
     
-    def _list_weather_underground_stations(self):
-        """Liste les stations Weather Underground."""
-        weather_stations = list(self.db['stations'].find(
-            {"type": "weather_underground"}, 
-            {"id": 1, "name": 1, "city": 1}
-        ))
-        if weather_stations:
+    def print_quality_report(self, report):
+        """Affiche le rapport de qualité."""
+        print("\n____MESURE DE QUALITÉ DES DONNÉES____")
+        print("=" * 50)
+        print(f"=> Total stations : {report.total_stations}")
+        print(f"=> Total mesures météo : {report.total_weather}")
+        
+        print(f"\n____RÉPARTITION DES STATIONS :____")
+        for type_name, count in report.station_types:
+            print(f"Type {type_name if type_name else 'Unknown'} : {count} stations")
+        
+        if report.weather_underground_stations:
             print(f"\n____STATIONS WEATHER UNDERGROUND :____")
-            for ws in weather_stations:
+            for ws in report.weather_underground_stations:
                 print(f"{ws.get('name', 'Unknown')} ({ws.get('id', 'Unknown')}) - {ws.get('city', 'Unknown')}")
-    
-    def _analyze_station_quality(self, total_stations):
-        """Analyse la qualité des données de stations."""
-        stations_without_id = self.db['stations'].count_documents({"id": {"$in": [None, ""]}})
-        stations_without_name = self.db['stations'].count_documents({"name": {"$in": [None, ""]}})
-        stations_without_coords = self.db['stations'].count_documents({
-            "$or": [
-                {"latitude": {"$in": [None, ""]}},
-                {"longitude": {"$in": [None, ""]}}
-            ]
-        })
         
         print(f"\n____QUALITÉ DES STATIONS :____")
-        if total_stations > 0:
-            print(f"  => Sans ID : {stations_without_id} ({stations_without_id/total_stations*100:.1f}%)")
-            print(f"  => Sans nom : {stations_without_name} ({stations_without_name/total_stations*100:.1f}%)")
-            print(f"  => Sans coordonnées : {stations_without_coords} ({stations_without_coords/total_stations*100:.1f}%)")
-    
-    def _analyze_weather_quality(self, total_weather):
-        """Analyse la qualité des données météorologiques."""
-        weather_without_station = self.db['weather'].count_documents({"station_id": {"$in": [None, ""]}})
-        weather_without_date = self.db['weather'].count_documents({"dh_utc": {"$in": [None, ""]}})
-        weather_without_temp = self.db['weather'].count_documents({"measurements.temperature.value": {"$in": [None, ""]}})
-        weather_without_pressure = self.db['weather'].count_documents({"measurements.pressure.value": {"$in": [None, ""]}})
-        weather_without_humidity = self.db['weather'].count_documents({"measurements.humidity.value": {"$in": [None, ""]}})
+        if report.total_stations > 0:
+            for name, label in (("id", "Sans ID"), ("name", "Sans nom"), ("coordinates", "Sans coordonnées")):
+                print(f"  => {label} : {report.station_nulls[name]} ({report.station_null_ratio(name)*100:.1f}%)")
         
         print(f"\n____QUALITÉ DES DONNÉES MÉTÉO :____")
-        if total_weather > 0:
-            print(f"  => Sans station_id : {weather_without_station} ({weather_without_station/total_weather*100:.1f}%)")
-            print(f"  => Sans date : {weather_without_date} ({weather_without_date/total_weather*100:.1f}%)")
-            print(f"  => Sans température : {weather_without_temp} ({weather_without_temp/total_weather*100:.1f}%)")
-            print(f"  => Sans pression : {weather_without_pressure} ({weather_without_pressure/total_weather*100:.1f}%)")
-            print(f"  => Sans humidité : {weather_without_humidity} ({weather_without_humidity/total_weather*100:.1f}%)")
-    
-    def _analyze_sources(self):
-        """Analyse la répartition par source."""
+        if report.total_weather > 0:
+            for name, label in (("station_id", "Sans station_id"), ("dh_utc", "Sans date"),
+                                ("temperature", "Sans température"), ("pressure", "Sans pression"),
+                                ("humidity", "Sans humidité")):
+                print(f"  => {label} : {report.weather_nulls[name]} ({report.weather_null_ratio(name)*100:.1f}%)")
+        
         print(f"\n____RÉPARTITION PAR SOURCE :____")
-        sources = self.db['weather'].aggregate([
-            {"$group": {"_id": "$metadata.source_file", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}}
-        ])
-        for source in sources:
-            file_name = source['_id'].split('/')[-1] if source['_id'] else "Unknown"
+        for source in report.sources:
+            file_name = source["source_file"].split('/')[-1] if source["source_file"] else "Unknown"
             print(f"  -> {file_name} : {source['count']} mesures")
-    
-    def _calculate_error_rate(self, total_weather):
-        """Calcule le taux d'erreur global."""
-        if total_weather == 0:
-            return 0
-        
-        weather_without_station = self.db['weather'].count_documents({"station_id": {"$in": [None, ""]}})
-        weather_without_date = self.db['weather'].count_documents({"dh_utc": {"$in": [None, ""]}})
-        weather_without_temp = self.db['weather'].count_documents({"measurements.temperature.value": {"$in": [None, ""]}})
-        weather_without_pressure = self.db['weather'].count_documents({"measurements.pressure.value": {"$in": [None, ""]}})
-        weather_without_humidity = self.db['weather'].count_documents({"measurements.humidity.value": {"$in": [None, ""]}})
-        
-        total_fields_checked = total_weather * 5  # 5 champs critiques
-        total_errors = weather_without_station + weather_without_date + weather_without_temp + weather_without_pressure + weather_without_humidity
-        error_rate = (total_errors / total_fields_checked) * 100
         
+        if report.total_weather == 0:
+            return
+        error_rate = report.error_rate
         print(f"\n____AUX D'ERREUR GLOBAL : {error_rate:.2f}%____")
         
         if error_rate < 5:
@@ -131,39 +165,51 @@ class DataQualityAnalyzer:
             print("---Qualité des données acceptable---")
         else:
             print("---Qualité des données à améliorer---")
-        
-        return error_rate
     
-    def benchmark_weather_query(self, station_id, date_str):
-        """Mesure le temps d'accès aux données météo pour une station et une date."""
-        start = time.time()
-        result = list(self.db['weather'].find({
-            "station_id": station_id,
-            "dh_utc": {"$regex": date_str}
-        }))
-        duration = (time.time() - start) * 1000  # ms
-        print(f"- Temps de requête pour {station_id} le {date_str} : {duration:.2f} ms ({len(result)} résultats)")
-        return duration
+    def get_daily_stats(self, station_id, start=None, end=None):
+        """Statistiques journalières d'une station lues dans l'agrégat weather_daily."""
+        query = {"station_id": station_id}
+        if start or end:
+            query["period"] = {}
+            if start:
+                query["period"]["$gte"] = start
+            if end:
+                query["period"]["$lt"] = end
+        
+        stats = []
+        for day in self.db['weather_daily'].find(query).sort("period", 1):
+            stats.append({
+                "date": day["period"],
+                "samples": day["samples"],
+                "temperature_min": day.get("temperature_min"),
+                "temperature_max": day.get("temperature_max"),
+                "temperature_mean": _mean(day, "temperature"),
+                "pressure_mean": _mean(day, "pressure"),
+                "humidity_mean": _mean(day, "humidity"),
+                "precipitation_total": day.get("precipitation_total", 0),
+                "gust_max": day.get("gust_max")
+            })
+        return stats
     
     def get_station_with_most_precipitation(self):
-        """Trouve la station avec le plus de précipitations totales."""
+        """Trouve la station avec le plus de précipitations totales (agrégat weather_daily)."""
         pipeline = [
             {"$group": {
                 "_id": "$station_id",
-                "total_precip": {"$sum": {"$ifNull": ["$measurements.precipitation.accumulation", 0]}}
+                "total_precip": {"$sum": {"$ifNull": ["$precipitation_total", 0]}}
             }},
             {"$sort": {"total_precip": -1}},
             {"$limit": 1}
         ]
 
         start = time.time()
-        result = list(self.db['weather'].aggregate(pipeline))
+        result = list(self.db['weather_daily'].aggregate(pipeline))
         duration = (time.time() - start) * 1000  # ms
         
         if result:
             station_id = result[0]['_id']
             total_precip = result[0]['total_precip']
-            station = self.db['stations'].find_one({'id': station_id})
+            station = self.stations.get(station_id)
             station_name = station['name'] if station and 'name' in station else station_id
             print(f"\nStation avec le plus de précipitations : {station_name} ({station_id})")
             print(f"=> Précipitations totales : {total_precip:.2f} mm")
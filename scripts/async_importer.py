@@ -0,0 +1,401 @@
+import asyncio
+import contextlib
+import itertools
+import os
+import signal
+import time
+from datetime import datetime
+from pymongo.errors import PyMongoError
+from database import db_connector
+from importer import WeatherDataImporter, force_log
+from batch_writer import BatchWriter
+from readers import iter_airbyte_chunks
+from storage import create_async_storage
+from station_manager import print_stations_summary
+from sync_monitor import S3SyncMonitor
+from weather_store import weather_collection
+from utils import source_type
+from metrics import metrics, StageTimer, format_stages, start_metrics_server
+from config import (
+    ASYNC_DOWNLOADS, ASYNC_WRITES, ASYNC_PARSERS, ASYNC_FILES, ASYNC_QUEUE_SIZE,
+    IMPORT_BATCH_SIZE, S3_FULL_LISTING_EVERY
+)
+
+# Fin de la production de documents d'un fichier
+_END = object()
+
+def _take(iterator, size):
+    """Lit au plus `size` éléments d'un itérateur (exécuté dans un thread)."""
+    return list(itertools.islice(iterator, size))
+
+class AsyncBatchWriter(BatchWriter):
+    """BatchWriter sur une collection asyncio (PyMongo AsyncMongoClient ou Motor).
+
+    Les lots en vol sont bornés par le sémaphore `writes`, partagé entre
+    tous les fichiers importés en parallèle. `on_written` est une coroutine.
+    """
+
+    def __init__(self, collection, writes=None, **kwargs):
+        super().__init__(collection, **kwargs)
+        self.writes = writes
+
+    async def add(self, doc, context=None):
+        self.buffer.append((doc, context))
+        if (len(self.buffer) >= self.batch_size or
+                time.monotonic() - self.last_flush >= self.flush_interval):
+            await self.flush()
+
+    async def flush(self):
+        pending = self._take()
+        if pending is None:
+            return 0
+
+        batch, batch_number = pending
+        async with self.writes or contextlib.nullcontext():
+            start = time.perf_counter()
+            try:
+                if self.upsert_key:
+                    result = await self.collection.bulk_write(self._requests(batch), ordered=False)
+                else:
+                    result = await self.collection.insert_many([doc for doc, _ in batch], ordered=False)
+                created, replaced = self._settle(batch, batch_number, start, result=result)
+            except PyMongoError as e:
+                created, replaced = self._settle(batch, batch_number, start, error=e)
+
+        if (created or replaced) and self.on_written:
+            start = time.perf_counter()
+            try:
+                await self.on_written(created, replaced)
+            except Exception as e:
+                self._callback_failed(e)
+            if self.timer is not None:
+                self.timer.add('rollups', time.perf_counter() - start)
+        return self.batches[-1]["inserted"] + self.batches[-1]["updated"]
+
+    async def close(self):
+        await self.flush()
+        return self.summary()
+
+class AsyncWeatherDataImporter:
+    """Import asyncio : téléchargement, parsing et écritures MongoDB de plusieurs fichiers en parallèle.
+
+    Chaque fichier suit un pipeline producteur/consommateur : les lots de
+    documents sont produits dans un thread (parsing pandas, décodage JSON,
+    normalisation — mêmes générateurs que l'import synchrone) et déposés
+    dans une file bornée, vidée par les écritures asynchrones. Une file
+    pleine suspend le parsing (contre-pression). Les étapes sont bornées
+    par des sémaphores : téléchargements, parsings et lots en vol.
+
+    Les appels ponctuels (manifeste, création de station) restent
+    synchrones et s'exécutent dans un thread.
+    """
+
+    def __init__(self, connector=None, importer=None, downloads=None, writes=None, parsers=None,
+                 files=None, queue_size=None, batch_size=None):
+        self.connector = connector or db_connector
+        self.importer = importer or WeatherDataImporter(self.connector)
+        self.downloads = downloads or ASYNC_DOWNLOADS
+        self.writes = writes or ASYNC_WRITES
+        self.parsers = parsers or ASYNC_PARSERS
+        self.files = files or ASYNC_FILES
+        self.queue_size = queue_size or ASYNC_QUEUE_SIZE
+        self.batch_size = batch_size or IMPORT_BATCH_SIZE
+        self.db = None
+        self.storage = None
+
+    async def start(self):
+        """Ouvre le client MongoDB asyncio et la source ; crée les sémaphores dans la boucle courante."""
+        if self.db is None:
+            if weather_collection() != 'weather':
+                raise ValueError("l'import asynchrone n'écrit que le mode WEATHER_STORAGE_MODE=documents")
+            self.db = self.connector.get_async_database(bulk=True)
+            self.storage = create_async_storage(self.connector, max_pool_connections=self.downloads)
+            self.download_slots = asyncio.Semaphore(self.downloads)
+            self.write_slots = asyncio.Semaphore(self.writes)
+            self.parse_slots = asyncio.Semaphore(self.parsers)
+            self.file_slots = asyncio.Semaphore(self.files)
+
+    async def close(self):
+        """Ferme la source et le client MongoDB asyncio."""
+        if self.storage is not None:
+            await self.storage.close()
+        await self.connector.close_async_connections()
+        self.db = None
+        self.storage = None
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def apply_rollups(self, docs, replaced=()):
+        """Applique les agrégats horaires/journaliers d'un lot via le client asyncio.
+
+        Les périodes des documents remplacés sont recalculées depuis les
+        mesures stockées (client synchrone, dans un thread).
+        """
+        rollups = self.importer.rollups
+        stale = rollups.periods(replaced)
+        for collection, updates in rollups.updates(docs, skip=stale).items():
+            await self.db[collection].bulk_write(updates, ordered=False)
+        if replaced:
+            await asyncio.to_thread(rollups.recompute, stale)
+
+    async def import_files(self, keys, s3_bucket):
+        """Importe une liste de fichiers ; au plus ASYNC_FILES fichiers en cours à la fois.
+
+        Retourne les résultats dans l'ordre des clés.
+        """
+        await self.start()
+
+        async def bounded(key):
+            async with self.file_slots:
+                return await self.import_file(key, s3_bucket)
+
+        return await asyncio.gather(*(bounded(key) for key in keys))
+
+    async def import_file(self, s3_key, s3_bucket):
+        """Importe un fichier ; même résultat que WeatherDataImporter.import_csv_to_mongo.
+
+        En cas d'annulation, le fichier reste « importing » dans le manifeste
+        et sera repris au cycle suivant (les upserts rendent la reprise
+        idempotente).
+        """
+        await self.start()
+        result = {"key": s3_key, "source": source_type(s3_key), "status": "skipped", "rows": 0,
+                  "stations": 0, "weather": 0, "failed": 0, "error": None}
+        start = time.monotonic()
+        timer = StageTimer()
+        body = None
+        marked = False
+        try:
+            async with self.download_slots:
+                fetch_start = time.perf_counter()
+                obj = await self.storage.get_object(Bucket=s3_bucket, Key=s3_key)
+                timer.add('fetch', time.perf_counter() - fetch_start)
+            body = obj['Body']
+            await asyncio.to_thread(self.importer.manifest.mark_importing,
+                                    s3_key, obj.get('ETag'), obj.get('ContentLength'))
+            marked = True
+
+            if result["source"] not in ('StationsMeteorologiques', 'WeatherBE', 'WeatherFR'):
+                print(f"  /!\  Type de fichier non reconnu: {s3_key}")
+                result["error"] = "type de fichier non reconnu"
+                return result
+
+            result.update(await self._pipeline(body, s3_key, result["source"], timer))
+            result["status"] = "imported" if result["error"] is None else "skipped"
+
+        except asyncio.CancelledError:
+            marked = False
+            raise
+        except Exception as e:
+            print(f"  /!\ Erreur lors de l'importation de {s3_key}: {e}")
+            result["status"] = "error"
+            result["error"] = str(e)
+        finally:
+            if body is not None:
+                body.close()
+            result["duration"] = time.monotonic() - start
+            result["stages"] = timer.summary()
+            if marked:
+                await asyncio.to_thread(self.importer.manifest.mark_done, result)
+                metrics.record_file(result)
+                if result["stages"]:
+                    print(f"⏱️ {s3_key}: {format_stages(result['stages'])}")
+        return result
+
+    async def _pipeline(self, body, s3_key, source, timer):
+        """Parsing (producteur, thread) et écritures (consommateur) d'un fichier reliés par une file bornée."""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        stats = {"rows": 0, "station_id": None, "error": None}
+        weather_writer = AsyncBatchWriter(self.db['weather'], writes=self.write_slots, label=f"weather {source}",
+                                          upsert_key="_id", on_written=self.apply_rollups, timer=timer)
+        stations = []
+        producer = asyncio.create_task(self._produce(body, s3_key, source, timer, stats, queue))
+        try:
+            while True:
+                batch = await queue.get()
+                if batch is _END:
+                    break
+                for collection, doc, context in batch:
+                    if collection == "stations":
+                        stations.append((doc, context))
+                    else:
+                        await weather_writer.add(doc, context)
+            await producer
+        finally:
+            if not producer.done():
+                producer.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await producer
+
+        # Stations : registre partagé avec l'import synchrone (un bulk_write des stations modifiées)
+        stations_summary = {"written": int(bool(stats["station_id"])), "failed": 0}
+        if source == 'StationsMeteorologiques':
+            with timer.stage('mongo_write'):
+                stations_summary = await asyncio.to_thread(self.importer.station_manager.registry.upsert_many, stations)
+            print_stations_summary(stations_summary)
+        weather_summary = await weather_writer.close()
+        weather_writer.print_summary()
+        return {
+            "rows": stats["rows"],
+            "stations": stations_summary['written'],
+            "weather": weather_summary['written'],
+            "failed": stations_summary['failed'] + weather_summary['failed'],
+            "error": stats["error"]
+        }
+
+    async def _produce(self, body, s3_key, source, timer, stats, queue):
+        """Produit les lots de documents d'un fichier dans un thread, au plus ASYNC_PARSERS à la fois."""
+        chunks = iter_airbyte_chunks(body, s3_key)
+
+        def documents():
+            timed_chunks = timer.timed_iter('csv_parse', chunks)
+            first_chunk = next(timed_chunks, None)
+            if first_chunk is None or '_airbyte_data' not in first_chunk.columns:
+                print(f"  /!\  Colonne '_airbyte_data' manquante dans {s3_key}")
+                stats["error"] = "colonne '_airbyte_data' manquante"
+                return
+            all_chunks = itertools.chain([first_chunk], timed_chunks)
+            if source == 'StationsMeteorologiques':
+                yield from self.importer.iter_stations_docs(all_chunks, s3_key, timer, stats)
+            else:
+                stats["station_id"] = self.importer.station_manager.create_weather_station(source, s3_key)
+                yield from self.importer.iter_weather_be_fr_docs(
+                    all_chunks, s3_key, stats["station_id"], timer, stats
+                )
+
+        generator = documents()
+        finished = False
+        try:
+            while True:
+                async with self.parse_slots:
+                    parsing = asyncio.ensure_future(asyncio.to_thread(_take, generator, self.batch_size))
+                    try:
+                        batch = await asyncio.shield(parsing)
+                    except asyncio.CancelledError:
+                        # Le thread ne s'interrompt pas : on attend la fin du lot avant de fermer le générateur
+                        await asyncio.wait([parsing])
+                        raise
+                if not batch:
+                    break
+                await queue.put(batch)
+            finished = True
+        finally:
+            generator.close()
+            chunks.close()
+            if finished:
+                await queue.put(_END)
+
+class AsyncS3SyncMonitor(S3SyncMonitor):
+    """Surveillance S3 sur une boucle asyncio : chaque cycle importe les nouveaux fichiers en parallèle.
+
+    Le listing et le manifeste réutilisent le code synchrone (dans un
+    thread). SIGINT/SIGTERM arrêtent la surveillance : l'import en cours est
+    annulé, les fichiers interrompus restent à reprendre au cycle suivant,
+    puis les clients sont fermés.
+    """
+
+    def __init__(self, s3_bucket, check_interval=600):
+        super().__init__(s3_bucket, check_interval)
+        self.async_importer = AsyncWeatherDataImporter(importer=self.importer)
+        self.stopping = None
+
+    async def sync_new_files_async(self, full_listing=False):
+        """Synchronise les nouveaux fichiers avec l'import asyncio."""
+        new_files = await asyncio.to_thread(self.get_new_files, full_listing)
+
+        if not new_files:
+            print("✅ Aucun nouveau fichier détecté")
+            await asyncio.to_thread(self.advance_checkpoints, [])
+            return []
+
+        print(f"🔄 Synchronisation asynchrone de {len(new_files)} nouveaux fichiers")
+        results = await self.async_importer.import_files(new_files, self.s3_bucket)
+        for result in results:
+            if result["status"] == "error":
+                print(f"  ❌ Erreur lors de l'import de {result['key']}: {result['error']}")
+            else:
+                print(f"  ✅ {result['key']} importé avec succès")
+
+        await asyncio.to_thread(self.advance_checkpoints, results)
+        await asyncio.to_thread(self.update_last_sync_time)
+        self.report_cycle(results)
+        print(f"🎉 Synchronisation terminée à {datetime.now()}")
+        return results
+
+    async def initial_sync_async(self):
+        """Import initial (toutes les clés) ou reprise incrémentale, comme initial_import_if_empty."""
+        empty = not await asyncio.to_thread(self.db[weather_collection()].count_documents, {}, limit=1)
+        if not empty and not await asyncio.to_thread(self.db['weather_daily'].count_documents, {}, limit=1):
+            print("📊 Reconstruction des agrégats horaires/journaliers...")
+            await asyncio.to_thread(self.importer.rollups.rebuild)
+
+        print("🌱 Import initial en cours..." if empty else "|| -- Base existante - Synchronisation incrémentale -- ||")
+        await self.sync_new_files_async(full_listing=True)
+
+        if empty:
+            print("\n🔍 Lancement de l'analyse qualité...")
+            await asyncio.to_thread(self.analyzer.measure_data_quality)
+            print("\n🌧️ Analyse des précipitations...")
+            await asyncio.to_thread(self.analyzer.get_station_with_most_precipitation)
+
+    async def _run_until_stopped(self, coroutine):
+        """Exécute une étape ; l'annule si l'arrêt est demandé. Retourne False en cas d'arrêt."""
+        task = asyncio.create_task(coroutine)
+        stop = asyncio.create_task(self.stopping.wait())
+        try:
+            await asyncio.wait([task, stop], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            stop.cancel()
+        if not task.done():
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+            return False
+        task.result()
+        return True
+
+    async def run(self):
+        """Démarre la surveillance continue jusqu'à SIGINT/SIGTERM."""
+        self.stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            with contextlib.suppress(NotImplementedError):
+                loop.add_signal_handler(signum, self.stopping.set)
+
+        force_log(f"🚀 Démarrage de la surveillance S3 asynchrone (intervalle: {self.check_interval}s)")
+        start_metrics_server()
+        try:
+            await self.async_importer.start()
+            if not await self._run_until_stopped(self.initial_sync_async()):
+                return
+
+            cycle = 0
+            while not self.stopping.is_set():
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self.stopping.wait(), timeout=self.check_interval)
+                    break
+                cycle += 1
+                force_log(f"\n⏰ Vérification à {datetime.now()}")
+                try:
+                    # Listing complet périodique pour réconcilier les objets réécrits
+                    if not await self._run_until_stopped(
+                            self.sync_new_files_async(full_listing=cycle % S3_FULL_LISTING_EVERY == 0)):
+                        break
+                except Exception as e:
+                    force_log(f"❌ Erreur durante la surveillance: {e}")
+        finally:
+            force_log("\n⏹️  Arrêt de la surveillance : fermeture des connexions")
+            await self.async_importer.close()
+            metrics.dump_json()
+
+def run_async_monitor(s3_bucket, check_interval=600):
+    """Point d'entrée de la surveillance asynchrone (SYNC_MODE=async)."""
+    asyncio.run(AsyncS3SyncMonitor(s3_bucket, check_interval).run())
+
+if __name__ == "__main__":
+    run_async_monitor(os.getenv('S3_BUCKET'), int(os.getenv('SYNC_INTERVAL', '600')))
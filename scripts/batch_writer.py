@@ -0,0 +1,212 @@
+import time
+from pymongo import ReplaceOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from config import IMPORT_BATCH_SIZE, IMPORT_FLUSH_INTERVAL
+
+class BatchWriter:
+    """Écriture bufferisée par lots non ordonnés vers MongoDB.
+
+    Par défaut les documents sont insérés (insert_many). Avec `upsert_key`,
+    chaque document remplace celui de même clé (bulk_write de ReplaceOne
+    upsert) : une ré-importation ne crée alors aucun doublon.
+
+    `on_written(created, replaced)` reçoit après chaque lot les documents
+    nouvellement créés et ceux qui en ont remplacé un existant. Le lot est
+    déjà écrit quand il est appelé : une exception y est consignée dans
+    `callback_errors` sans mettre les lignes du lot en erreur.
+
+    Avec un `timer` (StageTimer), les écritures sont comptées dans l'étape
+    mongo_write et l'appel à `on_written` dans l'étape rollups.
+
+    `flush_interval` n'est vérifié que dans `add()` : aucune minuterie
+    n'écrit un buffer resté sans nouveau document, qui attend le prochain
+    `add()` ou `close()`. Les écritures restent ainsi dans le thread de
+    l'import, sans concurrence avec `on_written`.
+    """
+
+    def __init__(self, collection, batch_size=None, flush_interval=None, label=None, upsert_key=None,
+                 on_written=None, timer=None):
+        self.collection = collection
+        self.batch_size = batch_size or IMPORT_BATCH_SIZE
+        self.flush_interval = flush_interval if flush_interval is not None else IMPORT_FLUSH_INTERVAL
+        self.label = label or collection.name
+        self.upsert_key = upsert_key
+        self.on_written = on_written
+        self.timer = timer
+        self.buffer = []
+        self.last_flush = time.monotonic()
+        self.inserted = 0
+        self.updated = 0
+        self.failed = 0
+        self.batches = []
+        self.errors = []
+        self.callback_errors = []
+
+    def add(self, doc, context=None):
+        """Ajoute un document au buffer ; déclenche un flush si nécessaire.
+
+        `context` identifie la ligne source (ligne CSV, station, heure...)
+        et est reporté dans les erreurs du lot. Le délai `flush_interval`
+        est mesuré ici, à l'arrivée du document.
+        """
+        self.buffer.append((doc, context))
+        if (len(self.buffer) >= self.batch_size or
+                time.monotonic() - self.last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        """Écrit le buffer courant en un seul aller-retour MongoDB."""
+        pending = self._take()
+        if pending is None:
+            return 0
+
+        batch, batch_number = pending
+        start = time.perf_counter()
+        try:
+            if self.upsert_key:
+                result = self.collection.bulk_write(self._requests(batch), ordered=False)
+            else:
+                result = self.collection.insert_many([doc for doc, _ in batch], ordered=False)
+            created, replaced = self._settle(batch, batch_number, start, result=result)
+        except PyMongoError as e:
+            created, replaced = self._settle(batch, batch_number, start, error=e)
+
+        self._notify(created, replaced)
+        return self.batches[-1]["inserted"] + self.batches[-1]["updated"]
+
+    def _notify(self, created, replaced):
+        """Appelle `on_written` pour les documents écrits du dernier lot."""
+        if not (created or replaced) or not self.on_written:
+            return
+        start = time.perf_counter()
+        try:
+            self.on_written(created, replaced)
+        except Exception as e:
+            self._callback_failed(e)
+        if self.timer is not None:
+            self.timer.add('rollups', time.perf_counter() - start)
+
+    def _callback_failed(self, error):
+        """Consigne l'échec de `on_written` pour le dernier lot (déjà écrit)."""
+        batch_number = self.batches[-1]["batch"] if self.batches else 0
+        self.callback_errors.append({
+            "batch": batch_number,
+            "code": getattr(error, 'code', None),
+            "message": str(error)
+        })
+        print(f"⚠️ {self.label} - Lot {batch_number}: échec du traitement après écriture : {error}")
+
+    def _take(self):
+        """Retire le buffer courant : (lot, numéro du lot), ou None s'il est vide."""
+        self.last_flush = time.monotonic()
+        if not self.buffer:
+            return None
+        batch = self.buffer
+        self.buffer = []
+        return batch, len(self.batches) + 1
+
+    def _requests(self, batch):
+        """Opérations bulk_write d'un lot en mode upsert."""
+        return [
+            ReplaceOne({self.upsert_key: doc.get(self.upsert_key)}, doc, upsert=True)
+            for doc, _ in batch
+        ]
+
+    def _settle(self, batch, batch_number, start, result=None, error=None):
+        """Comptabilise le résultat (ou l'erreur) d'un lot ; retourne (documents créés, documents remplacés)."""
+        inserted = 0
+        updated = 0
+        batch_errors = []
+        created = []
+        replaced = []
+
+        if result is not None:
+            if self.upsert_key:
+                inserted = result.upserted_count
+                updated = result.matched_count
+                upserted = result.upserted_ids
+                created = [batch[index][0] for index in sorted(upserted)]
+                replaced = [doc for index, (doc, _) in enumerate(batch) if index not in upserted]
+            else:
+                inserted = len(result.inserted_ids)
+                created = [doc for doc, _ in batch]
+        elif isinstance(error, BulkWriteError):
+            # Écriture non ordonnée : les lignes valides du lot sont conservées
+            inserted = error.details.get('nInserted', 0) + error.details.get('nUpserted', 0)
+            updated = error.details.get('nMatched', 0)
+            failed_indexes = {err['index'] for err in error.details.get('writeErrors', [])}
+            if self.upsert_key:
+                upserted = {upsert['index'] for upsert in error.details.get('upserted', [])}
+                created = [batch[index][0] for index in sorted(upserted)]
+                replaced = [doc for index, (doc, _) in enumerate(batch)
+                            if index not in upserted and index not in failed_indexes]
+            else:
+                created = [doc for index, (doc, _) in enumerate(batch) if index not in failed_indexes]
+            for err in error.details.get('writeErrors', []):
+                batch_errors.append({
+                    "batch": batch_number,
+                    "context": batch[err['index']][1],
+                    "code": err.get('code'),
+                    "message": err.get('errmsg')
+                })
+        else:
+            # Échec global du lot (réseau, timeout...) : toutes les lignes sont en erreur
+            for _, context in batch:
+                batch_errors.append({
+                    "batch": batch_number,
+                    "context": context,
+                    "code": getattr(error, 'code', None),
+                    "message": str(error)
+                })
+
+        self._account(len(batch), batch_number, start, inserted, updated, batch_errors)
+        return created, replaced
+
+    def _account(self, size, batch_number, start, inserted, updated, batch_errors):
+        """Reporte les compteurs d'un lot de `size` documents (les non écrits sont en erreur)."""
+        if self.timer is not None:
+            self.timer.add('mongo_write', time.perf_counter() - start)
+        failed = size - inserted - updated
+        self.inserted += inserted
+        self.updated += updated
+        self.failed += failed
+        self.errors.extend(batch_errors)
+        self.batches.append({
+            "batch": batch_number,
+            "size": size,
+            "inserted": inserted,
+            "updated": updated,
+            "failed": failed
+        })
+
+        if failed:
+            print(f"⚠️ {self.label} - Lot {batch_number}: {failed}/{size} documents en erreur")
+
+    def close(self):
+        """Vide le buffer restant et retourne le résumé de l'écriture."""
+        self.flush()
+        return self.summary()
+
+    def summary(self):
+        """Résumé de l'écriture (compteurs, lots, erreurs par ligne)."""
+        return {
+            "label": self.label,
+            "inserted": self.inserted,
+            "updated": self.updated,
+            "written": self.inserted + self.updated,
+            "failed": self.failed,
+            "batches": len(self.batches),
+            "errors": self.errors,
+            "callback_errors": self.callback_errors
+        }
+
+    def print_summary(self, max_errors=10):
+        """Affiche le résumé de fin de fichier."""
+        print(f"📦 {self.label}: {self.inserted} insérés, {self.updated} mis à jour, "
+              f"{self.failed} en erreur, {len(self.batches)} lots")
+        for err in self.errors[:max_errors]:
+            print(f"  ❌ Lot {err['batch']} {err['context']}: {err['message']}")
+        if len(self.errors) > max_errors:
+            print(f"  ... {len(self.errors) - max_errors} autres erreurs")
+        if self.callback_errors:
+            print(f"  ⚠️ {len(self.callback_errors)} lot(s) en échec après écriture : {self.callback_errors[0]['message']}")
@@ -0,0 +1,398 @@
+"""Banc de performance WeatherHub.
+
+Génère un jeu de données synthétique à partir des fichiers de data/
+(WeatherBE/WeatherFR et StationsMeteorologiques), puis mesure :
+- le débit d'import par type de source (lignes/s) ;
+- le débit de normalisation (chemins colonne et ligne) ;
+- les requêtes d'une station sur une journée (index et scan complet) ;
+- l'agrégation des précipitations et le rapport de qualité ;
+- l'interpolation IDW d'une heure sur une grille 500×500.
+
+Chaque scénario est exécuté `warmup` fois sans mesure puis `repeat` fois ;
+les résultats (percentiles, débit) sont écrits en JSON pour comparer deux
+versions (--compare).
+
+Exemples :
+    python scripts/benchmark.py                       # MongoDB en mémoire (mongomock)
+    python scripts/benchmark.py --mongo-uri mongodb://localhost:27017/ --repeat 20
+    python scripts/benchmark.py --output after.json --compare before.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from config import LOCAL_DATA_DIR
+from database import DatabaseConnector, INDEXES
+from decoders import DECODER_NAME, iter_stations_payload
+from mongomock_support import mongomock_client
+from normalizer import WeatherDataNormalizer
+from storage import MemoryStorage
+from utils import VALUE_REGEX, clear_parse_cache
+
+WU_EXPORT = os.path.join('WeatherBE', '2025_07_06_1751818021048_0.csv')
+STATIONS_EXPORT = 'StationsMeteorologiques.json'
+BENCHMARK_DB = 'weatherhub_benchmark'
+# Premier jour des fichiers WU synthétiques (lignes sans date), porté par leur nom
+WU_START_DATE = '2024-10-01'
+
+_NUMBER_PREFIX = re.compile(r'^\s*' + VALUE_REGEX)
+
+# --- Données synthétiques -------------------------------------------------
+
+def _jitter(value, rng, spread=0.05):
+    """Perturbe la partie numérique d'une valeur ("56.8 °F", "7.6", 12) en gardant son format."""
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return type(value)(value * (1 + rng.uniform(-spread, spread)))
+    match = _NUMBER_PREFIX.match(value) if isinstance(value, str) else None
+    if not match:
+        return value
+    number = match.group(1)
+    decimals = len(number.split('.')[1]) if '.' in number else 0
+    jittered = float(number) * (1 + rng.uniform(-spread, spread))
+    return f"{jittered:.{decimals}f}" + value[match.end():]
+
+def _airbyte_csv(payloads):
+    """Sérialise des payloads au format CSV Airbyte (colonne _airbyte_data)."""
+    frame = pd.DataFrame({
+        "_airbyte_raw_id": [str(uuid.UUID(int=index)) for index in range(len(payloads))],
+        "_airbyte_extracted_at": 1751818024000,
+        "_airbyte_meta": '{"sync_id":1,"changes":[]}',
+        "_airbyte_generation_id": 1,
+        "_airbyte_data": [json.dumps(payload, ensure_ascii=False) for payload in payloads]
+    })
+    return frame.to_csv(index=False).encode('utf-8')
+
+def wu_payloads(rows, seed=0, data_dir=None):
+    """Lignes Weather Underground synthétiques : mesures réelles rééchantillonnées, toutes les 5 minutes."""
+    data_dir = data_dir or LOCAL_DATA_DIR
+    templates = [
+        payload for payload in map(json.loads, pd.read_csv(os.path.join(data_dir, WU_EXPORT))['_airbyte_data'])
+        if payload.get('Time')
+    ]
+    rng = random.Random(seed)
+    payloads = []
+    for index in range(rows):
+        template = rng.choice(templates)
+        payload = {key: _jitter(value, rng) for key, value in template.items() if key != 'Time'}
+        minutes = index * 5 % (24 * 60)
+        payload['Time'] = f"{minutes // 60:02d}:{minutes % 60:02d}:00"
+        payloads.append(payload)
+    return payloads
+
+def stations_payload(stations, hours, seed=0, data_dir=None):
+    """Payload StationsMeteorologiques synthétique : `stations` stations de `hours` mesures horaires."""
+    data_dir = data_dir or LOCAL_DATA_DIR
+    with open(os.path.join(data_dir, STATIONS_EXPORT), encoding='utf-8') as f:
+        source = json.load(f)
+    station_templates = source['stations']
+    hourly_templates = [
+        record for station_id, records in source['hourly'].items()
+        if not station_id.startswith('_') for record in records
+    ]
+    rng = random.Random(seed)
+    start = datetime(2024, 10, 1)
+    station_list = []
+    hourly = {}
+    for number in range(stations):
+        station_id = f"B{number:05d}"
+        station = dict(rng.choice(station_templates), id=station_id, name=f"Station {number}")
+        station['latitude'] = round(_jitter(float(station['latitude']), rng, 0.02), 4)
+        station['longitude'] = round(_jitter(float(station['longitude']), rng, 0.02), 4)
+        station_list.append(station)
+        hourly[station_id] = [
+            dict({key: _jitter(value, rng) for key, value in rng.choice(hourly_templates).items()},
+                 id_station=station_id,
+                 dh_utc=(start + timedelta(hours=hour)).strftime("%Y-%m-%d %H:%M:%S"))
+            for hour in range(hours)
+        ]
+    hourly['_params'] = list(hourly_templates[0])
+    # Double encodage Airbyte : hourly et stations sont des chaînes JSON
+    return {
+        "status": "OK",
+        "stations": json.dumps(station_list, ensure_ascii=False),
+        "hourly": json.dumps(hourly, ensure_ascii=False),
+        "metadata": source.get('metadata')
+    }
+
+def wu_key(source):
+    return f"{source}/bench_{source}_{WU_START_DATE}.csv"
+
+def build_dataset(rows, stations, hours, seed=0, data_dir=None):
+    """Fichiers synthétiques {clé: contenu CSV Airbyte} : WeatherBE, WeatherFR et StationsMeteorologiques."""
+    files = {}
+    for offset, source in enumerate(('WeatherBE', 'WeatherFR')):
+        files[wu_key(source)] = _airbyte_csv(wu_payloads(rows, seed + offset, data_dir))
+    files["StationsMeteorologiques/bench_stations.csv"] = _airbyte_csv(
+        [stations_payload(stations, hours, seed, data_dir)]
+    )
+    return files
+
+# --- Environnement MongoDB -----------------------------------------------
+
+def _mongomock_client():
+    """Client MongoDB en mémoire (mongomock, dépendance optionnelle du banc)."""
+    try:
+        return mongomock_client()
+    except ImportError:
+        sys.exit("mongomock n'est pas installé : pip install -r requirements-dev.txt, ou utiliser --mongo-uri")
+
+def make_connector(files, mongo_uri=None, db_name=BENCHMARK_DB):
+    """Connecteur isolé : base dédiée au banc et source de fichiers en mémoire."""
+    if mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(mongo_uri)
+    else:
+        client = _mongomock_client()
+    connector = DatabaseConnector()
+    connector.mongo_client = client
+    connector.db = client[db_name]
+    connector.storage = MemoryStorage(files)
+    return connector
+
+def make_importer(connector):
+    """Importateur du banc, sans cache de staging : chaque import est mesuré en entier."""
+    from importer import WeatherDataImporter
+
+    importer = WeatherDataImporter(connector=connector)
+    importer.staging = None
+    return importer
+
+def _reset(importer):
+    """Vide les collections du mode de stockage actif, le manifeste, les agrégats et le registre des stations."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        importer.clear_collections()
+
+# --- Mesure ------------------------------------------------------------------
+
+def _percentile(sorted_values, ratio):
+    if not sorted_values:
+        return None
+    position = (len(sorted_values) - 1) * ratio
+    low = int(position)
+    high = min(low + 1, len(sorted_values) - 1)
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * (position - low)
+
+def run_scenario(run, setup=None, warmup=1, repeat=5, unit="ops"):
+    """Exécute un scénario : `run()` retourne le nombre d'éléments traités (lignes, requêtes...)."""
+    timings = []
+    items = 0
+    for iteration in range(warmup + repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        items = run()
+        elapsed = time.perf_counter() - start
+        if iteration >= warmup:
+            timings.append(elapsed)
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    result = {
+        "unit": unit,
+        "items": items,
+        "warmup": warmup,
+        "repeat": repeat,
+        "min_s": ordered[0],
+        "mean_s": statistics.fmean(ordered),
+        "median_s": median,
+        "p90_s": _percentile(ordered, 0.90),
+        "p99_s": _percentile(ordered, 0.99),
+        "max_s": ordered[-1],
+        "stdev_s": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+        "throughput": items / median if median else None
+    }
+    return result
+
+def format_result(name, result):
+    return (f"  {name:<28} médiane {result['median_s'] * 1000:9.2f} ms  p90 {result['p90_s'] * 1000:9.2f} ms  "
+            f"{result['throughput'] or 0:12.1f} {result['unit']}/s")
+
+# --- Scénarios ---------------------------------------------------------------
+
+def scenarios(connector, importer, files, rng):
+    """Scénarios du banc : nom -> (setup, run, unité)."""
+    from analyzer import DataQualityAnalyzer
+    from interpolation import GridInterpolator
+
+    db = connector.get_database()
+    analyzer = DataQualityAnalyzer(connector=connector)
+    normalizer = WeatherDataNormalizer()
+    catalog = {}
+
+    def import_file(key):
+        def run():
+            result = importer.import_csv_to_mongo(key, None)
+            if result["status"] != "imported":
+                raise RuntimeError(f"{key}: {result['error']}")
+            return result["weather"]
+        return run
+
+    def reset_all():
+        _reset(importer)
+        clear_parse_cache()
+
+    for key in files:
+        source = key.split('/')[0]
+        catalog[f"import_{source}"] = (reset_all, import_file(key), "docs")
+
+    # Normalisation seule (sans MongoDB)
+    wu_frame = pd.read_csv(io.BytesIO(files[wu_key('WeatherBE')]))
+    wu_records = [json.loads(raw) for raw in wu_frame['_airbyte_data']]
+    catalog["normalize_be_fr_frame"] = (
+        clear_parse_cache,
+        lambda: len(normalizer.normalize_be_fr_frame(normalizer.payload_frame(wu_records))[0]),
+        "rows"
+    )
+    catalog["normalize_be_fr_record"] = (
+        clear_parse_cache,
+        lambda: len([normalizer.normalize_be_fr_record(record) for record in wu_records]),
+        "rows"
+    )
+    stations_raw = pd.read_csv(io.BytesIO(files["StationsMeteorologiques/bench_stations.csv"]))['_airbyte_data'][0]
+    hourly_records = [value for kind, _, _, value in iter_stations_payload(stations_raw) if kind == "hourly"]
+    catalog["normalize_hourly_record"] = (
+        clear_parse_cache,
+        lambda: len([normalizer.normalize_hourly_record(record) for record in hourly_records]),
+        "rows"
+    )
+    catalog["decode_stations_payload"] = (
+        None,
+        lambda: sum(1 for _ in iter_stations_payload(stations_raw)),
+        "events"
+    )
+
+    # Requêtes sur une base chargée une fois pour toutes
+    loaded = {"done": False}
+
+    def load_all():
+        if not loaded["done"]:
+            reset_all()
+            for key in files:
+                importer.import_csv_to_mongo(key, None)
+            loaded["done"] = True
+
+    station_days = None
+
+    def day_queries(hint):
+        def run():
+            nonlocal station_days
+            if station_days is None:
+                pairs = db['weather_daily'].find({}, {"station_id": 1, "period": 1})
+                station_days = [(pair["station_id"], pair["period"]) for pair in pairs]
+            sample = [rng.choice(station_days) for _ in range(20)]
+            for station_id, day in sample:
+                query = {"station_id": station_id, "dh_utc": {"$gte": day, "$lt": day + timedelta(days=1)}}
+                list(db['weather'].find(query).hint(hint))
+            return len(sample)
+        return run
+
+    catalog["station_day_query_index"] = (load_all, day_queries(INDEXES['weather'][0][0]), "queries")
+    catalog["station_day_query_scan"] = (load_all, day_queries([("$natural", 1)]), "queries")
+
+    def precipitation():
+        list(db['weather_daily'].aggregate([
+            {"$group": {"_id": "$station_id", "total_precip": {"$sum": {"$ifNull": ["$precipitation_total", 0]}}}},
+            {"$sort": {"total_precip": -1}},
+            {"$limit": 1}
+        ]))
+        return 1
+    catalog["precipitation_aggregation"] = (load_all, precipitation, "queries")
+
+    def quality_report():
+        analyzer.compute_quality_report()
+        return 1
+    catalog["quality_report"] = (load_all, quality_report, "reports")
+
+    grid = GridInterpolator(connector=connector)
+
+    def interpolate_grid():
+        nonlocal station_days
+        if station_days is None:
+            pairs = db['weather_daily'].find({}, {"station_id": 1, "period": 1})
+            station_days = [(pair["station_id"], pair["period"]) for pair in pairs]
+        _, day = rng.choice(station_days)
+        grid.interpolate(day + timedelta(hours=rng.randrange(24)))
+        return 1
+    catalog["interpolation_grid_500"] = (load_all, interpolate_grid, "grids")
+    return catalog
+
+def compare(results, baseline_path):
+    """Affiche l'écart de médiane avec un précédent fichier de résultats."""
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = json.load(f)["scenarios"]
+    print(f"\n____COMPARAISON AVEC {baseline_path}____")
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            print(f"  {name:<28} (nouveau)")
+            continue
+        delta = (result["median_s"] - previous["median_s"]) / previous["median_s"] * 100
+        print(f"  {name:<28} {previous['median_s'] * 1000:9.2f} ms -> {result['median_s'] * 1000:9.2f} ms "
+              f"({delta:+.1f}%)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Banc de performance WeatherHub")
+    parser.add_argument('--mongo-uri', help="MongoDB réel (sinon mongomock en mémoire)")
+    parser.add_argument('--rows', type=int, default=2000, help="lignes par fichier WeatherBE/WeatherFR")
+    parser.add_argument('--stations', type=int, default=5, help="stations du fichier StationsMeteorologiques")
+    parser.add_argument('--hours', type=int, default=168, help="mesures horaires par station")
+    parser.add_argument('--warmup', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--scenario', action='append', help="scénario à exécuter (répétable, défaut : tous)")
+    parser.add_argument('--data-dir', default=LOCAL_DATA_DIR)
+    parser.add_argument('--output', default='benchmark_results.json')
+    parser.add_argument('--compare', help="fichier de résultats de référence")
+    args = parser.parse_args(argv)
+
+    files = build_dataset(args.rows, args.stations, args.hours, args.seed, args.data_dir)
+    connector = make_connector(files, args.mongo_uri)
+    importer = make_importer(connector)
+    catalog = scenarios(connector, importer, files, random.Random(args.seed))
+    selected = args.scenario or list(catalog)
+    unknown = set(selected) - set(catalog)
+    if unknown:
+        parser.error(f"scénarios inconnus : {', '.join(sorted(unknown))} (disponibles : {', '.join(catalog)})")
+
+    print("\n____ BENCHMARKS DE PERFORMANCE ____")
+    results = {}
+    for name in selected:
+        setup, run, unit = catalog[name]
+        # Les logs de l'import fausseraient les mesures
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[name] = run_scenario(run, setup, args.warmup, args.repeat, unit)
+        print(format_result(name, results[name]))
+
+    output = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(),
+            "backend": "mongodb" if args.mongo_uri else "mongomock",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "json_decoder": DECODER_NAME,
+            "params": {key: value for key, value in vars(args).items() if key not in ('output', 'compare')}
+        },
+        "scenarios": results
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2)
+    print(f"\n📄 Résultats écrits dans {args.output}")
+    if args.compare:
+        compare(results, args.compare)
+    _reset(importer)
+
+if __name__ == "__main__":
+    main()
@@ -14,6 +14,31 @@ MONGO_INITDB_ROOT_USERNAME = os.getenv('MONGO_INITDB_ROOT_USERNAME')
 MONGO_INITDB_ROOT_PASSWORD = os.getenv('MONGO_INITDB_ROOT_PASSWORD')
 MONGO_HOST = os.getenv('MONGO_HOST', '172.31.0.23')
 
+# Pool de connexions et options du client MongoDB (vide = valeur par défaut du pilote).
+# MONGO_W / MONGO_JOURNAL : write concern du client ; MONGO_BULK_W / MONGO_BULK_JOURNAL :
+# write concern des écritures par lots de l'import (ex. w=1, journal=false pour un backfill).
+# MONGO_COMPRESSORS : liste ordonnée parmi zstd, snappy, zlib.
+MONGO_MAX_POOL_SIZE = int(os.getenv('MONGO_MAX_POOL_SIZE', '100'))
+MONGO_MIN_POOL_SIZE = int(os.getenv('MONGO_MIN_POOL_SIZE', '0'))
+MONGO_MAX_IDLE_TIME_MS = int(os.getenv('MONGO_MAX_IDLE_TIME_MS', '0')) or None
+MONGO_MAX_CONNECTING = int(os.getenv('MONGO_MAX_CONNECTING', '2'))
+MONGO_W = os.getenv('MONGO_W', '')
+MONGO_JOURNAL = os.getenv('MONGO_JOURNAL', '')
+MONGO_BULK_W = os.getenv('MONGO_BULK_W', '')
+MONGO_BULK_JOURNAL = os.getenv('MONGO_BULK_JOURNAL', '')
+MONGO_COMPRESSORS = os.getenv('MONGO_COMPRESSORS', '')
+MONGO_RETRY_WRITES = os.getenv('MONGO_RETRY_WRITES', 'true').lower() == 'true'
+MONGO_CONNECT_TIMEOUT_MS = int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', '10000'))
+MONGO_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', '30000'))
+MONGO_SOCKET_TIMEOUT_MS = int(os.getenv('MONGO_SOCKET_TIMEOUT_MS', '0')) or None
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', '0')) or None
+
+# Client S3 (boto3) : connexions HTTP simultanées, timeouts (s) et tentatives
+S3_MAX_POOL_CONNECTIONS = int(os.getenv('S3_MAX_POOL_CONNECTIONS', '50'))
+S3_CONNECT_TIMEOUT = float(os.getenv('S3_CONNECT_TIMEOUT', '10'))
+S3_READ_TIMEOUT = float(os.getenv('S3_READ_TIMEOUT', '60'))
+S3_MAX_ATTEMPTS = int(os.getenv('S3_MAX_ATTEMPTS', '5'))
+
 # Données des stations WeatherFR et WeatherBE
 WEATHER_STATIONS = {
     'WeatherFR': {
@@ -67,3 +92,104 @@ HOURLY_TO_BE_FR = {
     "dh_utc": "Time",
     "station_id": "station_id"
 }
+
+# Configuration de l'écriture par lots (import MongoDB)
+IMPORT_BATCH_SIZE = int(os.getenv('IMPORT_BATCH_SIZE', '1000'))
+# Délai (s) au-delà duquel un lot incomplet est écrit : vérifié à l'ajout d'un document
+# (pas de minuterie), un buffer sans nouveau document attend la fin du fichier (close)
+IMPORT_FLUSH_INTERVAL = float(os.getenv('IMPORT_FLUSH_INTERVAL', '5'))
+
+# Lecture en flux des CSV Airbyte (nombre de lignes par morceau, morceaux lus d'avance)
+CSV_CHUNK_SIZE = int(os.getenv('CSV_CHUNK_SIZE', '5000'))
+CSV_PREFETCH_CHUNKS = int(os.getenv('CSV_PREFETCH_CHUNKS', '2'))
+
+# Import parallèle multi-fichiers (IMPORT_WORKER_MODE : thread ou process)
+IMPORT_WORKERS = int(os.getenv('IMPORT_WORKERS', '1'))
+IMPORT_WORKER_MODE = os.getenv('IMPORT_WORKER_MODE', 'thread')
+IMPORT_QUEUE_SIZE = int(os.getenv('IMPORT_QUEUE_SIZE', '0')) or IMPORT_WORKERS * 2
+
+# Prétraitement des classeurs Weather Underground (scripts/preprocess.py) : processus de lecture des feuilles
+PREPROCESS_WORKERS = int(os.getenv('PREPROCESS_WORKERS', '0')) or os.cpu_count() or 1
+
+# Date du premier jour des exports Weather Underground dont les lignes ne portent que l'heure, par fichier :
+# motif de la clé -> AAAA-MM-JJ (complété par WU_START_DATES="motif=AAAA-MM-JJ,..."). À défaut, une date
+# AAAA-MM-JJ dans le nom du fichier, puis la première ligne datée ; sinon le fichier est rejeté.
+WU_START_DATES = {
+    'WeatherBE/2025_07_06_1751818021048_0.csv': '2024-10-01'
+}
+WU_START_DATES.update(dict(
+    entry.split('=', 1) for entry in os.getenv('WU_START_DATES', '').split(',') if '=' in entry
+))
+
+# Listing S3 : un préfixe par flux Airbyte (séparés par des virgules, vide = tout le bucket)
+S3_PREFIXES = [prefix.strip() for prefix in os.getenv('S3_PREFIXES', '').split(',') if prefix.strip()] or ['']
+S3_LIST_PAGE_SIZE = int(os.getenv('S3_LIST_PAGE_SIZE', '1000'))
+# Nombre de cycles de synchronisation entre deux listings complets (réconciliation)
+S3_FULL_LISTING_EVERY = int(os.getenv('S3_FULL_LISTING_EVERY', '6'))
+
+# Déclenchement de la synchronisation : poll (listing toutes les SYNC_INTERVAL s),
+# sqs (notifications S3 ObjectCreated), watch (répertoire local) ou memory (tests)
+SYNC_TRIGGER = os.getenv('SYNC_TRIGGER', 'poll')
+SQS_QUEUE_URL = os.getenv('SQS_QUEUE_URL')
+# Regroupement des événements : import après SYNC_DEBOUNCE s sans nouvel événement,
+# au plus tard après SYNC_MAX_WAIT s ou dès SYNC_MAX_BATCH fichiers en attente
+SYNC_DEBOUNCE = float(os.getenv('SYNC_DEBOUNCE', '2'))
+SYNC_MAX_WAIT = float(os.getenv('SYNC_MAX_WAIT', '30'))
+SYNC_MAX_BATCH = int(os.getenv('SYNC_MAX_BATCH', '100'))
+# Listing de réconciliation (événements perdus) en mode événementiel, en secondes
+SYNC_RECONCILE_INTERVAL = float(os.getenv('SYNC_RECONCILE_INTERVAL', '3600'))
+# Période de scan du répertoire surveillé quand inotify n'est pas disponible
+WATCH_POLL_INTERVAL = float(os.getenv('WATCH_POLL_INTERVAL', '2'))
+
+# Durée (s) de validité du registre des stations en mémoire (0 = jamais rechargé)
+STATION_CACHE_TTL = float(os.getenv('STATION_CACHE_TTL', '300'))
+
+# Stockage des mesures : documents (collection weather, un document imbriqué par mesure),
+# timeseries (collection time-series MongoDB) ou buckets (un document par station et par jour)
+WEATHER_STORAGE_MODE = os.getenv('WEATHER_STORAGE_MODE', 'documents')
+WEATHER_TS_COLLECTION = os.getenv('WEATHER_TS_COLLECTION', 'weather_ts')
+WEATHER_BUCKETS_COLLECTION = os.getenv('WEATHER_BUCKETS_COLLECTION', 'weather_buckets')
+
+# Cache local des documents normalisés par fichier source (clé + ETag) : répertoire (vide = désactivé),
+# taille maximale en Mo (éviction LRU) et format : auto (parquet si pyarrow est installé, sinon bson), parquet, bson
+STAGING_CACHE_DIR = os.getenv('STAGING_CACHE_DIR', '')
+STAGING_CACHE_MAX_BYTES = int(float(os.getenv('STAGING_CACHE_MAX_MB', '1024')) * 1024 * 1024)
+STAGING_CACHE_FORMAT = os.getenv('STAGING_CACHE_FORMAT', 'auto')
+
+# Source des fichiers à importer : s3, local (répertoire) ou mmap (répertoire, lecture par mmap)
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 's3')
+LOCAL_DATA_DIR = os.getenv('LOCAL_DATA_DIR', os.path.join(os.path.dirname(__file__), '../data'))
+# Fichiers du répertoire local non importés (motifs fnmatch des clés, complétés par LOCAL_EXCLUDE="motif,...") :
+# sorties dérivées de preprocess.py, qui reprennent les mesures des classeurs bruts
+LOCAL_EXCLUDE = ['Clean_data/*'] + [pattern.strip() for pattern in os.getenv('LOCAL_EXCLUDE', '').split(',') if pattern.strip()]
+
+# Fichiers dont le nom ne contient pas le flux Airbyte : motif du nom -> flux
+# (complété par SOURCE_ALIASES="motif=flux,..." ; les exports Airbyte sont rangés par flux, ex. WeatherBE/)
+SOURCE_ALIASES = {
+    'Ichtegem': 'WeatherBE',
+    'La+Madeleine': 'WeatherFR'
+}
+SOURCE_ALIASES.update(dict(
+    alias.split('=', 1) for alias in os.getenv('SOURCE_ALIASES', '').split(',') if '=' in alias
+))
+
+# Décodeur JSON des payloads Airbyte : auto (orjson, puis msgspec, puis json), orjson, msgspec ou json
+JSON_DECODER = os.getenv('JSON_DECODER', 'auto')
+
+# Taille des caches LRU d'analyse "valeur unité" et de conversion d'unités
+PARSE_CACHE_SIZE = int(os.getenv('PARSE_CACHE_SIZE', '16384'))
+
+# Métriques d'import : port HTTP local du texte Prometheus (0 = désactivé), fichier JSON de sortie
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))
+METRICS_JSON_PATH = os.getenv('METRICS_JSON_PATH', '')
+# Intervalle minimal (secondes) entre deux logs d'un même événement
+LOG_INTERVAL = float(os.getenv('LOG_INTERVAL', '5'))
+
+# Import asynchrone (SYNC_MODE=async) : téléchargements, lots MongoDB et parsings simultanés,
+# fichiers en cours et lots en attente entre parsing et écriture (par fichier)
+SYNC_MODE = os.getenv('SYNC_MODE', 'sync')
+ASYNC_DOWNLOADS = int(os.getenv('ASYNC_DOWNLOADS', '8'))
+ASYNC_WRITES = int(os.getenv('ASYNC_WRITES', '4'))
+ASYNC_PARSERS = int(os.getenv('ASYNC_PARSERS', '4'))
+ASYNC_FILES = int(os.getenv('ASYNC_FILES', '16'))
+ASYNC_QUEUE_SIZE = int(os.getenv('ASYNC_QUEUE_SIZE', '4'))
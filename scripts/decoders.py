@@ -0,0 +1,347 @@
+import json
+import re
+from json.decoder import scanstring
+from config import JSON_DECODER, HOURLY_TO_BE_FR
+
+def _select_loads(name):
+    """Choisit la fonction de décodage JSON (nom, loads) selon JSON_DECODER."""
+    if name in ('auto', 'orjson'):
+        try:
+            import orjson
+            return 'orjson', orjson.loads
+        except ImportError:
+            if name == 'orjson':
+                raise
+    if name in ('auto', 'msgspec'):
+        try:
+            import msgspec
+        except ImportError:
+            if name == 'msgspec':
+                raise
+        else:
+            decode = msgspec.json.Decoder().decode
+
+            def loads(raw):
+                try:
+                    return decode(raw)
+                except msgspec.DecodeError as e:
+                    raise ValueError(str(e)) from e
+            return 'msgspec', loads
+    return 'json', json.loads
+
+# Décodeur actif ; les erreurs de syntaxe sont des ValueError quel que soit le décodeur
+DECODER_NAME, loads = _select_loads(JSON_DECODER)
+
+def decode_payload(raw, nested=()):
+    """Décode un `_airbyte_data` et, dans la foulée, ses champs `nested` encodés deux fois.
+
+    Airbyte sérialise certains champs (hourly, stations) en chaîne JSON à
+    l'intérieur du payload : ils sont décodés ici plutôt que ligne par ligne
+    dans l'importateur.
+    """
+    data = loads(raw)
+    if not isinstance(data, dict):
+        raise ValueError(f"payload inattendu de type {type(data).__name__}")
+    for key in nested:
+        value = data.get(key)
+        if isinstance(value, (str, bytes)):
+            try:
+                data[key] = loads(value)
+            except ValueError as e:
+                raise ValueError(f"champ {key} invalide: {e}") from e
+    return data
+
+# Valeur des champs absents du JSON (distincte de null)
+_MISSING = object()
+
+class HourlyRecord:
+    """Mesure horaire StationsMeteorologiques réduite aux champs de HOURLY_TO_BE_FR.
+
+    Les champs absents du JSON valent _MISSING : l'enregistrement se lit
+    comme le dict d'origine (items, get, in, []) pour le normaliseur.
+    """
+
+    __slots__ = tuple(HOURLY_TO_BE_FR)
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        get = data.get
+        for name in cls.__slots__:
+            setattr(record, name, get(name, _MISSING))
+        return record
+
+    def items(self):
+        return [
+            (name, value) for name, value in zip(self.__slots__, map(self.__getattribute__, self.__slots__))
+            if value is not _MISSING
+        ]
+
+    def get(self, name, default=None):
+        if name not in _HOURLY_FIELDS:
+            return default
+        value = getattr(self, name)
+        return default if value is _MISSING else value
+
+    def __contains__(self, name):
+        return name in _HOURLY_FIELDS and getattr(self, name) is not _MISSING
+
+    def __getitem__(self, name):
+        if name not in self:
+            raise KeyError(name)
+        return getattr(self, name)
+
+    def __repr__(self):
+        return f"HourlyRecord({dict(self.items())!r})"
+
+_HOURLY_FIELDS = frozenset(HourlyRecord.__slots__)
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+_raw_decoder = json.JSONDecoder()
+# Taille (caractères encodés) des blocs désencodés d'un JSON encodé dans une chaîne
+NESTED_BLOCK_SIZE = 1 << 16
+
+class JsonScanner:
+    """Lecture événementielle d'un texte JSON déjà chargé (à la manière d'ijson).
+
+    Les objets et tableaux sont parcourus clé par clé ou élément par
+    élément ; seule la valeur courante est décodée en objets Python. Un
+    texte après la valeur de premier niveau lève ValueError, à la fin du
+    parcours.
+    """
+
+    def __init__(self, text):
+        if isinstance(text, (bytes, bytearray, memoryview)):
+            text = bytes(text).decode('utf-8')
+        self.text = text
+        self.pos = 0
+        # Profondeur des conteneurs ouverts ; valeurs lues (détection des valeurs ignorées par l'appelant)
+        self.depth = 0
+        self.consumed = 0
+
+    def _fill(self):
+        """Complète le texte disponible ; faux s'il n'y a plus rien à lire."""
+        return False
+
+    def peek(self):
+        """Premier caractère significatif à partir de la position courante."""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                return self.text[self.pos]
+            if not self._fill():
+                raise ValueError("fin de JSON inattendue")
+
+    def _expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"'{char}' attendu en position {self.pos}")
+        self.pos += 1
+        self.consumed += 1
+
+    def _next_or_end(self, end):
+        """Consomme ',' (élément suivant) ou `end` (fin du conteneur) ; vrai s'il reste un élément."""
+        char = self.peek()
+        self.pos += 1
+        if char == end:
+            return False
+        if char != ',':
+            raise ValueError(f"',' ou '{end}' attendu en position {self.pos - 1}")
+        return True
+
+    def _decode(self):
+        """Décode la valeur à la position courante : (valeur, position de fin)."""
+        if DECODER_NAME != 'json' and self.text.startswith('{', self.pos):
+            # Objet sans objet imbriqué (mesure horaire...) : jusqu'au premier '}', par le décodeur actif.
+            # Ce n'est pas l'objet entier (objet imbriqué, '}' dans une chaîne) : texte invalide, repli
+            end = self.text.find('}', self.pos) + 1
+            if end:
+                try:
+                    return loads(self.text[self.pos:end]), end
+                except ValueError:
+                    pass
+        return _raw_decoder.raw_decode(self.text, self.pos)
+
+    def value(self):
+        """Décode entièrement la valeur courante."""
+        self.peek()
+        while True:
+            try:
+                value, end = self._decode()
+            except ValueError:
+                # Valeur coupée en fin de texte disponible : on complète puis on recommence
+                if not self._fill():
+                    raise
+                continue
+            # Une valeur qui touche la fin du texte disponible (nombre...) peut continuer au-delà
+            if end < len(self.text) or not self._fill():
+                break
+        self.pos = end
+        self.consumed += 1
+        if self.depth == 0:
+            self._end()
+        return value
+
+    def _open(self, char):
+        self._expect(char)
+        self.depth += 1
+
+    def _close(self):
+        self.depth -= 1
+        if self.depth == 0:
+            self._end()
+
+    def _end(self):
+        """Fin de la valeur de premier niveau : seuls des blancs peuvent suivre."""
+        while True:
+            self.pos = _WHITESPACE.match(self.text, self.pos).end()
+            if self.pos < len(self.text):
+                raise ValueError(f"données après la fin du JSON en position {self.pos}")
+            if not self._fill():
+                return
+
+    def iter_object(self):
+        """Produit les clés de l'objet courant ; l'appelant lit chaque valeur (value, iter_*)."""
+        self._open('{')
+        if self.peek() == '}':
+            self.pos += 1
+            self._close()
+            return
+        while True:
+            key = self.value()
+            self._expect(':')
+            consumed = self.consumed
+            yield key
+            if self.consumed == consumed:
+                self.value()  # valeur non lue par l'appelant
+            if not self._next_or_end('}'):
+                self._close()
+                return
+
+    def iter_array(self):
+        """Produit l'index de chaque élément du tableau courant ; l'appelant lit l'élément."""
+        self._open('[')
+        if self.peek() == ']':
+            self.pos += 1
+            self._close()
+            return
+        index = 0
+        while True:
+            consumed = self.consumed
+            yield index
+            if self.consumed == consumed:
+                self.value()
+            index += 1
+            if not self._next_or_end(']'):
+                self._close()
+                return
+
+    def nested(self):
+        """Scanner de la valeur courante si c'est du JSON encodé dans une chaîne, sinon self.
+
+        La chaîne est désencodée par blocs au fil de la lecture, sans copie
+        complète ; une fois sa valeur lue, la lecture reprend après elle.
+        """
+        if self.peek() == '"':
+            return _NestedJsonScanner(self)
+        return self
+
+def _escape_boundary(piece):
+    """Longueur du plus long préfixe de `piece` qui ne coupe pas de séquence d'échappement."""
+    last = piece.rfind('\\', max(0, len(piece) - 6))
+    if last == -1:
+        return len(piece)
+    # Nombre impair de \ consécutifs : le dernier commence une séquence (\x ou \uXXXX)
+    run = last + 1 - len(piece[:last + 1].rstrip('\\'))
+    if run % 2 == 0:
+        return len(piece)
+    length = 6 if piece[last + 1:last + 2] == 'u' else 2
+    return last if last + length > len(piece) else len(piece)
+
+class _NestedJsonScanner(JsonScanner):
+    """JSON encodé dans une chaîne du texte parent (double encodage Airbyte), désencodé par blocs."""
+
+    def __init__(self, parent):
+        super().__init__('')
+        self.parent = parent
+        # Position dans le texte parent : après le guillemet ouvrant, puis après le dernier bloc lu
+        self.source_pos = parent.pos + 1
+        self.closed = False
+
+    def _fill(self):
+        if self.closed:
+            return False
+        source = self.parent.text
+        start = self.source_pos
+        # Au moins deux \uXXXX par bloc : une paire de substitution coupée peut toujours être reportée
+        piece = source[start:start + max(NESTED_BLOCK_SIZE, 12)]
+        cut = _escape_boundary(piece)
+        if not cut:
+            raise ValueError(f"chaîne JSON non terminée en position {start}")
+        chunk, end = scanstring(piece[:cut] + '"', 0)
+        if end <= cut:
+            # Guillemet fermant de la chaîne dans le bloc
+            self.closed = True
+            self.source_pos = start + end
+        else:
+            self.source_pos = start + cut
+            # Paire \uD8xx\uDCxx coupée par le bloc : la première moitié attend le bloc suivant
+            if chunk and '\ud800' <= chunk[-1] <= '\udbff' and source.startswith('\\u', self.source_pos):
+                chunk = chunk[:-1]
+                self.source_pos -= 6
+        self.text = self.text[self.pos:] + chunk
+        self.pos = 0
+        return bool(chunk) or not self.closed
+
+    def _end(self):
+        super()._end()
+        # La chaîne entière est lue : le parent reprend après son guillemet fermant
+        self.parent.pos = self.source_pos
+        self.parent.consumed += 1
+        if self.parent.depth == 0:
+            self.parent._end()
+
+def _iter_hourly(scanner):
+    """Produit ("hourly", station_id, index, HourlyRecord) pour chaque mesure de `hourly`."""
+    for station_id in scanner.iter_object():
+        if station_id.startswith('_') or scanner.peek() != '[':
+            continue  # _params (noms de colonnes) ou entrée inattendue
+        for hour_index in scanner.iter_array():
+            record = scanner.value()
+            if isinstance(record, dict):
+                yield "hourly", station_id, hour_index, HourlyRecord.from_dict(record)
+
+def _iter_stations(scanner):
+    """Produit ("station", None, index, dict) pour chaque station de `stations`."""
+    if scanner.peek() != '[':
+        raise ValueError("champ stations invalide")
+    for index in scanner.iter_array():
+        station = scanner.value()
+        if isinstance(station, dict):
+            yield "station", None, index, station
+
+def iter_stations_payload(raw):
+    """Parcourt en flux un payload StationsMeteorologiques.
+
+    Produit des tuples (type, clé, index, valeur) dans l'ordre du document :
+    - ("station", None, index, dict) pour chaque station ;
+    - ("hourly", station_id, index, HourlyRecord) pour chaque mesure ;
+    - ("field", clé, None, valeur) pour les autres clés de premier niveau.
+
+    `hourly` et `stations` peuvent être des objets ou des chaînes JSON
+    (double encodage Airbyte), null valant une section vide : la mémoire
+    reste proportionnelle à une mesure, quel que soit le nombre de stations
+    ou d'heures de la ligne. Un JSON invalide, y compris un texte après
+    l'objet de premier niveau, lève ValueError.
+    """
+    scanner = JsonScanner(raw)
+    for key in scanner.iter_object():
+        if key not in ('hourly', 'stations'):
+            yield "field", key, None, scanner.value()
+            continue
+        section = scanner.nested()
+        if section.peek() == 'n':
+            section.value()  # null : section vide
+        elif key == 'hourly':
+            yield from _iter_hourly(section)
+        else:
+            yield from _iter_stations(section)
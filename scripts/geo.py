@@ -0,0 +1,117 @@
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Rayon terrestre moyen (km)
+EARTH_RADIUS_KM = 6371.0088
+
+def geojson_point(latitude, longitude):
+    """Point GeoJSON {type, coordinates: [longitude, latitude]} ; None si les coordonnées sont invalides."""
+    try:
+        latitude = float(latitude)
+        longitude = float(longitude)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    return {"type": "Point", "coordinates": [longitude, latitude]}
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """Distances orthodromiques (km) d'un point à des tableaux de coordonnées (degrés)."""
+    lat1 = np.radians(latitude)
+    lat2 = np.radians(np.asarray(latitudes, dtype=float))
+    dlat = lat2 - lat1
+    dlon = np.radians(np.asarray(longitudes, dtype=float) - longitude)
+    a = np.sin(dlat / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+def unit_vectors(latitudes, longitudes):
+    """Coordonnées cartésiennes sur la sphère unité (la distance euclidienne y croît avec la distance réelle)."""
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack((np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)))
+
+def unit_distances_km(points, others):
+    """Distances orthodromiques (km) entre deux ensembles de vecteurs unitaires (matrice len(points) × len(others))."""
+    half_chord = np.sqrt(np.clip((1 - points @ others.T) / 2, 0, 1))
+    return 2 * EARTH_RADIUS_KM * np.arcsin(half_chord)
+
+def _chord(radius_km):
+    """Corde sur la sphère unité correspondant à une distance orthodromique."""
+    return 2 * np.sin(min(radius_km / EARTH_RADIUS_KM, np.pi) / 2)
+
+class StationIndex:
+    """Index spatial en mémoire des stations : k plus proches voisins et recherche par rayon.
+
+    Les stations sont projetées sur la sphère unité et indexées par un
+    KD-tree (scipy, s'il est installé) ; sans scipy, les distances de
+    corde sont calculées en un seul passage vectorisé. Les distances
+    retournées sont des distances haversine en km.
+    """
+
+    def __init__(self, stations):
+        located = [
+            station for station in stations
+            if geojson_point(station.get("latitude"), station.get("longitude")) is not None
+        ]
+        self.stations = located
+        self.latitudes = np.array([float(station["latitude"]) for station in located])
+        self.longitudes = np.array([float(station["longitude"]) for station in located])
+        self.points = unit_vectors(self.latitudes, self.longitudes) if located else np.empty((0, 3))
+        self.tree = cKDTree(self.points) if cKDTree is not None and located else None
+
+    def __len__(self):
+        return len(self.stations)
+
+    def _results(self, indexes, latitude, longitude):
+        """(station, distance km) triés par distance."""
+        indexes = np.asarray(indexes, dtype=int)
+        distances = haversine_km(latitude, longitude, self.latitudes[indexes], self.longitudes[indexes])
+        order = np.argsort(distances, kind="stable")
+        return [(self.stations[indexes[i]], float(distances[i])) for i in order]
+
+    def _candidates(self, point, count):
+        """Indices des `count` stations les plus proches (sphère unité)."""
+        count = min(count, len(self.stations))
+        if self.tree is not None:
+            _, indexes = self.tree.query(point, k=count)
+            return np.atleast_1d(indexes)
+        chords = np.einsum('ij,ij->i', self.points - point, self.points - point)
+        return np.argpartition(chords, count - 1)[:count]
+
+    def nearest(self, latitude, longitude, k=1, where=None, max_km=None):
+        """Les `k` stations les plus proches d'un point ; `where(station)` filtre les candidates."""
+        if not self.stations or k <= 0:
+            return []
+        point = unit_vectors([latitude], [longitude])[0]
+        count = k
+        while True:
+            candidates = self._results(self._candidates(point, count), latitude, longitude)
+            results = [
+                (station, distance) for station, distance in candidates
+                if (where is None or where(station)) and (max_km is None or distance <= max_km)
+            ]
+            # Assez de stations retenues, toutes examinées, ou les suivantes sont hors rayon
+            if len(results) >= k or count >= len(self.stations):
+                return results[:k]
+            if max_km is not None and candidates[-1][1] > max_km:
+                return results
+            count = min(count * 4, len(self.stations))
+
+    def within(self, latitude, longitude, radius_km, where=None):
+        """Stations à moins de `radius_km` d'un point, triées par distance."""
+        if not self.stations:
+            return []
+        point = unit_vectors([latitude], [longitude])[0]
+        if self.tree is not None:
+            indexes = self.tree.query_ball_point(point, _chord(radius_km) * (1 + 1e-9))
+        else:
+            chords = np.sqrt(np.einsum('ij,ij->i', self.points - point, self.points - point))
+            indexes = np.nonzero(chords <= _chord(radius_km) * (1 + 1e-9))[0]
+        return [
+            (station, distance) for station, distance in self._results(indexes, latitude, longitude)
+            if distance <= radius_km and (where is None or where(station))
+        ]
@@ -1,169 +1,325 @@
-import pandas as pd
-import json
+import itertools
 import sys
+import time
 from datetime import datetime
-from io import BytesIO
-from database import db_connector
+from database import db_connector, ensure_indexes
 from normalizer import WeatherDataNormalizer
-from station_manager import StationManager
-from utils import build_weather_doc
+from station_manager import StationManager, print_stations_summary
+from utils import build_weather_doc, source_type, wu_start_date, DayRolloverResolver, parse_cache_info
+from decoders import decode_payload, iter_stations_payload
+from readers import iter_airbyte_chunks, SUPPORTED_EXTENSIONS
+from s3_listing import S3Lister
+from sync_manifest import SyncManifest
+from rollups import RollupUpdater
+from staging_cache import create_staging_cache
+from weather_store import create_weather_writer, ensure_weather_store, weather_collection
+from metrics import metrics, log, StageTimer, format_stages, merge_stages
+from config import IMPORT_WORKERS
 
 def force_log(message):
     """Force l'affichage immédiat des logs."""
     print(message)
     sys.stdout.flush()
 
+def log_row_error(event, source, **fields):
+    """Compte une ligne en erreur et la journalise (log limité en débit : le compteur reste exact)."""
+    metrics.inc("weather_import_row_errors_total", source=source or "unknown")
+    log.log(event, source=source, **fields)
+
 class WeatherDataImporter:
-    """Importateur de données météorologiques depuis S3 vers MongoDB."""
+    """Importateur de données météorologiques depuis S3 (ou une source locale) vers MongoDB."""
     
-    def __init__(self):
+    def __init__(self, connector=None):
         force_log("🔧 Initialisation WeatherDataImporter...")
-        self.s3_client = db_connector.get_s3_client()
-        self.db = db_connector.get_database()
+        connector = connector or db_connector
+        self.storage = connector.get_storage()
+        self.db = connector.get_database()
+        self.bulk_db = connector.get_bulk_database()
         self.normalizer = WeatherDataNormalizer()
-        self.station_manager = StationManager()
+        self.station_manager = StationManager(connector)
+        self.manifest = SyncManifest(self.db)
+        self.rollups = RollupUpdater(self.bulk_db)
+        self.staging = create_staging_cache()
+        ensure_indexes(self.db)
+        ensure_weather_store(self.db)
+        self.station_manager.registry.backfill_locations()
         force_log("✅ WeatherDataImporter initialisé")
     
     def import_csv_to_mongo(self, s3_key, s3_bucket):
-        """Importe un fichier CSV depuis S3 vers MongoDB."""
+        """Importe un fichier (CSV Airbyte, JSON ou xlsx) depuis la source vers MongoDB.
+
+        Retourne le résultat de l'import du fichier (statut, compteurs, durée).
+        """
+        result = {"key": s3_key, "source": source_type(s3_key), "status": "skipped", "rows": 0,
+                  "stations": 0, "weather": 0, "failed": 0, "error": None}
+        start = time.monotonic()
+        timer = StageTimer()
+        body = None
+        chunks = None
+        staged = None
         try:
-            # Lire le fichier CSV depuis S3
-            obj = self.s3_client.get_object(Bucket=s3_bucket, Key=s3_key)
-            df = pd.read_csv(BytesIO(obj['Body'].read()))
-            
-            if '_airbyte_data' not in df.columns:
-                print(f"  /!\  Colonne '_airbyte_data' manquante dans {s3_key}")
-                return
-            
-            if 'StationsMeteorologiques' in s3_key:
-                self._import_stations_meteorologiques(df, s3_key)
-            elif 'WeatherBE' in s3_key or 'WeatherFR' in s3_key:
-                self._import_weather_be_fr(df, s3_key)
+            # Cache de staging : la version (ETag) déjà normalisée est rejouée sans téléchargement
+            if self.staging is not None and result["source"] is not None:
+                with timer.stage('fetch'):
+                    head = self.storage.head_object(Bucket=s3_bucket, Key=s3_key)
+                staged = self.staging.open(s3_key, head.get('ETag'))
+            if staged is not None and staged.hit:
+                print(f"♻️ {s3_key} rejoué depuis le cache de staging")
+                self.manifest.mark_importing(s3_key, head.get('ETag'), head.get('ContentLength'))
+                all_chunks = chunks = (chunk for chunk in ())
+            else:
+                # Lire le fichier depuis la source par morceaux (flux StreamingBody, fichier local...)
+                with timer.stage('fetch'):
+                    obj = self.storage.get_object(Bucket=s3_bucket, Key=s3_key)
+                body = obj['Body']
+                if self.staging is not None and result["source"] is not None:
+                    staged = self.staging.open(s3_key, obj.get('ETag'))
+                self.manifest.mark_importing(s3_key, obj.get('ETag'), obj.get('ContentLength'))
+                chunks = iter_airbyte_chunks(body, s3_key)
+                timed_chunks = timer.timed_iter('csv_parse', chunks)
+                first_chunk = next(timed_chunks, None)
+                
+                if first_chunk is None or '_airbyte_data' not in first_chunk.columns:
+                    print(f"  /!\  Colonne '_airbyte_data' manquante dans {s3_key}")
+                    result["error"] = "colonne '_airbyte_data' manquante"
+                    return result
+                
+                all_chunks = itertools.chain([first_chunk], timed_chunks)
+            source = result["source"]
+            if source == 'StationsMeteorologiques':
+                result.update(self._import_stations_meteorologiques(all_chunks, s3_key, timer, staged))
+                result["status"] = "imported"
+            elif source in ('WeatherBE', 'WeatherFR'):
+                result.update(self._import_weather_be_fr(all_chunks, s3_key, timer, staged))
+                result["status"] = "imported"
             else:
                 print(f"  /!\  Type de fichier non reconnu: {s3_key}")
+                result["error"] = "type de fichier non reconnu"
                 
         except Exception as e:
             print(f"  /!\ Erreur lors de l'importation de {s3_key}: {e}")
+            result["status"] = "error"
+            result["error"] = str(e)
+        finally:
+            if staged is not None and result["status"] != "imported":
+                staged.abort()
+            elif staged is not None and not staged.hit:
+                try:
+                    with timer.stage('staging_write'):
+                        staged.commit()
+                except OSError as e:
+                    print(f"  /!\ Cache de staging non écrit pour {s3_key}: {e}")
+            if chunks is not None:
+                chunks.close()
+                self.manifest.mark_done(result)
+            if body is not None:
+                body.close()
+            result["duration"] = time.monotonic() - start
+            result["stages"] = timer.summary()
+            metrics.record_file(result)
+            if result["stages"]:
+                print(f"⏱️ {s3_key}: {format_stages(result['stages'])}")
+        return result
     
-    def _import_stations_meteorologiques(self, df, s3_key):
-        """Importe les données des stations météorologiques."""
-        print(f"📊 Traitement StationsMeteorologiques: {len(df)} lignes")
-        stations_count = 0
-        weather_count = 0
+    def _staged_docs(self, docs, staged, timer, stats):
+        """Flux de documents passant par le cache de staging (relecture sur un hit, enregistrement sinon)."""
+        if staged is None:
+            return docs
+        if staged.hit:
+            return timer.timed_iter('staging_read', staged.docs(docs, stats))
+        return staged.docs(docs, stats)
+    
+    def _import_stations_meteorologiques(self, chunks, s3_key, timer=None, staged=None):
+        """Importe les données des stations météorologiques (morceaux de DataFrame)."""
+        print("📊 Traitement StationsMeteorologiques")
+        timer = timer or StageTimer()
+        weather_writer = create_weather_writer(self.bulk_db, label="weather",
+                                               on_written=self.rollups.apply, timer=timer)
+        stations = []
+        stats = {"rows": 0}
+        docs = self.iter_stations_docs(chunks, s3_key, timer, stats)
+        for collection, doc, context in self._staged_docs(docs, staged, timer, stats):
+            if collection == "stations":
+                stations.append((doc, context))
+            else:
+                weather_writer.add(doc, context)
         
-        for index, row in df.iterrows():
-            try:
-                print(f"🔍 Ligne {index}: Parsing JSON...")
-                data = json.loads(row['_airbyte_data'])
-                print(f"📋 Ligne {index}: Clés trouvées: {list(data.keys())}")
-                
-                if 'hourly' in data:
-                    hourly_data = data['hourly']
-                    print(f"🕒 Ligne {index}: Type hourly = {type(hourly_data)}")
-                    
-                    # Si hourly est une chaîne, la parser en JSON
-                    if isinstance(hourly_data, str):
-                        print(f"🔄 Ligne {index}: Conversion hourly string vers dict...")
-                        try:
-                            hourly_data = json.loads(hourly_data)
-                            print(f"✅ Ligne {index}: hourly converti - {len(hourly_data)} stations")
-                        except json.JSONDecodeError as e:
-                            print(f"❌ Ligne {index}: Erreur parsing hourly JSON: {e}")
-                            continue
-                    elif isinstance(hourly_data, dict):
-                        print(f"✅ Ligne {index}: hourly déjà dict - {len(hourly_data)} stations")
-                    else:
-                        print(f"⚠️ Ligne {index}: Type hourly inattendu: {type(hourly_data)}")
-                        continue
-                else:
-                    print(f"⚠️ Ligne {index}: pas de clé 'hourly'")
-                    continue
-                
-                # Import stations
-                if 'stations' in data:
-                    stations_data = data['stations']
-                    if isinstance(stations_data, str):
-                        stations_data = json.loads(stations_data)
-                    
-                    print(f"🏗️ Ligne {index}: Import de {len(stations_data)} stations...")
-                    for station in stations_data:
-                        station['source_file'] = s3_key
-                        station['created_at'] = datetime.now()
-                        self.db['stations'].insert_one(station)
-                        stations_count += 1
-                
-                # Import données hourly
-                if isinstance(hourly_data, dict):
-                    print(f"📡 Ligne {index}: Import données hourly...")
-                    for station_id, records in hourly_data.items():
-                        print(f"  📍 Station {station_id}: {len(records)} mesures")
-                        for hour_index, record in enumerate(records):
-                            norm_record = self.normalizer.normalize_hourly_record(record)
-                            doc = build_weather_doc(
-                                norm_record, s3_key, 
-                                row_index=None, 
-                                hour_index=hour_index, 
-                                station_id=station_id
-                            )
-                            self.db['weather'].insert_one(doc)
-                            weather_count += 1
+        # Stations : un seul bulk_write des stations nouvelles ou modifiées
+        with timer.stage('mongo_write'):
+            stations_summary = self.station_manager.registry.upsert_many(stations)
+        weather_summary = weather_writer.close()
+        print_stations_summary(stations_summary)
+        weather_writer.print_summary()
+        print(f"🎉 Résultat: {stations_summary['written']} stations, {weather_summary['written']} données weather")
+        return {
+            "rows": stats["rows"],
+            "stations": stations_summary['written'],
+            "weather": weather_summary['written'],
+            "failed": stations_summary['failed'] + weather_summary['failed']
+        }
+    
+    def iter_stations_docs(self, chunks, s3_key, timer, stats):
+        """Produit les documents (collection, document, contexte) d'un fichier StationsMeteorologiques.
+
+        `stats["rows"]` compte les lignes Airbyte lues. Partagé par l'import
+        synchrone et l'import asynchrone.
+        """
+        for df in chunks:
+            stats["rows"] += len(df)
+            for index, row in df.iterrows():
+                try:
+                    # Parcours en flux : chaque station/mesure est produite dès qu'elle est décodée
+                    fields = []
+                    measures = {}
+                    events = timer.timed_iter('json_decode', iter_stations_payload(row['_airbyte_data']))
+                    for kind, key, position, value in events:
+                        if kind == "hourly":
+                            with timer.stage('normalize'):
+                                norm_record = self.normalizer.normalize_hourly_record(value)
+                            with timer.stage('doc_build'):
+                                doc = build_weather_doc(
+                                    norm_record, s3_key, 
+                                    row_index=None, 
+                                    hour_index=position, 
+                                    station_id=key
+                                )
+                            yield "weather", doc, {"row": index, "station": key, "hour": position}
+                            measures[key] = measures.get(key, 0) + 1
+                        elif kind == "station":
+                            value['source_file'] = s3_key
+                            value['created_at'] = datetime.now()
+                            yield "stations", value, {"row": index, "station": value.get('id')}
+                        else:
+                            fields.append(key)
+                    log.log("stations_row", file=s3_key, row=index, fields=fields, measures=measures)
                             
-            except Exception as e:
-                print(f"❌ Ligne {index}: Erreur complète: {e}")
-                import traceback
-                print(f"📋 Traceback: {traceback.format_exc()}")
-        
-        print(f"🎉 Résultat: {stations_count} stations, {weather_count} données weather")
+                except Exception as e:
+                    log_row_error("stations_row_error", source_type(s3_key), file=s3_key, row=index, error=str(e))
     
-    def _import_weather_be_fr(self, df, s3_key):
-        """Importe les données WeatherBE/WeatherFR."""
+    def _import_weather_be_fr(self, chunks, s3_key, timer=None, staged=None):
+        """Importe les données WeatherBE/WeatherFR (morceaux de DataFrame)."""
         # Déterminer le type de station
-        station_type = 'WeatherBE' if 'WeatherBE' in s3_key else 'WeatherFR'
-        print(f"🌍 Import {station_type}: {len(df)} lignes à traiter")
+        station_type = source_type(s3_key)
+        print(f"🌍 Import {station_type}")
         
         # Créer la station correspondante
         station_id = self.station_manager.create_weather_station(station_type, s3_key)
         
-        weather_count = 0
-        for index, row in df.iterrows():
-            try:
-                if index % 100 == 0:  # Log tous les 100 lignes
-                    print(f"📈 {station_type} - Ligne {index}/{len(df)}")
-                    
-                data = json.loads(row['_airbyte_data'])
-                norm_record = self.normalizer.normalize_be_fr_record(data)
-                # Ajouter l'ID de station aux données normalisées
-                norm_record['station_id'] = station_id
-                doc = build_weather_doc(
-                    norm_record, s3_key, 
-                    row_index=index, 
-                    station_id=station_id
+        timer = timer or StageTimer()
+        weather_writer = create_weather_writer(self.bulk_db, label=f"weather {station_type}",
+                                               on_written=self.rollups.apply, timer=timer)
+        stats = {"rows": 0}
+        docs = self.iter_weather_be_fr_docs(chunks, s3_key, station_id, timer, stats)
+        for _, doc, context in self._staged_docs(docs, staged, timer, stats):
+            weather_writer.add(doc, context)
+        
+        weather_summary = weather_writer.close()
+        weather_writer.print_summary()
+        print(f"🎉 Station {station_type} créée avec {weather_summary['written']} données weather")
+        return {
+            "rows": stats["rows"],
+            "stations": 1 if station_id else 0,
+            "weather": weather_summary['written'],
+            "failed": weather_summary['failed']
+        }
+    
+    def iter_weather_be_fr_docs(self, chunks, s3_key, station_id, timer, stats):
+        """Produit les documents ("weather", document, contexte) d'un fichier WeatherBE/WeatherFR.
+
+        `stats["rows"]` compte les lignes Airbyte lues. Partagé par l'import
+        synchrone et l'import asynchrone.
+        """
+        station_type = source_type(s3_key)
+        # Les lignes WU ne portent que l'heure : la date est reconstruite jour par jour
+        # à partir de la date de début propre au fichier (ou de sa première ligne datée)
+        resolver = DayRolloverResolver(wu_start_date(s3_key))
+        produced = 0
+        for df in chunks:
+            stats["rows"] += len(df)
+            # Décodage JSON ligne par ligne (une ligne invalide n'arrête pas l'import)
+            indexes = []
+            payloads = []
+            with timer.stage('json_decode'):
+                for index, raw in zip(df.index, df['_airbyte_data']):
+                    try:
+                        payloads.append(decode_payload(raw))
+                        indexes.append(index)
+                    except Exception as e:
+                        log_row_error("row_error", station_type, row=int(index), error=str(e))
+        
+            # Normalisation colonne de toutes les lignes du morceau
+            with timer.stage('normalize'):
+                norm_records, errors = self.normalizer.normalize_be_fr_frame(
+                    self.normalizer.payload_frame(payloads)
                 )
-                self.db['weather'].insert_one(doc)
-                weather_count += 1
-            except Exception as e:
-                print(f"❌ {station_type} ligne {index}: {e}")
+            for pos, message in errors:
+                log_row_error("row_error", station_type, row=int(indexes[pos]), error=message)
         
-        print(f"🎉 Station {station_type} créée avec {weather_count} données weather")
+            docs = []
+            with timer.stage('doc_build'):
+                for index, norm_record in zip(indexes, norm_records):
+                    if norm_record is None:
+                        continue
+                    # Heure sans date de début connue : tout le fichier est rejeté (ValueError), ses
+                    # mesures écraseraient celles d'un autre export aux mêmes heures
+                    dh_utc = resolver.resolve(norm_record.get('dh_utc'))
+                    try:
+                        # Ajouter l'ID de station et la date complète aux données normalisées
+                        norm_record['station_id'] = station_id
+                        norm_record['dh_utc'] = dh_utc
+                        doc = build_weather_doc(
+                            norm_record, s3_key, 
+                            row_index=index, 
+                            station_id=station_id
+                        )
+                        docs.append(("weather", doc, {"row": index}))
+                    except Exception as e:
+                        log_row_error("row_error", station_type, row=int(index), error=str(e))
+            yield from docs
+            produced += len(docs)
+            log.log("import_progress", source=station_type, file=s3_key, rows=stats["rows"], documents=produced)
     
-    def import_all_csv_files(self, s3_bucket):
-        """Importe tous les fichiers CSV du bucket S3."""
+    def import_all_csv_files(self, s3_bucket, workers=None):
+        """Importe tous les fichiers CSV du bucket S3.
+
+        Le listing est paginé et produit les clés au fil de l'eau : l'import
+        démarre avant la fin du listing. Avec plus d'un worker
+        (IMPORT_WORKERS par défaut), les fichiers sont répartis sur un pool
+        de threads ou de processus.
+        """
         try:
-            files = self.s3_client.list_objects_v2(Bucket=s3_bucket)
-            if 'Contents' in files:
-                csv_files = [obj['Key'] for obj in files['Contents'] if obj['Key'].endswith('.csv')]
-                
-                for csv_file in csv_files:
-                    print(f"Importation de {csv_file}...")
-                    self.import_csv_to_mongo(csv_file, s3_bucket)
-            else:
+            lister = S3Lister(self.storage, s3_bucket)
+            csv_files = (obj['Key'] for obj in lister.iter_objects(suffix=SUPPORTED_EXTENSIONS))
+            
+            workers = workers or IMPORT_WORKERS
+            if workers > 1:
+                from parallel_import import import_files_parallel
+                return import_files_parallel(csv_files, s3_bucket, workers=workers)
+            
+            results = []
+            for csv_file in csv_files:
+                print(f"Importation de {csv_file}...")
+                results.append(self.import_csv_to_mongo(csv_file, s3_bucket))
+            if not results:
                 print("Aucun fichier trouvé dans le bucket S3")
+            else:
+                print(f"⏱️ Étapes : {format_stages(merge_stages(results))}")
+                parse = parse_cache_info()["parse"]
+                print(f"🧮 Cache d'analyse des unités: {parse['hit_rate']:.1%} de succès "
+                      f"({parse['hits']} hits, {parse['misses']} misses, {parse['size']}/{parse['maxsize']})")
+            return results
                 
         except Exception as e:
             print(f"/!\ Erreur lors de la liste des fichiers S3: {e} /!`\`")
+        return []
     
     def clear_collections(self):
         """Vide les collections MongoDB."""
         self.db['stations'].delete_many({})
+        self.station_manager.registry.invalidate()
         self.db['weather'].delete_many({})
+        if weather_collection() != 'weather':
+            self.db[weather_collection()].delete_many({})
+        self.manifest.clear()
+        self.rollups.clear()
         print("Collections vidées")
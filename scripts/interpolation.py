@@ -0,0 +1,236 @@
+import time
+from datetime import timedelta
+import numpy as np
+from database import db_connector
+from geo import geojson_point, unit_vectors, unit_distances_km
+from weather_store import READING_FIELDS, readings_between
+
+# Grandeurs interpolées par défaut
+DEFAULT_FIELDS = ("temperature", "pressure", "precip_rate")
+METHODS = ('idw', 'kriging')
+# Distance minimale (km) : une maille confondue avec une station prend sa valeur
+MIN_DISTANCE_KM = 1e-6
+
+def regular_grid(bounds, shape):
+    """Latitudes et longitudes (1D) d'une grille régulière ; bounds = (sud, ouest, nord, est), shape = (lignes, colonnes)."""
+    south, west, north, east = bounds
+    rows, cols = shape
+    return np.linspace(south, north, rows), np.linspace(west, east, cols)
+
+def station_bounds(stations, margin=0.1):
+    """Emprise (sud, ouest, nord, est) des stations, élargie de `margin` degrés."""
+    latitudes = [float(station["latitude"]) for station in stations]
+    longitudes = [float(station["longitude"]) for station in stations]
+    return (min(latitudes) - margin, min(longitudes) - margin, max(latitudes) + margin, max(longitudes) + margin)
+
+def _exponential_variogram(distances, range_km, nugget):
+    """Variogramme exponentiel normalisé (palier 1) ; le palier n'influe pas sur les poids du krigeage ordinaire."""
+    gamma = nugget + (1 - nugget) * (1 - np.exp(-3 * distances / range_km))
+    return np.where(distances > 0, gamma, 0.0)
+
+class SpatialInterpolator:
+    """Interpolation de valeurs de stations sur une grille régulière lat/lon.
+
+    - `idw` : inverse de la distance à la puissance `power`, limité aux
+      `neighbors` stations disponibles les plus proches de chaque maille.
+    - `kriging` : krigeage ordinaire « léger » sur toutes les stations
+      disponibles, variogramme exponentiel de portée `range_km` (défaut :
+      distance moyenne entre stations).
+
+    Les stations ne bougent pas : voisins et poids sont mis en cache par
+    ensemble de stations disponibles (au plus `max_cached` ensembles par
+    méthode), les relevés horaires et ceux toutes les 5 minutes alternant
+    d'un horodatage à l'autre.
+
+    Les calculs sont vectorisés stations × mailles, par blocs de
+    `chunk_size` mailles pour borner la mémoire.
+    """
+
+    def __init__(self, stations, latitudes, longitudes, method='idw', power=2, neighbors=8,
+                 range_km=None, nugget=0.0, chunk_size=65536, max_cached=16):
+        if method not in METHODS:
+            raise ValueError(f"Méthode d'interpolation inconnue : {method}")
+        self.station_ids = [station["id"] for station in stations]
+        self.station_lats = np.array([float(station["latitude"]) for station in stations])
+        self.station_lons = np.array([float(station["longitude"]) for station in stations])
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.shape = (len(self.latitudes), len(self.longitudes))
+        cell_lats, cell_lons = np.meshgrid(self.latitudes, self.longitudes, indexing='ij')
+        self.cells = unit_vectors(cell_lats.ravel(), cell_lons.ravel())
+        self.points = unit_vectors(self.station_lats, self.station_lons)
+        self.method = method
+        self.power = power
+        self.neighbors = min(neighbors or len(self.station_ids), len(self.station_ids))
+        self.nugget = nugget
+        self.chunk_size = chunk_size
+        self.max_cached = max_cached
+        self.range_km = range_km or self._mean_station_distance()
+        self._idw = {}
+        self._kriging = {}
+
+    def __len__(self):
+        return len(self.station_ids)
+
+    def _chunks(self):
+        for start in range(0, len(self.cells), self.chunk_size):
+            yield start, min(start + self.chunk_size, len(self.cells))
+
+    def _cell_distances(self, start, end, stations=slice(None)):
+        """Distances (km) mailles [start, end) × stations."""
+        return unit_distances_km(self.cells[start:end], self.points[stations])
+
+    def _mean_station_distance(self):
+        if len(self.station_ids) < 2:
+            return 1.0
+        distances = unit_distances_km(self.points, self.points)
+        return float(distances[np.triu_indices(len(self.station_ids), 1)].mean()) or 1.0
+
+    def _cache(self, cache, key, weights):
+        """Met en cache des poids (le plus ancien ensemble de stations est oublié au-delà de max_cached)."""
+        if len(cache) >= self.max_cached:
+            cache.pop(next(iter(cache)))
+        cache[key] = weights
+
+    def _idw_weights(self, valid):
+        """Voisins (indices de stations) et poids IDW de chaque maille parmi les stations disponibles, en cache par masque."""
+        key = valid.tobytes()
+        if key not in self._idw:
+            stations = np.nonzero(valid)[0]
+            count = min(self.neighbors, len(stations))
+            indexes = np.empty((len(self.cells), count), dtype=np.int32)
+            weights = np.empty((len(self.cells), count), dtype=np.float32)
+            for start, end in self._chunks():
+                distances = self._cell_distances(start, end, stations)
+                if count < len(stations):
+                    nearest = np.argpartition(distances, count - 1, axis=1)[:, :count]
+                    distances = np.take_along_axis(distances, nearest, axis=1)
+                else:
+                    nearest = np.broadcast_to(np.arange(count), distances.shape)
+                indexes[start:end] = stations[nearest]
+                inverse = np.maximum(distances, MIN_DISTANCE_KM) ** -self.power
+                weights[start:end] = inverse / inverse.sum(axis=1, keepdims=True)
+            self._cache(self._idw, key, (indexes, weights))
+        return self._idw[key]
+
+    def _kriging_weights(self, valid):
+        """Poids du krigeage ordinaire (mailles × stations disponibles), en cache par masque de stations."""
+        key = valid.tobytes()
+        if key not in self._kriging:
+            stations = np.nonzero(valid)[0]
+            count = len(stations)
+            between = unit_distances_km(self.points[stations], self.points[stations])
+            system = np.ones((count + 1, count + 1))
+            system[:count, :count] = _exponential_variogram(between, self.range_km, self.nugget)
+            system[count, count] = 0
+            inverse = np.linalg.pinv(system)
+            weights = np.empty((len(self.cells), count), dtype=np.float32)
+            for start, end in self._chunks():
+                rhs = np.ones((end - start, count + 1))
+                rhs[:, :count] = _exponential_variogram(
+                    np.maximum(self._cell_distances(start, end, stations), MIN_DISTANCE_KM),
+                    self.range_km, self.nugget
+                )
+                weights[start:end] = rhs @ inverse[:, :count]
+            self._cache(self._kriging, key, (stations, weights))
+        return self._kriging[key]
+
+    def interpolate(self, values):
+        """Grille (lignes × colonnes) interpolée ; `values` est aligné sur station_ids (NaN = pas de mesure).
+
+        Toute la grille vaut NaN si aucune station n'a de valeur.
+        """
+        values = np.asarray(values, dtype=float)
+        valid = ~np.isnan(values)
+        result = np.full(len(self.cells), np.nan)
+        if not valid.any():
+            return result.reshape(self.shape)
+
+        if self.method == 'kriging':
+            stations, weights = self._kriging_weights(valid)
+            station_values = values[stations]
+            for start, end in self._chunks():
+                result[start:end] = weights[start:end] @ station_values
+            return result.reshape(self.shape)
+
+        indexes, weights = self._idw_weights(valid)
+        for start, end in self._chunks():
+            result[start:end] = (weights[start:end] * values[indexes[start:end]]).sum(axis=1)
+        return result.reshape(self.shape)
+
+class GridInterpolator:
+    """Champs météo interpolés sur une grille à partir des mesures de la base.
+
+    Les stations (coordonnées) viennent du registre ; l'interpolateur et
+    ses poids sont reconstruits quand le registre change. Pour un
+    horodatage donné, chaque station fournit sa mesure la plus proche
+    dans la fenêtre ±`tolerance`.
+    """
+
+    def __init__(self, connector=None, shape=(500, 500), bounds=None, method='idw',
+                 tolerance=timedelta(minutes=30), **options):
+        connector = connector or db_connector
+        self.db = connector.get_database()
+        self.registry = connector.get_station_registry()
+        self.shape = shape
+        self.bounds = bounds
+        self.method = method
+        self.tolerance = tolerance
+        self.options = options
+        self._interpolator = None
+        self._version = None
+
+    def interpolator(self):
+        """Interpolateur des stations localisées du registre (reconstruit si le registre a changé)."""
+        stations = [
+            station for station in self.registry.all()
+            if geojson_point(station.get("latitude"), station.get("longitude")) is not None
+        ]
+        if self._interpolator is None or self._version != self.registry.version:
+            bounds = self.bounds or station_bounds(stations)
+            latitudes, longitudes = regular_grid(bounds, self.shape)
+            self._interpolator = SpatialInterpolator(stations, latitudes, longitudes, method=self.method, **self.options)
+            self._version = self.registry.version
+        return self._interpolator
+
+    def station_values(self, dh_utc, fields=DEFAULT_FIELDS):
+        """Valeurs par grandeur, alignées sur les stations de l'interpolateur (NaN si aucune mesure proche)."""
+        interpolator = self.interpolator()
+        positions = {station_id: index for index, station_id in enumerate(interpolator.station_ids)}
+        values = {name: np.full(len(interpolator), np.nan) for name in fields}
+        gaps = np.full(len(interpolator), np.inf)
+        for reading in readings_between(self.db, dh_utc - self.tolerance, dh_utc + self.tolerance,
+                                        station_ids=interpolator.station_ids):
+            index = positions.get(reading.get("station_id"))
+            if index is None:
+                continue
+            gap = abs((reading["dh_utc"] - dh_utc).total_seconds())
+            if gap >= gaps[index]:
+                continue
+            gaps[index] = gap
+            for name in fields:
+                value = reading.get(name)
+                values[name][index] = value if isinstance(value, (int, float)) else np.nan
+        return values
+
+    def interpolate(self, dh_utc, fields=DEFAULT_FIELDS):
+        """Grilles interpolées {grandeur: tableau (lignes × colonnes)} à l'horodatage `dh_utc`."""
+        unknown = [name for name in fields if name not in READING_FIELDS]
+        if unknown:
+            raise ValueError(f"Grandeurs inconnues : {', '.join(unknown)}")
+        interpolator = self.interpolator()
+        return {
+            name: interpolator.interpolate(values)
+            for name, values in self.station_values(dh_utc, fields).items()
+        }
+
+    def interpolate_range(self, start, end, step=timedelta(hours=1), fields=DEFAULT_FIELDS):
+        """Parcourt les grilles de `start` à `end` (exclu) : (horodatage, {grandeur: grille})."""
+        dh_utc = start
+        while dh_utc < end:
+            begin = time.perf_counter()
+            grids = self.interpolate(dh_utc, fields)
+            print(f"🗺️ {dh_utc:%Y-%m-%d %H:%M} : {len(fields)} grille(s) {self.shape[0]}×{self.shape[1]} "
+                  f"en {time.perf_counter() - begin:.3f}s")
+            yield dh_utc, grids
+            dh_utc += step
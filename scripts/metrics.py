@@ -0,0 +1,238 @@
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config import METRICS_PORT, METRICS_JSON_PATH, LOG_INTERVAL
+
+# Bornes (secondes) des histogrammes de durée
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300)
+
+# Étapes de l'import, dans l'ordre du pipeline
+IMPORT_STAGES = ('fetch', 'csv_parse', 'json_decode', 'normalize', 'doc_build', 'mongo_write', 'rollups')
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+def _format_labels(labels, extra=None):
+    items = list(labels) + (list(extra.items()) if extra else [])
+    if not items:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in items) + "}"
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(DURATION_BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.sum += value
+        self.count += 1
+        for index, bound in enumerate(DURATION_BUCKETS):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+
+class MetricsRegistry:
+    """Compteurs et histogrammes du pipeline, exportables en texte Prometheus ou en JSON."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.help = {}
+
+    def inc(self, name, value=1, **labels):
+        """Incrémente un compteur."""
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """Ajoute une observation (durée en secondes) à un histogramme."""
+        key = (name, _label_key(labels))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = _Histogram()
+            histogram.observe(value)
+
+    def record_file(self, result):
+        """Reporte le résultat d'import d'un fichier (statut, lignes, documents, étapes)."""
+        source = result.get("source") or "unknown"
+        self.inc("weather_import_files_total", status=result.get("status"), source=source)
+        self.inc("weather_import_rows_total", result.get("rows", 0), source=source)
+        self.inc("weather_import_documents_total", result.get("weather", 0), source=source, collection="weather")
+        self.inc("weather_import_documents_total", result.get("stations", 0), source=source, collection="stations")
+        self.inc("weather_import_failed_total", result.get("failed", 0), source=source)
+        self.observe("weather_import_file_seconds", result.get("duration", 0.0), source=source)
+        for stage, seconds in (result.get("stages") or {}).items():
+            self.observe("weather_import_stage_seconds", seconds, stage=stage, source=source)
+
+    def snapshot(self):
+        """État courant sous forme de dict sérialisable en JSON."""
+        with self.lock:
+            return {
+                "timestamp": time.time(),
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "histograms": [
+                    {"name": name, "labels": dict(labels), "count": h.count, "sum": h.sum,
+                     "buckets": dict(zip(map(str, DURATION_BUCKETS), h.counts))}
+                    for (name, labels), h in sorted(self.histograms.items())
+                ]
+            }
+
+    def to_prometheus(self):
+        """Export au format texte Prometheus (exposition 0.0.4)."""
+        lines = []
+        with self.lock:
+            typed = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{_format_labels(labels)} {value}")
+            for (name, labels), h in sorted(self.histograms.items()):
+                if name not in typed:
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                cumulative = 0
+                for bound, count in zip(DURATION_BUCKETS, h.counts):
+                    cumulative += count
+                    lines.append(f"{name}_bucket{_format_labels(labels, {'le': bound})} {cumulative}")
+                lines.append(f"{name}_bucket{_format_labels(labels, {'le': '+Inf'})} {h.count}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {h.sum}")
+                lines.append(f"{name}_count{_format_labels(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def dump_json(self, path=None):
+        """Écrit l'état courant dans un fichier JSON (METRICS_JSON_PATH par défaut)."""
+        path = path or METRICS_JSON_PATH
+        if not path:
+            return None
+        with open(path, 'w') as f:
+            json.dump(self.snapshot(), f, indent=2, default=str)
+        return path
+
+    def reset(self):
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+# Registre global du processus
+metrics = MetricsRegistry()
+
+class StageTimer:
+    """Durées cumulées par étape d'import pour un fichier."""
+
+    def __init__(self):
+        self.seconds = {}
+
+    def add(self, stage, seconds):
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    def timed_iter(self, name, iterable):
+        """Itère en comptant dans l'étape `name` le temps passé à produire chaque élément."""
+        iterator = iter(iterable)
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self.add(name, time.perf_counter() - start)
+                return
+            self.add(name, time.perf_counter() - start)
+            yield item
+
+    def summary(self):
+        """Durées par étape (ordre du pipeline), arrondies à la ms."""
+        ordered = [stage for stage in IMPORT_STAGES if stage in self.seconds]
+        ordered += [stage for stage in self.seconds if stage not in IMPORT_STAGES]
+        return {stage: round(self.seconds[stage], 3) for stage in ordered}
+
+def format_stages(stages):
+    """Ligne lisible des durées par étape."""
+    return " | ".join(f"{stage} {seconds:.2f}s" for stage, seconds in stages.items())
+
+def merge_stages(results):
+    """Cumule les durées par étape d'une liste de résultats d'import."""
+    total = StageTimer()
+    for result in results:
+        for stage, seconds in (result.get("stages") or {}).items():
+            total.add(stage, seconds)
+    return total.summary()
+
+class RateLimitedLog:
+    """Logs structurés (événement clé=valeur) limités à un message par événement et par intervalle.
+
+    Les messages supprimés sont comptés et reportés dans le message suivant
+    du même événement.
+    """
+
+    def __init__(self, interval=None):
+        self.interval = LOG_INTERVAL if interval is None else interval
+        self.lock = threading.Lock()
+        self.last = {}
+        self.suppressed = {}
+
+    def log(self, event, **fields):
+        now = time.monotonic()
+        with self.lock:
+            last = self.last.get(event)
+            if last is not None and now - last < self.interval:
+                self.suppressed[event] = self.suppressed.get(event, 0) + 1
+                return False
+            self.last[event] = now
+            suppressed = self.suppressed.pop(event, 0)
+        if suppressed:
+            fields["suppressed"] = suppressed
+        details = " ".join(f"{name}={json.dumps(value, default=str, ensure_ascii=False)}"
+                           for name, value in fields.items())
+        print(f"event={event} {details}".rstrip())
+        sys.stdout.flush()
+        return True
+
+log = RateLimitedLog()
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/metrics', '/'):
+            self.send_error(404)
+            return
+        body = metrics.to_prometheus().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+_server = None
+
+def start_metrics_server(port=None):
+    """Expose /metrics (texte Prometheus) sur le port local METRICS_PORT ; 0 = désactivé."""
+    global _server
+    port = METRICS_PORT if port is None else port
+    if not port or _server is not None:
+        return _server
+    _server = ThreadingHTTPServer(('0.0.0.0', port), _MetricsHandler)
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"📈 Métriques exposées sur http://0.0.0.0:{port}/metrics")
+    return _server
@@ -0,0 +1,29 @@
+"""MongoDB en mémoire (mongomock) pour les tests et le banc de performance.
+
+mongomock est une dépendance de développement (requirements-dev.txt) : ce
+module ne l'importe qu'à l'appel.
+"""
+
+def ignore_bulk_sort():
+    """mongomock ne connaît pas l'argument `sort` ajouté par pymongo 4.9 aux opérations bulk.
+
+    Correctif de BulkOperationBuilder.add_replace/add_update vérifié avec
+    pymongo 4.18.3 / mongomock 4.3.0 ; sans effet s'il est déjà appliqué.
+    """
+    import mongomock.collection
+
+    for name in ('add_replace', 'add_update'):
+        method = getattr(mongomock.collection.BulkOperationBuilder, name)
+        if not getattr(method, '_ignores_sort', False):
+            def tolerant(self, *args, _method=method, **kwargs):
+                kwargs.pop('sort', None)
+                return _method(self, *args, **kwargs)
+            tolerant._ignores_sort = True
+            setattr(mongomock.collection.BulkOperationBuilder, name, tolerant)
+
+def mongomock_client():
+    """Client MongoDB en mémoire, correctif bulk appliqué (ImportError sans mongomock)."""
+    import mongomock
+
+    ignore_bulk_sort()
+    return mongomock.MongoClient()
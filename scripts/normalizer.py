@@ -1,5 +1,8 @@
+import numpy as np
+import pandas as pd
 from config import HOURLY_TO_BE_FR
-from utils import extract_value_unit, f_to_c, inhg_to_hpa, mph_to_kmh, in_to_mm
+from utils import extract_value_unit, cached_conversion, extract_value_unit_series, present_mask
+from units import UNIT_CONVERSIONS, CONVERSIONS_BY_FIELD, UNIT_DEFAULTS
 
 class WeatherDataNormalizer:
     """Classe pour normaliser les données météorologiques."""
@@ -12,27 +15,12 @@ class WeatherDataNormalizer:
             key = HOURLY_TO_BE_FR.get(k, k)
             value, unit, original = extract_value_unit(v)
             
-            # Conversion des unités
-            if key == "Temperature" and unit == "°F":
+            # Conversion des unités (registre champ/unité)
+            conversion = UNIT_CONVERSIONS.get((key, unit))
+            if conversion is not None:
                 original = v
-                value = f_to_c(value)
-                unit = "degC"
-            elif key == "Dew Point" and unit == "°F":
-                original = v
-                value = f_to_c(value)
-                unit = "degC"
-            elif key == "Pressure" and unit == "in":
-                original = v
-                value = inhg_to_hpa(value)
-                unit = "hPa"
-            elif key in ["Speed", "Gust"] and unit == "mph":
-                original = v
-                value = mph_to_kmh(value)
-                unit = "km/h"
-            elif key in ["Precip. Rate.", "Precip. Accum."] and unit == "in":
-                original = v
-                value = in_to_mm(value)
-                unit = "mm"
+                value = cached_conversion(conversion, value)
+                unit = conversion.target
             
             norm[key] = {
                 "value": value,
@@ -56,29 +44,100 @@ class WeatherDataNormalizer:
         
         return norm
     
+    @staticmethod
+    def payload_frame(payloads):
+        """Construit un DataFrame objet (sans coercition de type) des payloads décodés.
+
+        Une clé absente d'un payload devient NaN, un null JSON reste None.
+        """
+        return pd.DataFrame(list(payloads), dtype=object)
+    
+    @staticmethod
+    def normalize_be_fr_frame(frame):
+        """Normalise un DataFrame de payloads WeatherBE/WeatherFR en une passe colonne.
+
+        Équivalent à normalize_be_fr_record appliqué ligne par ligne :
+        retourne la liste des enregistrements normalisés (None pour une
+        ligne en erreur) et la liste des erreurs (position, message).
+        """
+        columns = {}
+        errors = {}
+        numbers = {}
+        
+        for column in frame.columns:
+            key = HOURLY_TO_BE_FR.get(column, column)
+            present, values, units, originals = extract_value_unit_series(frame[column])
+            if column in ("UV", "Solar"):
+                numbers[column] = (present, _nan_to_none(values))
+            
+            # Conversion des unités par groupe (champ, unité) sur les unités présentes
+            conversions = CONVERSIONS_BY_FIELD.get(key)
+            if conversions:
+                source_units = units.copy()
+                for unit in pd.unique(source_units[present]):
+                    conversion = conversions.get(unit)
+                    if conversion is None:
+                        continue
+                    mask = present & (source_units == unit)
+                    if conversion.needs_value:
+                        invalid = mask & np.isnan(values)
+                        for pos in np.flatnonzero(invalid).tolist():
+                            errors.setdefault(pos, f"{column}: valeur numérique absente pour l'unité {unit}")
+                        mask &= ~invalid
+                    values[mask] = conversion(values[mask])
+                    units[mask] = conversion.target
+            
+            cells = [
+                {"value": value, "unit": unit, "original": original}
+                for value, unit, original in zip(_nan_to_none(values), units.tolist(), originals.tolist())
+            ]
+            _add_column(columns, key, cells, present)
+        
+        # Traitement des champs spéciaux
+        if "UV" in numbers:
+            present, values = numbers["UV"]
+            _add_column(columns, "UV", [{"value": value} for value in values], present)
+        if "Solar" in numbers:
+            present, values = numbers["Solar"]
+            _add_column(columns, "Solar", [{"value": value, "unit": "w/m²"} for value in values], present)
+        if "Wind" in frame.columns:
+            wind = frame["Wind"].tolist()
+            direction = np.fromiter(
+                (type(value) is str and not value.replace('.', '', 1).isdigit() for value in wind),
+                dtype=bool, count=len(wind)
+            )
+            _add_column(columns, "vent_direction_original", wind, direction)
+        for column, key in (("Time", "dh_utc"), ("station_id", "station_id")):
+            if column in frame.columns:
+                _add_column(columns, key, frame[column].tolist(), present_mask(frame[column]))
+        
+        # Assemblage : toutes les colonnes d'un coup, puis retrait des clés absentes de chaque ligne
+        keys = list(columns)
+        norms = [
+            dict(zip(keys, row)) for row in zip(*[cells for cells, _ in columns.values()])
+        ] if columns else [{} for _ in range(len(frame))]
+        for key, (_, present) in columns.items():
+            if not present.all():
+                for pos in np.flatnonzero(~present).tolist():
+                    del norms[pos][key]
+        
+        for pos in errors:
+            norms[pos] = None
+        return norms, sorted(errors.items())
+    
     @staticmethod
     def normalize_hourly_record(record):
         """Normalise un enregistrement horaire standard."""
         norm = {}
         for k, v in record.items():
             key = HOURLY_TO_BE_FR.get(k, k)
-            value, unit, original = extract_value_unit(v)
+            value, unit, original = extract_value_unit(v, UNIT_DEFAULTS.get(key))
             
-            # Unités par défaut
-            unit_defaults = {
-                "Temperature": "degC",
-                "Dew Point": "degC",
-                "Pressure": "hPa",
-                "Speed": "km/h",
-                "Gust": "km/h",
-                "Precip. Rate.": "mm",
-                "Precip. Accum.": "mm",
-                "Humidity": "%",
-                "Solar": "w/m²"
-            }
-            
-            if key in unit_defaults:
-                unit = unit or unit_defaults[key]
+            conversion = UNIT_CONVERSIONS.get((key, unit))
+            if conversion is not None:
+                original = v
+                value = cached_conversion(conversion, value)
+                unit = conversion.target
             
             norm[key] = {
                 "value": value,
@@ -97,3 +156,18 @@ class WeatherDataNormalizer:
             norm["dh_utc"] = record["dh_utc"]
         
         return norm
+
+
+def _add_column(columns, key, cells, present):
+    """Ajoute une colonne de cellules ; pour une clé déjà vue, la dernière cellule présente l'emporte."""
+    if key in columns and not present.all():
+        previous, previous_present = columns[key]
+        cells = [cell if keep else old for old, cell, keep in zip(previous, cells, present.tolist())]
+        present = present | previous_present
+    columns[key] = (cells, present)
+
+def _nan_to_none(values):
+    """Convertit un tableau float en liste Python (NaN -> None)."""
+    objects = values.astype(object)
+    objects[np.isnan(values)] = None
+    return objects.tolist()
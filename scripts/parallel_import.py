@@ -0,0 +1,101 @@
+import threading
+import time
+from multiprocessing import util
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+from config import IMPORT_WORKERS, IMPORT_WORKER_MODE, IMPORT_QUEUE_SIZE
+from database import get_worker_connector, close_worker_connectors
+from metrics import metrics, merge_stages, format_stages
+
+# Importateur propre à chaque worker (thread ou processus)
+_worker_state = threading.local()
+
+def _get_worker_importer():
+    """Retourne l'importateur du worker courant, avec ses propres clients Mongo/S3."""
+    importer = getattr(_worker_state, 'importer', None)
+    if importer is None:
+        from importer import WeatherDataImporter
+        importer = WeatherDataImporter(connector=get_worker_connector())
+        _worker_state.importer = importer
+    return importer
+
+def _init_worker():
+    """Initialisation d'un processus worker : ses clients Mongo/S3 sont fermés à sa sortie.
+
+    Finalize plutôt qu'atexit : un worker démarré par fork sort par
+    os._exit, sans exécuter les fonctions atexit.
+    """
+    util.Finalize(None, close_worker_connectors, exitpriority=10)
+
+def _import_file(s3_key, s3_bucket):
+    """Importe un fichier dans le worker courant ; ne lève jamais d'exception."""
+    try:
+        return _get_worker_importer().import_csv_to_mongo(s3_key, s3_bucket)
+    except Exception as e:
+        return {"key": s3_key, "status": "error", "stations": 0, "weather": 0,
+                "failed": 0, "error": str(e), "duration": 0.0}
+
+def import_files_parallel(s3_keys, s3_bucket, workers=None, mode=None, queue_size=None):
+    """Importe des fichiers S3 (liste ou générateur de clés) sur un pool de workers.
+
+    Au plus `queue_size` fichiers sont en attente ou en cours à un instant
+    donné. Retourne les résultats par fichier triés par clé S3.
+    """
+    workers = workers or IMPORT_WORKERS
+    mode = mode or IMPORT_WORKER_MODE
+    queue_size = max(queue_size or IMPORT_QUEUE_SIZE, workers)
+    if mode == 'process':
+        executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+    
+    print(f"🚀 Import parallèle ({workers} workers, mode {mode})")
+    start = time.monotonic()
+    results = []
+    pending = set()
+    
+    with executor:
+        for s3_key in s3_keys:
+            # File bornée : on attend qu'un fichier se termine avant d'en soumettre un autre
+            if len(pending) >= queue_size:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                results.extend(_collect(done))
+            pending.add(executor.submit(_import_file, s3_key, s3_bucket))
+        
+        done, _ = wait(pending)
+        results.extend(_collect(done))
+    if mode == 'process':
+        # Les métriques des processus workers ne sont pas partagées : report depuis les résultats
+        for result in results:
+            metrics.record_file(result)
+    else:
+        # Connecteurs des threads workers, ouverts dans ce processus
+        close_worker_connectors()
+    
+    results.sort(key=lambda result: result["key"])
+    print_import_summary(results, time.monotonic() - start)
+    return results
+
+def _collect(futures):
+    """Récupère et affiche le résultat des fichiers terminés."""
+    results = []
+    for future in futures:
+        result = future.result()
+        icon = "✅" if result["status"] == "imported" else "⚠️" if result["status"] == "skipped" else "❌"
+        print(f"  {icon} {result['key']}: {result['weather']} mesures en {result['duration']:.1f}s")
+        results.append(result)
+    return results
+
+def print_import_summary(results, duration):
+    """Affiche le résumé final (ordre déterministe par clé S3)."""
+    print(f"\n____RÉSUMÉ DE L'IMPORT ({len(results)} fichiers, {duration:.1f}s)____")
+    for result in results:
+        details = f" - {result['error']}" if result["error"] else ""
+        print(f"  {result['status']:<8} {result['key']}: {result['stations']} stations, "
+              f"{result['weather']} mesures, {result['failed']} erreurs{details}")
+    print(f"=> Total : {sum(r['stations'] for r in results)} stations, "
+          f"{sum(r['weather'] for r in results)} mesures, "
+          f"{sum(r['failed'] for r in results)} erreurs, "
+          f"{sum(1 for r in results if r['status'] == 'error')} fichiers en échec")
+    stages = merge_stages(results)
+    if stages:
+        print(f"⏱️ Étapes : {format_stages(stages)}")
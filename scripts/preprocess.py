@@ -0,0 +1,262 @@
+"""Prétraitement des classeurs Weather Underground (remplace data/add-date.py).
+
+Chaque feuille "DDMMYY" d'un classeur est lue dans un pool de processus,
+sa colonne `Time` est préfixée par la date de la feuille (opération
+vectorisée), puis les feuilles sont assemblées en un fichier par classeur :
+- airbyte : CSV prêt à importer (colonne `_airbyte_data`, comme les exports Airbyte) ;
+- csv : CSV à plat, une colonne par champ ;
+- parquet : fichier Parquet (pyarrow ou fastparquet requis).
+
+Les feuilles inchangées depuis le dernier passage (empreinte SHA-256 du XML
+de la feuille, des chaînes partagées et des styles) ne sont pas relues :
+leur résultat est repris du cache `.preprocess/` du répertoire de sortie.
+
+Exemples :
+    python scripts/preprocess.py                                  # data/*Weather*.xlsx -> data/Clean_data
+    python scripts/preprocess.py --format parquet --workers 4 data/Weather+Underground+-+Ichtegem,+BE.xlsx
+    python scripts/preprocess.py --force                          # ignore le cache
+"""
+import argparse
+import hashlib
+import json
+import os
+import time
+import uuid
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from config import LOCAL_DATA_DIR, PREPROCESS_WORKERS
+from readers import parse_sheet_date
+
+FORMATS = ('airbyte', 'csv', 'parquet')
+EXTENSIONS = {'airbyte': '.csv', 'csv': '.csv', 'parquet': '.parquet'}
+# À incrémenter quand la conversion d'une feuille change (invalide le cache)
+CONVERTER_VERSION = 1
+
+CACHE_DIR = '.preprocess'
+# Sans extension .json : le répertoire de sortie peut être une source d'import
+MANIFEST_NAME = 'manifest'
+
+_MAIN_NS = '{http://schemas.openxmlformats.org/spreadsheetml/2006/main}'
+_REL_ID = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+_READ_BLOCK = 1 << 20
+
+def _digest_member(digest, archive, name):
+    """Ajoute le contenu d'un membre du zip à l'empreinte, par blocs."""
+    if name not in archive.namelist():
+        return
+    with archive.open(name) as member:
+        for block in iter(lambda: member.read(_READ_BLOCK), b''):
+            digest.update(block)
+
+def sheet_hashes(path):
+    """Empreintes des feuilles d'un classeur xlsx, dans l'ordre du classeur, sans le parser.
+
+    Les chaînes partagées et les styles (formats date/heure) entrent dans
+    chaque empreinte : leur modification invalide toutes les feuilles.
+    """
+    with zipfile.ZipFile(path) as archive:
+        workbook = ET.fromstring(archive.read('xl/workbook.xml'))
+        relations = ET.fromstring(archive.read('xl/_rels/workbook.xml.rels'))
+        targets = {relation.get('Id'): relation.get('Target') for relation in relations}
+
+        common = hashlib.sha256(f"v{CONVERTER_VERSION}".encode())
+        _digest_member(common, archive, 'xl/sharedStrings.xml')
+        _digest_member(common, archive, 'xl/styles.xml')
+
+        hashes = {}
+        for sheet in workbook.iter(f'{_MAIN_NS}sheet'):
+            target = targets[sheet.get(_REL_ID)]
+            part = target.lstrip('/') if target.startswith('/') else f"xl/{target}"
+            digest = common.copy()
+            _digest_member(digest, archive, part)
+            hashes[sheet.get('name')] = digest.hexdigest()
+        return hashes
+
+def add_sheet_date(frame, sheet_name):
+    """Préfixe la colonne Time par la date de la feuille "DDMMYY" (les cellules vides restent vides)."""
+    sheet_date = parse_sheet_date(sheet_name)
+    if sheet_date is None or 'Time' not in frame.columns:
+        return frame
+    present = frame['Time'].notna()
+    frame['Time'] = frame['Time'].astype(object)
+    frame.loc[present, 'Time'] = sheet_date.isoformat() + ' ' + frame.loc[present, 'Time'].astype(str)
+    return frame
+
+def convert_sheet(path, sheet_name, cache_path, engine=None):
+    """Lit une feuille, date ses heures et écrit le résultat dans le cache (exécuté dans un worker)."""
+    start = time.monotonic()
+    frame = pd.read_excel(path, sheet_name=sheet_name, engine=engine)
+    frame = add_sheet_date(frame, sheet_name)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    frame.to_pickle(cache_path)
+    return sheet_name, len(frame), time.monotonic() - start
+
+def _airbyte_frame(frame, workbook_name, extracted_at):
+    """Enveloppe les lignes au format des exports Airbyte (identifiants déterministes)."""
+    payloads = frame.to_json(orient='records', lines=True, force_ascii=False, date_format='iso').splitlines()
+    namespace = uuid.uuid5(uuid.NAMESPACE_URL, workbook_name)
+    return pd.DataFrame({
+        "_airbyte_raw_id": [str(uuid.uuid5(namespace, str(index))) for index in range(len(payloads))],
+        "_airbyte_extracted_at": extracted_at,
+        "_airbyte_meta": '{"changes":[]}',
+        "_airbyte_generation_id": 0,
+        "_airbyte_data": payloads
+    })
+
+def write_output(frame, output_path, output_format, workbook_name):
+    """Écrit le classeur assemblé au format demandé (fichier temporaire puis renommage)."""
+    temporary = output_path + '.tmp'
+    if output_format == 'parquet':
+        # Colonnes object de types mêlés (texte / nombre) : texte pour Parquet
+        for column in frame.columns[frame.dtypes == object]:
+            frame[column] = frame[column].astype('string')
+        frame.to_parquet(temporary, index=False)
+    elif output_format == 'airbyte':
+        _airbyte_frame(frame, workbook_name, int(time.time() * 1000)).to_csv(temporary, index=False)
+    else:
+        frame.to_csv(temporary, index=False)
+    os.replace(temporary, output_path)
+
+class Preprocessor:
+    """Convertit des classeurs Weather Underground avec un cache par feuille."""
+
+    def __init__(self, output_dir, output_format='airbyte', workers=None, engine=None, force=False):
+        if output_format not in FORMATS:
+            raise ValueError(f"Format inconnu : {output_format} (disponibles : {', '.join(FORMATS)})")
+        self.output_dir = output_dir
+        self.output_format = output_format
+        self.workers = workers or PREPROCESS_WORKERS
+        self.engine = engine
+        self.force = force
+        self.cache_dir = os.path.join(output_dir, CACHE_DIR)
+        self.manifest_path = os.path.join(self.cache_dir, MANIFEST_NAME)
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self):
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_manifest(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        temporary = self.manifest_path + '.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(self.manifest, f, indent=2, ensure_ascii=False)
+        os.replace(temporary, self.manifest_path)
+
+    def output_path(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.output_dir, f"{stem}_with_date{EXTENSIONS[self.output_format]}")
+
+    def cache_path(self, path, sheet_name):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return os.path.join(self.cache_dir, stem, f"{sheet_name}.pkl")
+
+    def plan(self, paths):
+        """Empreintes des feuilles et feuilles à (re)lire, par classeur."""
+        plans = []
+        for path in paths:
+            name = os.path.basename(path)
+            hashes = sheet_hashes(path)
+            previous = {} if self.force else self.manifest.get(name, {}).get("sheets", {})
+            stale = [
+                sheet for sheet, digest in hashes.items()
+                if previous.get(sheet) != digest or not os.path.exists(self.cache_path(path, sheet))
+            ]
+            plans.append((path, hashes, stale))
+        return plans
+
+    def run(self, paths):
+        """Prétraite les classeurs ; retourne le résumé par classeur."""
+        start = time.monotonic()
+        plans = self.plan(paths)
+        tasks = [(path, sheet) for path, _, stale in plans for sheet in stale]
+        print(f"🚀 Prétraitement : {len(paths)} classeur(s), {len(tasks)} feuille(s) à lire "
+              f"({self.workers} workers, format {self.output_format})")
+
+        rows = {}
+        if self.workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as executor:
+                futures = {
+                    executor.submit(convert_sheet, path, sheet, self.cache_path(path, sheet), self.engine): path
+                    for path, sheet in tasks
+                }
+                for future in as_completed(futures):
+                    sheet, count, duration = future.result()
+                    rows[(futures[future], sheet)] = count
+                    print(f"  Feuille '{sheet}' ({os.path.basename(futures[future])}) : {count} lignes en {duration:.2f}s")
+        else:
+            for path, sheet in tasks:
+                sheet, count, duration = convert_sheet(path, sheet, self.cache_path(path, sheet), self.engine)
+                rows[(path, sheet)] = count
+                print(f"  Feuille '{sheet}' ({os.path.basename(path)}) : {count} lignes en {duration:.2f}s")
+
+        results = []
+        for path, hashes, stale in plans:
+            name = os.path.basename(path)
+            output_path = self.output_path(path)
+            entry = self.manifest.get(name, {})
+            # Sans feuille à relire, une feuille supprimée du classeur change encore la sortie
+            unchanged = (not stale and entry.get("sheets") == hashes and entry.get("format") == self.output_format
+                         and entry.get("output") == output_path and os.path.exists(output_path))
+            if unchanged:
+                print(f"⏭️ {name} inchangé")
+                results.append({"file": name, "output": output_path, "status": "unchanged",
+                                "sheets": len(hashes), "converted": 0})
+                continue
+
+            frames = [pd.read_pickle(self.cache_path(path, sheet)) for sheet in hashes]
+            frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+            write_output(frame, output_path, self.output_format, name)
+            self._prune(path, hashes)
+            self.manifest[name] = {"output": output_path, "format": self.output_format, "sheets": hashes}
+            self._save_manifest()
+            print(f"✅ {output_path} : {len(frame)} lignes ({len(stale)}/{len(hashes)} feuille(s) relue(s))")
+            results.append({"file": name, "output": output_path, "status": "converted",
+                            "sheets": len(hashes), "converted": len(stale), "rows": len(frame)})
+
+        print(f"⏱️ Prétraitement terminé en {time.monotonic() - start:.2f}s")
+        return results
+
+    def _prune(self, path, hashes):
+        """Supprime du cache les feuilles qui n'existent plus dans le classeur."""
+        directory = os.path.dirname(self.cache_path(path, 'x'))
+        for file_name in os.listdir(directory) if os.path.isdir(directory) else []:
+            if file_name.endswith('.pkl') and file_name[:-4] not in hashes:
+                os.remove(os.path.join(directory, file_name))
+
+def default_inputs(data_dir=None):
+    """Classeurs Weather Underground du répertoire de données."""
+    data_dir = data_dir or LOCAL_DATA_DIR
+    return sorted(
+        os.path.join(data_dir, name) for name in os.listdir(data_dir)
+        if name.endswith('.xlsx') and 'Weather' in name and not name.endswith('_with_date.xlsx')
+    )
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Prétraitement des classeurs Weather Underground")
+    parser.add_argument('inputs', nargs='*', help="classeurs xlsx (défaut : classeurs Weather du répertoire de données)")
+    parser.add_argument('--output-dir', default=os.path.join(LOCAL_DATA_DIR, 'Clean_data'))
+    parser.add_argument('--format', choices=FORMATS, default='airbyte')
+    parser.add_argument('--workers', type=int, default=PREPROCESS_WORKERS)
+    parser.add_argument('--engine', help="moteur pandas.read_excel (openpyxl, calamine...)")
+    parser.add_argument('--force', action='store_true', help="relit toutes les feuilles (ignore le cache)")
+    args = parser.parse_args(argv)
+
+    if args.format == 'parquet':
+        try:
+            pd.io.parquet.get_engine('auto')
+        except ImportError as e:
+            parser.error(str(e))
+    os.makedirs(args.output_dir, exist_ok=True)
+    preprocessor = Preprocessor(args.output_dir, args.format, args.workers, args.engine, args.force)
+    return preprocessor.run(args.inputs or default_inputs())
+
+if __name__ == "__main__":
+    main()
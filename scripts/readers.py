@@ -0,0 +1,141 @@
+import io
+import json
+import queue
+import threading
+from datetime import date, datetime, time
+import pandas as pd
+from config import CSV_CHUNK_SIZE, CSV_PREFETCH_CHUNKS
+
+# Marqueur de fin de flux
+_END = object()
+
+# Extensions importables (CSV Airbyte, export JSON brut, classeurs Weather Underground)
+SUPPORTED_EXTENSIONS = ('.csv', '.json', '.xlsx')
+
+def iter_csv_chunks(body, chunksize=None, prefetch=None):
+    """Lit un CSV depuis un flux (StreamingBody S3, fichier...) par morceaux.
+
+    Le morceau suivant est téléchargé et parsé dans un thread pendant que
+    l'appelant traite le morceau courant ; la file est bornée à `prefetch`
+    morceaux pour garder une mémoire constante quelle que soit la taille
+    du fichier.
+    """
+    chunksize = chunksize or CSV_CHUNK_SIZE
+    chunks = queue.Queue(maxsize=prefetch or CSV_PREFETCH_CHUNKS)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce():
+        try:
+            with pd.read_csv(body, chunksize=chunksize) as reader:
+                for chunk in reader:
+                    if not put(chunk):
+                        return
+        except Exception as e:
+            put(e)
+            return
+        put(_END)
+
+    producer = threading.Thread(target=produce, name="csv-prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = chunks.get()
+            if item is _END:
+                break
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        # Arrêt du thread de lecture si l'appelant abandonne le flux
+        stop.set()
+        producer.join()
+
+def parse_sheet_date(sheet_name):
+    """Date d'une feuille Weather Underground nommée "DDMMYY" (None sinon)."""
+    if len(sheet_name) == 6 and sheet_name.isdigit():
+        try:
+            return date(2000 + int(sheet_name[4:]), int(sheet_name[2:4]), int(sheet_name[:2]))
+        except ValueError:
+            return None
+    return None
+
+def _cell(value, sheet_date=None):
+    """Convertit une cellule xlsx en valeur JSON (heures complétées par la date de la feuille)."""
+    if isinstance(value, datetime):
+        return value.isoformat(sep=' ')
+    if isinstance(value, time):
+        if sheet_date is not None:
+            return datetime.combine(sheet_date, value).isoformat(sep=' ')
+        return value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return value
+
+def _iter_xlsx_records(body):
+    """Lignes d'un classeur Weather Underground, feuille par feuille, sous forme de dict."""
+    from openpyxl import load_workbook
+
+    # Fichiers locaux et mmap sont lus en place ; un flux S3 doit être chargé (zip non séquentiel)
+    seekable = getattr(body, 'seekable', None)
+    source = body if seekable is not None and seekable() else io.BytesIO(body.read())
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        for sheet in workbook.worksheets:
+            sheet_date = parse_sheet_date(sheet.title)
+            rows = sheet.iter_rows(values_only=True)
+            header = next(rows, None)
+            if not header:
+                continue
+            columns = [str(name) if name is not None else None for name in header]
+            for row in rows:
+                yield {
+                    name: _cell(value, sheet_date)
+                    for name, value in zip(columns, row)
+                    if name is not None
+                }
+    finally:
+        workbook.close()
+
+def _iter_xlsx_chunks(body, chunksize):
+    """Enveloppe les lignes d'un classeur au format Airbyte (`_airbyte_data`) par morceaux."""
+    records = []
+    start = 0
+    for record in _iter_xlsx_records(body):
+        records.append(json.dumps(record, ensure_ascii=False))
+        if len(records) >= chunksize:
+            yield pd.DataFrame({"_airbyte_data": records}, index=range(start, start + len(records)))
+            start += len(records)
+            records = []
+    if records:
+        yield pd.DataFrame({"_airbyte_data": records}, index=range(start, start + len(records)))
+
+def _iter_json_chunks(body):
+    """Enveloppe un document JSON brut en une seule ligne Airbyte."""
+    raw = body.read()
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    yield pd.DataFrame({"_airbyte_data": [raw]})
+
+def iter_airbyte_chunks(body, key, chunksize=None, prefetch=None):
+    """Lit un fichier source par morceaux au format Airbyte selon son extension.
+
+    - .csv : export Airbyte (colonne `_airbyte_data`), lu en flux ;
+    - .json : document brut (StationsMeteorologiques.json), une seule ligne ;
+    - .xlsx : classeur Weather Underground, une ligne par mesure, l'heure
+      étant complétée par la date de la feuille ("DDMMYY").
+    """
+    chunksize = chunksize or CSV_CHUNK_SIZE
+    if key.endswith('.json'):
+        return _iter_json_chunks(body)
+    if key.endswith('.xlsx'):
+        return _iter_xlsx_chunks(body, chunksize)
+    return iter_csv_chunks(body, chunksize, prefetch)
@@ -0,0 +1,185 @@
+from datetime import timedelta
+from pymongo import UpdateOne, ReplaceOne, DeleteOne
+from weather_store import iter_weather_docs, readings_between, from_reading
+
+# Collections d'agrégats et granularité de leur période
+ROLLUP_PERIODS = {
+    'weather_hourly': lambda dh_utc: dh_utc.replace(minute=0, second=0, microsecond=0),
+    'weather_daily': lambda dh_utc: dh_utc.replace(hour=0, minute=0, second=0, microsecond=0)
+}
+
+def rollup_id(station_id, period):
+    """Clé d'un agrégat (station, période)."""
+    return f"{station_id}|{period.isoformat()}"
+
+def _value(measurement):
+    """Valeur numérique d'une mesure {"value": ...} (None si absente)."""
+    if isinstance(measurement, dict):
+        return measurement.get("value")
+    return None
+
+def _extract(doc):
+    """Extrait les grandeurs agrégées d'un document weather."""
+    measurements = doc.get("measurements") or {}
+    return {
+        "temperature": _value(measurements.get("temperature")),
+        "pressure": _value(measurements.get("pressure")),
+        "humidity": _value(measurements.get("humidity")),
+        "gust": (measurements.get("wind") or {}).get("gust"),
+        "precipitation": (measurements.get("precipitation") or {}).get("accumulation")
+    }
+
+class RollupUpdater:
+    """Maintient les agrégats horaires et journaliers par station (weather_hourly, weather_daily).
+
+    Chaque lot de mesures nouvellement insérées est réduit en mémoire par
+    (station, période) puis appliqué en un bulk_write d'upserts
+    $inc/$min/$max. Les moyennes se calculent à la lecture (somme / nombre).
+
+    Une mesure remplacée (ré-import d'un fichier modifié) ne peut pas être
+    corrigée par incréments ($min/$max) : les périodes qu'elle touche sont
+    recalculées à partir des mesures stockées.
+    """
+
+    def __init__(self, db):
+        self.db = db
+
+    def apply(self, docs, replaced=()):
+        """Ajoute un lot de documents weather aux agrégats ; recalcule les périodes des documents remplacés."""
+        stale = self.periods(replaced)
+        for collection, updates in self.updates(docs, skip=stale).items():
+            self.db[collection].bulk_write(updates, ordered=False)
+        if replaced:
+            self.recompute(stale)
+
+    @staticmethod
+    def _dated(docs):
+        return (doc for doc in docs if doc.get("station_id") is not None and doc.get("dh_utc") is not None)
+
+    def periods(self, docs):
+        """(station, période) touchées par des documents weather, par collection d'agrégats."""
+        return {
+            collection: {(doc["station_id"], period_of(doc["dh_utc"])) for doc in self._dated(docs)}
+            for collection, period_of in ROLLUP_PERIODS.items()
+        }
+
+    def updates(self, docs, skip=None):
+        """Upserts à appliquer par collection d'agrégats pour un lot de documents weather.
+
+        `skip` ({collection: {(station, période)}}) exclut les périodes recalculées par ailleurs.
+        """
+        updates = {}
+        for collection, period_of in ROLLUP_PERIODS.items():
+            excluded = (skip or {}).get(collection, ())
+            partials = {}
+            for doc in self._dated(docs):
+                key = (doc["station_id"], period_of(doc["dh_utc"]))
+                if key in excluded:
+                    continue
+                partial = partials.get(key)
+                if partial is None:
+                    partial = partials[key] = self._partial()
+                self._accumulate(partial, _extract(doc))
+
+            if partials:
+                updates[collection] = [
+                    self._update(station_id, period, partial)
+                    for (station_id, period), partial in partials.items()
+                ]
+        return updates
+
+    def recompute(self, stale):
+        """Recalcule les agrégats listés ({collection: {(station, période)}}) depuis les mesures stockées.
+
+        Une requête par station couvre les jours touchés ; un agrégat sans
+        mesure est supprimé.
+        """
+        partials = {
+            collection: {key: self._partial() for key in keys}
+            for collection, keys in stale.items() if keys
+        }
+        spans = {}
+        for keys in partials.values():
+            for station_id, period in keys:
+                first, last = spans.get(station_id, (period, period))
+                spans[station_id] = (min(first, period), max(last, period))
+
+        day_of = ROLLUP_PERIODS['weather_daily']
+        for station_id, (first, last) in spans.items():
+            end = day_of(last) + timedelta(days=1)
+            for reading in readings_between(self.db, day_of(first), end, station_ids=[station_id]):
+                doc = from_reading(reading)
+                values = None
+                for collection, keys in partials.items():
+                    partial = keys.get((station_id, ROLLUP_PERIODS[collection](doc["dh_utc"])))
+                    if partial is not None:
+                        values = values or _extract(doc)
+                        self._accumulate(partial, values)
+
+        for collection, keys in partials.items():
+            requests = [
+                self._replacement(station_id, period, partial) if partial["inc"]["samples"]
+                else DeleteOne({"_id": rollup_id(station_id, period)})
+                for (station_id, period), partial in keys.items()
+            ]
+            self.db[collection].bulk_write(requests, ordered=False)
+
+    @staticmethod
+    def _partial():
+        return {"inc": {"samples": 0}, "min": {}, "max": {}}
+
+    @staticmethod
+    def _accumulate(partial, values):
+        """Ajoute les valeurs d'une mesure à l'agrégat partiel d'une période."""
+        inc, mins, maxs = partial["inc"], partial["min"], partial["max"]
+        inc["samples"] += 1
+        for name in ("temperature", "pressure", "humidity"):
+            value = values[name]
+            if value is None:
+                continue
+            inc[f"{name}_sum"] = inc.get(f"{name}_sum", 0) + value
+            inc[f"{name}_count"] = inc.get(f"{name}_count", 0) + 1
+        temperature = values["temperature"]
+        if temperature is not None:
+            mins["temperature_min"] = min(mins.get("temperature_min", temperature), temperature)
+            maxs["temperature_max"] = max(maxs.get("temperature_max", temperature), temperature)
+        if values["gust"] is not None:
+            maxs["gust_max"] = max(maxs.get("gust_max", values["gust"]), values["gust"])
+        if values["precipitation"] is not None:
+            inc["precipitation_total"] = inc.get("precipitation_total", 0) + values["precipitation"]
+
+    @staticmethod
+    def _update(station_id, period, partial):
+        """Construit l'upsert d'un agrégat (station, période)."""
+        update = {
+            "$setOnInsert": {"station_id": station_id, "period": period},
+            "$inc": partial["inc"]
+        }
+        if partial["min"]:
+            update["$min"] = partial["min"]
+        if partial["max"]:
+            update["$max"] = partial["max"]
+        return UpdateOne({"_id": rollup_id(station_id, period)}, update, upsert=True)
+
+    @staticmethod
+    def _replacement(station_id, period, partial):
+        """Remplace un agrégat (station, période) par sa valeur recalculée."""
+        doc = {"station_id": station_id, "period": period, **partial["inc"], **partial["min"], **partial["max"]}
+        return ReplaceOne({"_id": rollup_id(station_id, period)}, doc, upsert=True)
+
+    def clear(self):
+        """Vide les collections d'agrégats."""
+        for collection in ROLLUP_PERIODS:
+            self.db[collection].delete_many({})
+
+    def rebuild(self, batch_size=5000):
+        """Reconstruit les agrégats à partir de toutes les mesures (selon WEATHER_STORAGE_MODE)."""
+        self.clear()
+        batch = []
+        for doc in iter_weather_docs(self.db, batch_size=batch_size):
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                self.apply(batch)
+                batch = []
+        if batch:
+            self.apply(batch)
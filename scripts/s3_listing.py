@@ -0,0 +1,97 @@
+import queue
+import threading
+from config import S3_PREFIXES, S3_LIST_PAGE_SIZE
+
+# Marqueur de fin de listing d'un préfixe
+_DONE = object()
+
+class S3Lister:
+    """Listing S3 paginé (jetons de continuation) et partitionné par préfixe.
+
+    Chaque préfixe est listé dans son propre thread ; les objets sont
+    produits au fil des pages pour que l'import démarre avant la fin du
+    listing.
+    """
+
+    def __init__(self, storage, s3_bucket, prefixes=None, page_size=None):
+        self.storage = storage
+        self.s3_bucket = s3_bucket
+        self.prefixes = sorted(set(prefixes or S3_PREFIXES))
+        self.page_size = page_size or S3_LIST_PAGE_SIZE
+
+    def prefix_of(self, s3_key):
+        """Retourne le préfixe (le plus long) auquel appartient une clé."""
+        matching = [prefix for prefix in self.prefixes if s3_key.startswith(prefix)]
+        return max(matching, key=len) if matching else None
+
+    def iter_prefix(self, prefix, start_after=None):
+        """Génère les objets d'un préfixe, page par page."""
+        params = {"Bucket": self.s3_bucket, "Prefix": prefix, "MaxKeys": self.page_size}
+        if start_after:
+            params["StartAfter"] = start_after
+        while True:
+            page = self.storage.list_objects_v2(**params)
+            for obj in page.get('Contents', []):
+                # Un préfixe plus spécifique est listé par son propre thread
+                if self.prefix_of(obj['Key']) == prefix:
+                    yield obj
+            if not page.get('IsTruncated'):
+                break
+            params["ContinuationToken"] = page['NextContinuationToken']
+            params.pop("StartAfter", None)
+
+    def iter_objects(self, start_after=None, suffix=None, buffer_size=None):
+        """Génère les objets de tous les préfixes, listés en parallèle.
+
+        `start_after` associe à chaque préfixe la dernière clé déjà traitée :
+        seules les clés suivantes sont listées.
+        """
+        start_after = start_after or {}
+        if len(self.prefixes) == 1:
+            prefix = self.prefixes[0]
+            for obj in self.iter_prefix(prefix, start_after.get(prefix)):
+                if not suffix or obj['Key'].endswith(suffix):
+                    yield obj
+            return
+
+        objects = queue.Queue(maxsize=buffer_size or self.page_size)
+        stop = threading.Event()
+
+        def put(item):
+            while not stop.is_set():
+                try:
+                    objects.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def list_prefix(prefix):
+            try:
+                for obj in self.iter_prefix(prefix, start_after.get(prefix)):
+                    if not put(obj):
+                        return
+            except Exception as e:
+                put(e)
+            put(_DONE)
+
+        threads = [
+            threading.Thread(target=list_prefix, args=(prefix,), name=f"s3-list-{prefix}", daemon=True)
+            for prefix in self.prefixes
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            remaining = len(threads)
+            while remaining:
+                item = objects.get()
+                if item is _DONE:
+                    remaining -= 1
+                elif isinstance(item, Exception):
+                    raise item
+                elif not suffix or item['Key'].endswith(suffix):
+                    yield item
+        finally:
+            stop.set()
+            for thread in threads:
+                thread.join()
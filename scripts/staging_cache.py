@@ -0,0 +1,217 @@
+import gzip
+import hashlib
+import os
+import bson
+from bson.codec_options import CodecOptions, TypeRegistry
+from config import STAGING_CACHE_DIR, STAGING_CACHE_MAX_BYTES, STAGING_CACHE_FORMAT
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+FORMATS = ('parquet', 'bson')
+EXTENSIONS = {'parquet': '.parquet', 'bson': '.bson.gz'}
+# Lignes par record batch Parquet (écriture et relecture)
+BATCH_ROWS = 10000
+# Dernier enregistrement d'un fichier : nombre de lignes Airbyte du fichier source
+_TRAILER = "__end__"
+# À incrémenter quand les documents produits pour un même fichier changent (normalisation, unités,
+# build_weather_doc, identifiants) : les fichiers en cache d'une version précédente ne sont plus rejoués
+STAGING_VERSION = 1
+
+def _fallback_encoder(value):
+    """Scalaires numpy (index de DataFrame dans les contextes...) encodés comme leurs équivalents Python."""
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+_CODEC_OPTIONS = CodecOptions(type_registry=TypeRegistry(fallback_encoder=_fallback_encoder))
+
+def _encode(document):
+    return bson.encode(document, codec_options=_CODEC_OPTIONS)
+
+def resolve_format(file_format=None):
+    """Format des fichiers du cache : parquet si pyarrow est installé (auto), sinon flux BSON gzip."""
+    file_format = file_format or STAGING_CACHE_FORMAT
+    if file_format == 'auto':
+        return 'parquet' if pa is not None else 'bson'
+    if file_format not in FORMATS:
+        raise ValueError(f"STAGING_CACHE_FORMAT inconnu : {file_format}")
+    if file_format == 'parquet' and pa is None:
+        raise ImportError("pyarrow est requis pour STAGING_CACHE_FORMAT=parquet")
+    return file_format
+
+class StagedFile:
+    """Entrée du cache pour un fichier source : relecture (hit) ou enregistrement (miss).
+
+    docs() remplace le flux de documents de l'import : sur un hit, les
+    documents viennent du cache et le flux d'origine n'est jamais parcouru
+    (ni téléchargement ni parsing) ; sur un miss, chaque document est
+    enregistré au passage. commit() publie l'enregistrement, abort()
+    l'abandonne.
+    """
+
+    def __init__(self, cache, path, hit):
+        self.cache = cache
+        self.path = path
+        self.hit = hit
+        self.temporary = f"{path}.{os.getpid()}.tmp"
+        self.rows = []
+        self.writer = None
+        self.written = 0
+
+    def docs(self, docs, stats):
+        """Flux (collection, document, contexte) ; `stats["rows"]` reçoit le nombre de lignes source."""
+        if self.hit:
+            yield from self._replay(stats)
+            return
+        for collection, doc, context in docs:
+            # Encodé avant l'écriture MongoDB (les writers peuvent modifier le document)
+            self._record(collection, _encode(doc), _encode(context or {}))
+            yield collection, doc, context
+        self._record(_TRAILER, _encode({"rows": stats.get("rows", 0)}), _encode({}))
+
+    def _record(self, collection, doc, context):
+        self.rows.append((collection, doc, context))
+        if len(self.rows) >= BATCH_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self.rows:
+            return
+        collections, docs, contexts = zip(*self.rows)
+        self.rows = []
+        if self.cache.file_format == 'parquet':
+            table = pa.table({
+                "collection": pa.array(collections, pa.string()),
+                "doc": pa.array(docs, pa.binary()),
+                "context": pa.array(contexts, pa.binary())
+            })
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.temporary, table.schema, compression='zstd')
+            self.writer.write_table(table)
+        else:
+            if self.writer is None:
+                self.writer = gzip.open(self.temporary, 'wb', compresslevel=3)
+            for collection, doc, context in zip(collections, docs, contexts):
+                self.writer.write(_encode({"c": collection, "d": doc, "x": context}))
+        self.written += len(collections)
+
+    def _iter_records(self):
+        """Enregistrements (collection, document BSON, contexte BSON) du fichier en cache."""
+        if self.cache.file_format == 'parquet':
+            for batch in pq.ParquetFile(self.path).iter_batches(batch_size=BATCH_ROWS):
+                yield from zip(batch.column("collection").to_pylist(), batch.column("doc").to_pylist(),
+                               batch.column("context").to_pylist())
+        else:
+            with gzip.open(self.path, 'rb') as f:
+                for record in bson.decode_file_iter(f):
+                    yield record["c"], record["d"], record["x"]
+
+    def _replay(self, stats):
+        os.utime(self.path)
+        complete = False
+        for collection, doc, context in self._iter_records():
+            if collection == _TRAILER:
+                stats["rows"] = bson.decode(doc)["rows"]
+                complete = True
+                break
+            yield collection, bson.decode(doc), bson.decode(context)
+        if not complete:
+            raise ValueError(f"Fichier de staging incomplet : {self.path}")
+
+    def commit(self):
+        """Publie l'enregistrement dans le cache (hit : rien à faire)."""
+        if self.hit:
+            return
+        self._flush()
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.writer = None
+        os.replace(self.temporary, self.path)
+        self.cache.evict()
+
+    def abort(self):
+        """Abandonne l'enregistrement (import en erreur)."""
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        self.rows = []
+        if not self.hit and os.path.exists(self.temporary):
+            os.remove(self.temporary)
+
+class StagingCache:
+    """Cache local des documents normalisés de chaque fichier source, indexé par clé S3 + ETag + STAGING_VERSION.
+
+    Un fichier (Parquet compressé zstd, ou flux BSON gzip sans pyarrow) par
+    fichier source. La date de modification sert d'horodatage LRU : une
+    relecture la met à jour et les fichiers les plus anciens sont
+    supprimés au-delà de `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=None, file_format=None):
+        self.directory = directory
+        self.max_bytes = STAGING_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.file_format = resolve_format(file_format)
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, s3_key, etag):
+        digest = hashlib.sha256(f"v{STAGING_VERSION}\0{s3_key}\0{etag}".encode()).hexdigest()
+        return os.path.join(self.directory, digest + EXTENSIONS[self.file_format])
+
+    def open(self, s3_key, etag):
+        """Entrée du cache d'un fichier source (hit si la version `etag` est déjà en cache) ; None sans ETag."""
+        if not etag:
+            return None
+        path = self.path(s3_key, etag)
+        return StagedFile(self, path, hit=os.path.exists(path))
+
+    def _entries(self):
+        """Fichiers du cache : (date d'accès LRU, taille, chemin)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(EXTENSIONS[self.file_format]):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self):
+        """Supprime les fichiers les moins récemment utilisés au-delà de max_bytes ; retourne le nombre supprimé."""
+        if not self.max_bytes:
+            return 0
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            removed += 1
+        return removed
+
+    def clear(self):
+        for _, _, path in self._entries():
+            os.remove(path)
+
+def create_staging_cache(directory=None):
+    """Cache de staging configuré (STAGING_CACHE_DIR) ; None s'il est désactivé."""
+    directory = directory or STAGING_CACHE_DIR
+    if not directory:
+        return None
+    return StagingCache(directory)
@@ -1,12 +1,151 @@
+import threading
+import time
 from datetime import datetime
-from config import WEATHER_STATIONS
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
+from config import WEATHER_STATIONS, STATION_CACHE_TTL
 from database import db_connector
+from weather_store import first_reading_time
+from geo import geojson_point, StationIndex
+
+# Champs fixés à la création de la station (ni comparés ni réécrits ensuite)
+_INSERT_ONLY_FIELDS = ('source_file', 'created_at')
+
+class StationRegistry:
+    """Registre en mémoire de la collection stations, indexé par `id`.
+
+    La collection est chargée une fois puis rechargée après `ttl` secondes
+    (STATION_CACHE_TTL) ou sur invalidate(). Les lectures sont servies
+    depuis la mémoire ; upsert_many n'écrit que les stations nouvelles ou
+    modifiées, en un seul bulk_write dédupliqué.
+    """
+
+    def __init__(self, collection, ttl=None):
+        self.collection = collection
+        self.ttl = STATION_CACHE_TTL if ttl is None else ttl
+        self.lock = threading.RLock()
+        self.stations = None
+        self.loaded_at = 0.0
+        # Incrémenté à chaque rechargement ou écriture (invalide les index dérivés)
+        self.version = 0
+
+    def _cache(self):
+        """Stations en cache, rechargées si le TTL est dépassé."""
+        with self.lock:
+            if self.stations is None or (self.ttl and time.monotonic() - self.loaded_at > self.ttl):
+                self.stations = {
+                    doc['id']: doc
+                    for doc in self.collection.find({"id": {"$type": "string"}}, {"_id": 0})
+                }
+                self.loaded_at = time.monotonic()
+                self.version += 1
+            return self.stations
+
+    def invalidate(self):
+        """Force le rechargement au prochain accès."""
+        with self.lock:
+            self.stations = None
+
+    def get(self, station_id, default=None):
+        return self._cache().get(station_id, default)
+
+    def __contains__(self, station_id):
+        return station_id in self._cache()
+
+    def __len__(self):
+        return len(self._cache())
+
+    def all(self):
+        """Liste des stations en cache."""
+        return list(self._cache().values())
+
+    def upsert_many(self, stations):
+        """Écrit les stations nouvelles ou modifiées ; `stations` est une liste de (document, contexte).
+
+        Une station répétée garde sa dernière version. Retourne le résumé
+        (insérées, mises à jour, inchangées, en erreur, erreurs par station).
+        """
+        latest = {}
+        for doc, context in stations:
+            if doc.get('id') is not None:
+                latest[doc['id']] = (doc, context)
+
+        summary = {"inserted": 0, "updated": 0, "unchanged": 0, "failed": 0, "errors": []}
+        with self.lock:
+            cache = self._cache()
+            changes = []
+            for station_id, (doc, context) in latest.items():
+                fields = {key: value for key, value in doc.items() if key not in _INSERT_ONLY_FIELDS and key != '_id'}
+                location = geojson_point(doc.get('latitude'), doc.get('longitude'))
+                if location is not None:
+                    fields['location'] = location
+                cached = cache.get(station_id)
+                if cached is not None and all(cached.get(key) == value for key, value in fields.items()):
+                    summary["unchanged"] += 1
+                    continue
+                changes.append((station_id, doc, context, fields))
+
+            if changes:
+                requests = [
+                    UpdateOne({"id": station_id}, {
+                        "$set": fields,
+                        "$setOnInsert": {key: doc[key] for key in _INSERT_ONLY_FIELDS if key in doc}
+                    }, upsert=True)
+                    for station_id, doc, _, fields in changes
+                ]
+                failed = {}
+                try:
+                    self.collection.bulk_write(requests, ordered=False)
+                except BulkWriteError as e:
+                    failed = {err['index']: err.get('errmsg') for err in e.details.get('writeErrors', [])}
+                except PyMongoError as e:
+                    failed = {index: str(e) for index in range(len(changes))}
+
+                for index, (station_id, doc, context, fields) in enumerate(changes):
+                    if index in failed:
+                        summary["failed"] += 1
+                        summary["errors"].append({"context": context, "message": failed[index]})
+                        continue
+                    cached = cache.get(station_id)
+                    if cached is None:
+                        summary["inserted"] += 1
+                        cache[station_id] = {**{key: value for key, value in doc.items() if key != '_id'}, **fields}
+                    else:
+                        summary["updated"] += 1
+                        cached.update(fields)
+                self.version += 1
+
+        summary["written"] = summary["inserted"] + summary["updated"] + summary["unchanged"]
+        return summary
+
+    def backfill_locations(self):
+        """Ajoute le champ GeoJSON `location` aux stations qui ont des coordonnées mais pas de location."""
+        requests = []
+        for doc in self.collection.find({"location": {"$exists": False}}, {"id": 1, "latitude": 1, "longitude": 1}):
+            location = geojson_point(doc.get('latitude'), doc.get('longitude'))
+            if location is not None:
+                requests.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"location": location}}))
+        if requests:
+            self.collection.bulk_write(requests, ordered=False)
+            self.invalidate()
+        return len(requests)
+
+def print_stations_summary(summary, max_errors=10):
+    """Affiche le résumé d'un upsert_many du registre."""
+    print(f"📦 stations: {summary['inserted']} insérées, {summary['updated']} mises à jour, "
+          f"{summary['unchanged']} inchangées, {summary['failed']} en erreur")
+    for err in summary["errors"][:max_errors]:
+        print(f"  ❌ {err['context']}: {err['message']}")
 
 class StationManager:
     """Gestionnaire des stations météorologiques."""
     
-    def __init__(self):
-        self.db = db_connector.get_database()
+    def __init__(self, connector=None):
+        connector = connector or db_connector
+        self.db = connector.get_database()
+        self.registry = connector.get_station_registry()
+        self._index = None
+        self._index_version = None
     
     def create_weather_station(self, station_type, s3_key):
         """Crée une station WeatherFR ou WeatherBE dans la base de données."""
@@ -17,23 +156,37 @@ class StationManager:
         station_data['source_file'] = s3_key
         station_data['created_at'] = datetime.now()
         
-        # Vérifier si la station existe déjà
-        existing_station = self.db['stations'].find_one({'id': station_data['id']})
-        if not existing_station:
-            self.db['stations'].insert_one(station_data)
-            print(f"+ Station {station_data['name']} ({station_data['id']}) créée")
-            return station_data['id']
-        else:
+        # Vérifier si la station existe déjà (registre en mémoire)
+        if station_data['id'] in self.registry:
             print(f"-> Station {station_data['name']} ({station_data['id']}) existe déjà")
-            return existing_station['id']
+            return station_data['id']
+        summary = self.registry.upsert_many([(station_data, {"station": station_data['id']})])
+        if summary["failed"]:
+            print(f"/!\ Station {station_data['id']} non créée: {summary['errors'][0]['message']}")
+            return None
+        print(f"+ Station {station_data['name']} ({station_data['id']}) créée")
+        return station_data['id']
     
     def get_first_date_for_station(self, station_id):
         """Récupère la première date disponible pour une station."""
-        doc = self.db['weather'].find_one(
-            {"station_id": station_id}, 
-            sort=[("dh_utc", 1)]
-        )
-        if doc and "dh_utc" in doc:
+        dh_utc = first_reading_time(self.db, station_id)
+        if dh_utc:
             # Extraire juste la date (YYYY-MM-DD)
-            return str(doc["dh_utc"])[:10]
+            return str(dh_utc)[:10]
         return None
+
+    def station_index(self):
+        """Index spatial des stations du registre, reconstruit quand le registre change."""
+        stations = self.registry.all()
+        if self._index is None or self._index_version != self.registry.version:
+            self._index = StationIndex(stations)
+            self._index_version = self.registry.version
+        return self._index
+
+    def nearest_stations(self, latitude, longitude, k=1, where=None, max_km=None):
+        """Les `k` stations les plus proches d'un point : liste de (station, distance km)."""
+        return self.station_index().nearest(latitude, longitude, k=k, where=where, max_km=max_km)
+
+    def stations_within(self, latitude, longitude, radius_km, where=None):
+        """Stations à moins de `radius_km` km d'un point : liste de (station, distance km)."""
+        return self.station_index().within(latitude, longitude, radius_km, where=where)
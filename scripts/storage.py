@@ -0,0 +1,255 @@
+import asyncio
+import bisect
+import fnmatch
+import hashlib
+import io
+import mmap
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, timezone
+from utils import source_type
+from config import STORAGE_BACKEND, LOCAL_DATA_DIR, LOCAL_EXCLUDE, AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY
+
+class StorageBackend(ABC):
+    """Interface commune des sources de fichiers de l'import.
+
+    Elle reprend le sous-ensemble de l'API S3 utilisé par l'importateur et
+    le listing (list_objects_v2 paginé, get_object, head_object) afin que S3, un
+    répertoire local ou des fichiers mappés en mémoire soient
+    interchangeables.
+    """
+
+    @abstractmethod
+    def list_objects_v2(self, Bucket=None, Prefix='', StartAfter=None, MaxKeys=1000, ContinuationToken=None):
+        """Liste une page d'objets (Contents, IsTruncated, NextContinuationToken)."""
+
+    @abstractmethod
+    def get_object(self, Bucket=None, Key=None):
+        """Retourne l'objet : Body (flux binaire avec read/close), ETag, ContentLength."""
+
+    def head_object(self, Bucket=None, Key=None):
+        """Métadonnées de l'objet sans son contenu : ETag, ContentLength."""
+        obj = self._stat(Key)
+        return {'ETag': obj['ETag'], 'ContentLength': obj['Size'], 'LastModified': obj['LastModified']}
+
+class S3Storage(StorageBackend):
+    """Source S3 (client boto3)."""
+
+    def __init__(self, s3_client):
+        self.s3_client = s3_client
+
+    def list_objects_v2(self, **params):
+        return self.s3_client.list_objects_v2(**params)
+
+    def get_object(self, **params):
+        return self.s3_client.get_object(**params)
+
+    def head_object(self, **params):
+        return self.s3_client.head_object(**params)
+
+class LocalStorage(StorageBackend):
+    """Source répertoire local : les clés sont les chemins relatifs à `root`.
+
+    Ne sont pas listés les fichiers LOCAL_EXCLUDE (sorties de preprocess.py)
+    ni, hors du répertoire d'un flux, les fichiers d'un flux qui a son propre
+    répertoire d'exports Airbyte (classeur brut Ichtegem à côté de WeatherBE/) :
+    les mêmes mesures seraient importées plusieurs fois.
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.abspath(root or LOCAL_DATA_DIR)
+        # Clés du listing en cours par préfixe, relues par les pages suivantes
+        self._listings = {}
+
+    def _keys(self):
+        """Clés des fichiers importables du répertoire, triées comme un listing S3."""
+        keys = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                key = os.path.relpath(path, self.root).replace(os.sep, '/')
+                if not any(fnmatch.fnmatch(key, pattern) for pattern in LOCAL_EXCLUDE):
+                    keys.append(key)
+        stream_dirs = {directory for key in keys for directory in key.split('/')[:-1]}
+        return sorted(key for key in keys
+                      if source_type(key) not in stream_dirs or source_type(key) in key.split('/')[:-1])
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(self.root + os.sep):
+            raise KeyError(key)
+        return path
+
+    def _stat(self, key):
+        """Métadonnées d'un fichier au format S3 (l'ETag dérive de la taille et de la date)."""
+        stat = os.stat(self._path(key))
+        etag = hashlib.md5(f"{stat.st_size}-{stat.st_mtime_ns}".encode()).hexdigest()
+        return {
+            'Key': key,
+            'ETag': f'"{etag}"',
+            'Size': stat.st_size,
+            'LastModified': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc)
+        }
+
+    def list_objects_v2(self, Bucket=None, Prefix='', StartAfter=None, MaxKeys=1000, ContinuationToken=None):
+        Prefix = Prefix or ''
+        # Le répertoire n'est parcouru qu'à la première page d'un listing
+        if ContinuationToken is None or Prefix not in self._listings:
+            self._listings[Prefix] = [key for key in self._keys() if key.startswith(Prefix)]
+        keys = self._listings[Prefix]
+        after = ContinuationToken or StartAfter
+        start = bisect.bisect_right(keys, after) if after else 0
+        page = keys[start:start + MaxKeys]
+        truncated = start + MaxKeys < len(keys)
+        response = {
+            'Contents': [self._stat(key) for key in page],
+            'KeyCount': len(page),
+            'IsTruncated': truncated
+        }
+        if truncated:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def _open(self, path):
+        return open(path, 'rb')
+
+    def get_object(self, Bucket=None, Key=None):
+        obj = self._stat(Key)
+        return {
+            'Body': self._open(self._path(Key)),
+            'ETag': obj['ETag'],
+            'ContentLength': obj['Size'],
+            'LastModified': obj['LastModified']
+        }
+
+class MmapStorage(LocalStorage):
+    """Source répertoire local lue par mmap (pas de copie dans un buffer intermédiaire)."""
+
+    def _open(self, path):
+        with open(path, 'rb') as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return open(path, 'rb')
+            # Le mapping reste valide après fermeture du descripteur
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+class MemoryStorage(StorageBackend):
+    """Source en mémoire {clé: contenu binaire} (benchmarks, jeux de données synthétiques)."""
+
+    def __init__(self, files=None):
+        self.files = dict(files or {})
+
+    def _stat(self, key):
+        data = self.files[key]
+        return {
+            'Key': key,
+            'ETag': f'"{hashlib.md5(data).hexdigest()}"',
+            'Size': len(data),
+            'LastModified': datetime.now(timezone.utc)
+        }
+
+    def list_objects_v2(self, Bucket=None, Prefix='', StartAfter=None, MaxKeys=1000, ContinuationToken=None):
+        after = ContinuationToken or StartAfter
+        keys = [key for key in sorted(self.files) if key.startswith(Prefix or '') and (not after or key > after)]
+        page = keys[:MaxKeys]
+        response = {
+            'Contents': [self._stat(key) for key in page],
+            'KeyCount': len(page),
+            'IsTruncated': len(keys) > MaxKeys
+        }
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = page[-1]
+        return response
+
+    def get_object(self, Bucket=None, Key=None):
+        obj = self._stat(Key)
+        return {
+            'Body': io.BytesIO(self.files[Key]),
+            'ETag': obj['ETag'],
+            'ContentLength': obj['Size'],
+            'LastModified': obj['LastModified']
+        }
+
+def create_storage(connector, backend=None):
+    """Instancie la source configurée (STORAGE_BACKEND)."""
+    backend = backend or STORAGE_BACKEND
+    if backend == 'local':
+        return LocalStorage()
+    if backend == 'mmap':
+        return MmapStorage()
+    return S3Storage(connector.get_s3_client())
+
+class AsyncStorageAdapter:
+    """Accès asyncio à une source synchrone : get_object s'exécute dans un thread.
+
+    Le Body retourné reste un flux synchrone, lu ensuite par le parsing
+    (lui aussi exécuté hors de la boucle d'événements).
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+
+    async def get_object(self, Bucket=None, Key=None):
+        return await asyncio.to_thread(self.storage.get_object, Bucket=Bucket, Key=Key)
+
+    async def close(self):
+        pass
+
+class AsyncS3Storage:
+    """Source S3 asyncio (aiobotocore) : le contenu est téléchargé sans bloquer la boucle.
+
+    Chaque objet est lu entièrement en mémoire ; le nombre de
+    téléchargements simultanés est borné par l'appelant.
+    """
+
+    def __init__(self, max_pool_connections=None):
+        self.max_pool_connections = max_pool_connections
+        self._client_context = None
+        self.client = None
+
+    async def _get_client(self):
+        if self.client is None:
+            from aiobotocore.config import AioConfig
+            from aiobotocore.session import get_session
+            config = AioConfig(max_pool_connections=self.max_pool_connections) if self.max_pool_connections else None
+            self._client_context = get_session().create_client(
+                's3',
+                aws_access_key_id=AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
+                config=config
+            )
+            self.client = await self._client_context.__aenter__()
+        return self.client
+
+    async def get_object(self, Bucket=None, Key=None):
+        client = await self._get_client()
+        response = await client.get_object(Bucket=Bucket, Key=Key)
+        async with response['Body'] as stream:
+            data = await stream.read()
+        return {
+            'Body': io.BytesIO(data),
+            'ETag': response.get('ETag'),
+            'ContentLength': response.get('ContentLength'),
+            'LastModified': response.get('LastModified')
+        }
+
+    async def close(self):
+        if self._client_context is not None:
+            await self._client_context.__aexit__(None, None, None)
+            self._client_context = None
+            self.client = None
+
+def create_async_storage(connector, max_pool_connections=None):
+    """Source asyncio de la source du connecteur (connector.get_storage()).
+
+    Une source S3 est lue avec aiobotocore s'il est installé ; toute autre
+    source (locale, mmap, en mémoire, ou S3 sans aiobotocore) est lue dans
+    des threads.
+    """
+    storage = connector.get_storage()
+    if isinstance(storage, S3Storage):
+        try:
+            import aiobotocore  # noqa: F401
+            return AsyncS3Storage(max_pool_connections)
+        except ImportError:
+            pass
+    return AsyncStorageAdapter(storage)
@@ -0,0 +1,376 @@
+import ctypes
+import ctypes.util
+import json
+import os
+import queue
+import select
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from urllib.parse import unquote_plus
+from database import db_connector
+from readers import SUPPORTED_EXTENSIONS
+from metrics import metrics, log
+from config import (
+    SYNC_TRIGGER, SQS_QUEUE_URL, SYNC_DEBOUNCE, SYNC_MAX_WAIT, SYNC_MAX_BATCH,
+    SYNC_RECONCILE_INTERVAL, WATCH_POLL_INTERVAL, S3_FULL_LISTING_EVERY
+)
+
+def _quoted_etag(etag):
+    """ETag au format du listing S3 (entre guillemets) ; les notifications S3 l'envoient sans."""
+    if not etag:
+        return None
+    return etag if etag.startswith('"') else f'"{etag}"'
+
+class EventSource(ABC):
+    """Source d'événements « objet créé » : chaque événement est un dict {key, etag, handle}.
+
+    `receive` attend au plus `timeout` secondes et retourne les événements
+    arrivés ; `ack` confirme les événements traités (les autres peuvent
+    être redélivrés).
+    """
+
+    @abstractmethod
+    def receive(self, timeout):
+        """Événements arrivés en au plus `timeout` secondes (liste éventuellement vide)."""
+
+    def ack(self, events):
+        pass
+
+    def close(self):
+        pass
+
+class MemoryEventSource(EventSource):
+    """File d'événements en mémoire (tests, import déclenché par le code)."""
+
+    def __init__(self):
+        self.events = queue.Queue()
+        self.acked = []
+
+    def publish(self, key, etag=None):
+        self.events.put({"key": key, "etag": _quoted_etag(etag), "handle": None})
+
+    def receive(self, timeout):
+        try:
+            events = [self.events.get(timeout=max(timeout, 0))]
+        except queue.Empty:
+            return []
+        while True:
+            try:
+                events.append(self.events.get_nowait())
+            except queue.Empty:
+                return events
+
+    def ack(self, events):
+        self.acked.extend(events)
+
+class SqsEventSource(EventSource):
+    """Notifications S3 ObjectCreated reçues par une file SQS (directement ou via SNS).
+
+    Long polling (20 s au plus) ; un message n'est supprimé qu'une fois tous
+    ses objets importés. Les messages illisibles et les événements de test
+    S3 sont supprimés aussitôt.
+    """
+
+    def __init__(self, sqs_client, queue_url, s3_bucket=None):
+        self.sqs = sqs_client
+        self.queue_url = queue_url
+        self.s3_bucket = s3_bucket
+        self.pending = {}
+
+    def receive(self, timeout):
+        response = self.sqs.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=10,
+            WaitTimeSeconds=max(0, min(20, int(timeout)))
+        )
+        events = []
+        for message in response.get('Messages', []):
+            handle = message['ReceiptHandle']
+            try:
+                records = self._records(message['Body'])
+            except (ValueError, KeyError, TypeError) as e:
+                log.log("sqs_message_error", message=message.get('MessageId'), error=str(e))
+                records = []
+            keys = [
+                record for record in records
+                if record.get('eventName', '').startswith('ObjectCreated')
+                and (not self.s3_bucket or record['s3']['bucket']['name'] == self.s3_bucket)
+            ]
+            if not keys:
+                self._delete([handle])
+                continue
+            self.pending[handle] = len(keys)
+            for record in keys:
+                s3_object = record['s3']['object']
+                events.append({
+                    "key": unquote_plus(s3_object['key']),
+                    "etag": _quoted_etag(s3_object.get('eTag')),
+                    "handle": handle
+                })
+        return events
+
+    @staticmethod
+    def _records(body):
+        """Enregistrements S3 d'un message (notification S3 directe ou enveloppe SNS)."""
+        payload = json.loads(body)
+        if 'Message' in payload and 'Records' not in payload:
+            payload = json.loads(payload['Message'])
+        return payload.get('Records', [])
+
+    def ack(self, events):
+        done = []
+        for event in events:
+            handle = event["handle"]
+            if handle not in self.pending:
+                continue
+            self.pending[handle] -= 1
+            if self.pending[handle] <= 0:
+                del self.pending[handle]
+                done.append(handle)
+        self._delete(done)
+
+    def _delete(self, handles):
+        for start in range(0, len(handles), 10):
+            entries = [{"Id": str(index), "ReceiptHandle": handle}
+                       for index, handle in enumerate(handles[start:start + 10])]
+            self.sqs.delete_message_batch(QueueUrl=self.queue_url, Entries=entries)
+
+# Constantes inotify (linux/inotify.h)
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_Q_OVERFLOW = 0x00004000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE
+_EVENT_HEADER = struct.Struct('iIII')
+
+class DirectoryWatchSource(EventSource):
+    """Surveillance d'un répertoire local (sources local/mmap) : un événement par fichier écrit.
+
+    Sous Linux, inotify signale les fichiers fermés après écriture ou
+    déplacés dans l'arborescence (y compris les sous-répertoires créés
+    ensuite). Ailleurs, le répertoire est scanné toutes les
+    WATCH_POLL_INTERVAL secondes (taille et date de modification).
+    """
+
+    def __init__(self, root, poll_interval=None):
+        self.root = os.path.abspath(root)
+        self.poll_interval = poll_interval or WATCH_POLL_INTERVAL
+        self.fd = None
+        self.watches = {}
+        self.snapshot = None
+        try:
+            self._init_inotify()
+        except (OSError, AttributeError):
+            self.snapshot = self._scan()
+
+    def _init_inotify(self):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1")
+        self.libc = libc
+        self.fd = fd
+        self._watch_tree(self.root)
+
+    def _watch_tree(self, top):
+        """Surveille un répertoire et ses sous-répertoires ; retourne les fichiers déjà présents."""
+        existing = []
+        for directory, _, filenames in os.walk(top):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(directory), _WATCH_MASK)
+            if wd >= 0:
+                self.watches[wd] = directory
+            existing.extend(os.path.join(directory, filename) for filename in filenames)
+        return existing
+
+    def _key(self, path):
+        return os.path.relpath(path, self.root).replace(os.sep, '/')
+
+    def _scan(self):
+        files = {}
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                files[self._key(path)] = (stat.st_size, stat.st_mtime_ns)
+        return files
+
+    def receive(self, timeout):
+        if self.fd is None:
+            time.sleep(max(0, min(timeout, self.poll_interval)))
+            snapshot = self._scan()
+            changed = [key for key, state in snapshot.items() if self.snapshot.get(key) != state]
+            self.snapshot = snapshot
+            return [{"key": key, "etag": None, "handle": None} for key in sorted(changed)]
+
+        readable, _, _ = select.select([self.fd], [], [], max(timeout, 0))
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        paths = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            name = data[offset + _EVENT_HEADER.size:offset + _EVENT_HEADER.size + length].rstrip(b'\0')
+            offset += _EVENT_HEADER.size + length
+            if mask & _IN_Q_OVERFLOW:
+                # Événements perdus : le listing de réconciliation les rattrapera
+                log.log("watch_overflow", root=self.root)
+                continue
+            directory = self.watches.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, os.fsdecode(name))
+            if mask & _IN_ISDIR:
+                # Nouveau sous-répertoire : il est surveillé, ses fichiers déjà écrits sont signalés
+                paths.extend(self._watch_tree(path))
+            elif mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO):
+                paths.append(path)
+        return [{"key": self._key(path), "etag": None, "handle": None} for path in paths]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+def create_event_source(trigger, connector, storage, s3_bucket=None):
+    """Source d'événements du mode SYNC_TRIGGER (sqs, watch ou memory)."""
+    if trigger == 'sqs':
+        if not SQS_QUEUE_URL:
+            raise ValueError("SQS_QUEUE_URL non défini (SYNC_TRIGGER=sqs)")
+        return SqsEventSource(connector.get_sqs_client(), SQS_QUEUE_URL, s3_bucket)
+    if trigger == 'watch':
+        if not hasattr(storage, 'root'):
+            raise ValueError("SYNC_TRIGGER=watch nécessite une source local ou mmap")
+        return DirectoryWatchSource(storage.root)
+    if trigger == 'memory':
+        return MemoryEventSource()
+    raise ValueError(f"SYNC_TRIGGER inconnu : {trigger}")
+
+class EventDrivenSync:
+    """Synchronisation déclenchée par événements, avec listing de réconciliation périodique.
+
+    Les événements sont regroupés par clé (debounce) : un lot est importé
+    après `debounce` secondes sans nouvel événement, au plus tard
+    `max_wait` secondes après le premier, ou dès `max_batch` fichiers en
+    attente. Un objet déjà importé avec le même ETag (notification
+    redélivrée) est ignoré. Toutes les `reconcile_interval` secondes, un
+    listing rattrape les événements perdus.
+    """
+
+    def __init__(self, monitor, source, debounce=None, max_wait=None, max_batch=None, reconcile_interval=None):
+        self.monitor = monitor
+        self.source = source
+        self.debounce = SYNC_DEBOUNCE if debounce is None else debounce
+        self.max_wait = SYNC_MAX_WAIT if max_wait is None else max_wait
+        self.max_batch = max_batch or SYNC_MAX_BATCH
+        self.reconcile_interval = reconcile_interval or SYNC_RECONCILE_INTERVAL
+        self.pending = {}
+        self.first_event = None
+        self.last_event = None
+        self.reconciliations = 0
+        # Attente maximale d'un receive (20 s : plafond du long polling SQS), délai de prise en compte de stop()
+        self.max_receive_wait = 20.0
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def run(self):
+        """Boucle principale jusqu'à stop() ou KeyboardInterrupt."""
+        next_reconcile = time.monotonic() + self.reconcile_interval
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                self.add(self.source.receive(self._timeout(now, next_reconcile)))
+                now = time.monotonic()
+                if self.ready(now):
+                    self.flush()
+                if now >= next_reconcile:
+                    self.reconcile()
+                    next_reconcile = time.monotonic() + self.reconcile_interval
+        except KeyboardInterrupt:
+            print("\n⏹️  Arrêt de la surveillance demandé")
+        finally:
+            if self.pending:
+                self.flush()
+            self.source.close()
+
+    def _timeout(self, now, next_reconcile):
+        """Attente maximale avant la prochaine échéance (lot prêt ou réconciliation)."""
+        deadline = next_reconcile
+        if self.pending:
+            deadline = min(deadline, self.last_event + self.debounce, self.first_event + self.max_wait)
+        return min(max(0.0, deadline - now), self.max_receive_wait)
+
+    def add(self, events):
+        """Ajoute des événements au lot en attente ; les fichiers non importables sont acquittés."""
+        ignored = []
+        now = time.monotonic()
+        for event in events:
+            if not event["key"].endswith(SUPPORTED_EXTENSIONS):
+                ignored.append(event)
+                continue
+            if not self.pending:
+                self.first_event = now
+            self.last_event = now
+            self.pending.setdefault(event["key"], []).append(event)
+        metrics.inc("weather_sync_events_total", len(events))
+        if ignored:
+            self.source.ack(ignored)
+
+    def ready(self, now):
+        """Vrai si le lot en attente doit être importé."""
+        if not self.pending:
+            return False
+        return (len(self.pending) >= self.max_batch or
+                now - self.last_event >= self.debounce or
+                now - self.first_event >= self.max_wait)
+
+    def flush(self):
+        """Importe les fichiers en attente ; retourne les résultats d'import."""
+        pending, self.pending = self.pending, {}
+        entries = self.monitor.importer.manifest.entries(pending)
+        to_import = []
+        acked = []
+        for key, events in sorted(pending.items()):
+            etag = events[-1]["etag"]
+            entry = entries.get(key)
+            if etag and entry and entry.get('etag') == etag and entry.get('status') == 'imported':
+                acked.extend(events)
+            else:
+                to_import.append(key)
+
+        results = self.monitor.import_files(to_import) if to_import else []
+        failed = {result["key"] for result in results if result["status"] == "error"}
+        # Les événements en échec ne sont pas acquittés : redélivrés par SQS, sinon rattrapés au listing
+        acked.extend(event for key in to_import if key not in failed for event in pending[key])
+        self.source.ack(acked)
+
+        if results:
+            self.monitor.update_last_sync_time()
+            self.monitor.report_cycle(results)
+        log.log("sync_events", events=sum(len(events) for events in pending.values()),
+                files=len(to_import), skipped=len(pending) - len(to_import), failed=len(failed))
+        return results
+
+    def reconcile(self):
+        """Listing de réconciliation (complet tous les S3_FULL_LISTING_EVERY passages)."""
+        self.reconciliations += 1
+        print("🔎 Listing de réconciliation")
+        self.monitor.sync_new_files(full_listing=self.reconciliations % S3_FULL_LISTING_EVERY == 0)
+
+def run_event_driven(monitor, trigger=None):
+    """Surveillance événementielle d'un S3SyncMonitor (SYNC_TRIGGER autre que poll)."""
+    source = create_event_source(trigger or SYNC_TRIGGER, db_connector, monitor.importer.storage, monitor.s3_bucket)
+    print(f"📨 Synchronisation événementielle ({trigger or SYNC_TRIGGER}, debounce {SYNC_DEBOUNCE}s)")
+    EventDrivenSync(monitor, source).run()
@@ -0,0 +1,78 @@
+from datetime import datetime
+
+class SyncManifest:
+    """Manifeste de synchronisation par objet S3 (collection sync_metadata).
+
+    Un document par clé S3 : ETag, taille, nombre de lignes et statut du
+    dernier import. Seuls les objets dont l'ETag a changé (ou dont l'import
+    n'a pas abouti) sont ré-importés.
+    """
+
+    def __init__(self, db):
+        self.collection = db['sync_metadata']
+
+    def entries(self, s3_keys=None):
+        """Retourne les entrées du manifeste (toutes ou celles de `s3_keys`) indexées par clé S3."""
+        query = {"type": "file"}
+        if s3_keys is not None:
+            query["_id"] = {"$in": list(s3_keys)}
+        return {entry['_id']: entry for entry in self.collection.find(query)}
+
+    def needs_import(self, s3_object, entries=None):
+        """Indique si un objet S3 (dict de list_objects_v2) doit être importé."""
+        if entries is None:
+            entry = self.collection.find_one({"_id": s3_object['Key'], "type": "file"})
+        else:
+            entry = entries.get(s3_object['Key'])
+        if entry is None:
+            return True
+        return entry.get('etag') != s3_object.get('ETag') or entry.get('status') in ('importing', 'error')
+
+    def mark_importing(self, s3_key, etag, size):
+        """Enregistre le début de l'import d'un objet."""
+        self.collection.update_one(
+            {"_id": s3_key},
+            {"$set": {
+                "type": "file",
+                "etag": etag,
+                "size": size,
+                "status": "importing",
+                "started_at": datetime.now()
+            }},
+            upsert=True
+        )
+
+    def mark_done(self, result):
+        """Enregistre le résultat de l'import d'un objet (retour de import_csv_to_mongo)."""
+        self.collection.update_one(
+            {"_id": result['key']},
+            {"$set": {
+                "type": "file",
+                "status": result['status'],
+                "row_count": result.get('rows', 0),
+                "weather_count": result['weather'],
+                "failed_count": result['failed'],
+                "error": result['error'],
+                "imported_at": datetime.now()
+            }},
+            upsert=True
+        )
+
+    def checkpoints(self):
+        """Retourne la dernière clé traitée de chaque préfixe S3 (StartAfter du listing)."""
+        return {
+            entry['prefix']: entry['last_key']
+            for entry in self.collection.find({"type": "listing"})
+        }
+
+    def set_checkpoint(self, prefix, last_key):
+        """Enregistre la dernière clé traitée d'un préfixe S3."""
+        self.collection.update_one(
+            {"_id": f"listing:{prefix}"},
+            {"$set": {"type": "listing", "prefix": prefix, "last_key": last_key, "updated_at": datetime.now()}},
+            upsert=True
+        )
+
+    def clear(self):
+        """Vide le manifeste (les fichiers seront tous ré-importés)."""
+        self.collection.delete_many({"type": {"$in": ["file", "listing"]}})
@@ -6,6 +6,13 @@ from database import db_connector
 from importer import WeatherDataImporter
 from analyzer import DataQualityAnalyzer
 from station_manager import StationManager
+from parallel_import import import_files_parallel
+from s3_listing import S3Lister
+from readers import SUPPORTED_EXTENSIONS
+from metrics import metrics, merge_stages, format_stages, start_metrics_server
+from sync_events import run_event_driven
+from weather_store import weather_collection
+from config import IMPORT_WORKERS, S3_FULL_LISTING_EVERY, SYNC_MODE, SYNC_TRIGGER
 
 def force_log(msg):
     """Force l'affichage immédiat des logs ECR."""
@@ -25,6 +32,8 @@ class S3SyncMonitor:
             
             force_log("🔌 Création WeatherDataImporter...")
             self.importer = WeatherDataImporter()
+            self.lister = S3Lister(self.importer.storage, s3_bucket)
+            self.listed_keys = []
             force_log("✅ WeatherDataImporter créé")
             
             force_log("🗄️ Connexion à la base de données...")
@@ -46,11 +55,6 @@ class S3SyncMonitor:
             force_log(f"📋 Traceback: {traceback.format_exc()}")
             raise
         
-    def get_last_sync_time(self):
-        """Récupère la dernière heure de synchronisation."""
-        sync_info = self.db.sync_metadata.find_one({"_id": "last_sync"})
-        return sync_info["timestamp"] if sync_info else datetime.min
-    
     def update_last_sync_time(self):
         """Met à jour l'heure de dernière synchronisation."""
         self.db.sync_metadata.update_one(
@@ -59,55 +63,99 @@ class S3SyncMonitor:
             upsert=True
         )
     
-    def get_new_files(self):
-        """Détecte les nouveaux fichiers S3 depuis la dernière sync."""
-        last_sync = self.get_last_sync_time()
-        
+    def get_new_files(self, full_listing=False):
+        """Détecte les fichiers S3 nouveaux ou modifiés (ETag différent du manifeste).
+
+        Hors listing complet, chaque préfixe n'est listé qu'à partir de la
+        dernière clé traitée (StartAfter).
+        """
+        self.listed_keys = []
         try:
-            files = self.importer.s3_client.list_objects_v2(
-                Bucket=self.s3_bucket,
-                # Optionnel: filtrer par date de modification
-            )
-            
-            if 'Contents' not in files:
-                return []
-            
-            new_files = []
-            for obj in files['Contents']:
-                if (obj['Key'].endswith('.csv') and 
-                    obj['LastModified'].replace(tzinfo=None) > last_sync):
-                    new_files.append(obj['Key'])
+            start_after = None if full_listing else self.importer.manifest.checkpoints()
+            csv_objects = []
+            for obj in self.lister.iter_objects(start_after=start_after):
+                self.listed_keys.append(obj['Key'])
+                if obj['Key'].endswith(SUPPORTED_EXTENSIONS):
+                    csv_objects.append(obj)
             
-            return new_files
+            entries = self.importer.manifest.entries(obj['Key'] for obj in csv_objects)
+            return [
+                obj['Key'] for obj in csv_objects
+                if self.importer.manifest.needs_import(obj, entries)
+            ]
             
         except Exception as e:
             print(f"❌ Erreur lors de la détection des nouveaux fichiers: {e}")
+            self.listed_keys = []
             return []
     
-    def sync_new_files(self):
+    def sync_new_files(self, full_listing=False):
         """Synchronise uniquement les nouveaux fichiers."""
-        new_files = self.get_new_files()
+        new_files = self.get_new_files(full_listing)
         
         if not new_files:
             print("✅ Aucun nouveau fichier détecté")
+            self.advance_checkpoints([])
             return
         
         print(f"🔄 Synchronisation de {len(new_files)} nouveaux fichiers:")
-        for file_key in new_files:
+        results = self.import_files(new_files)
+        
+        self.advance_checkpoints(results)
+        self.update_last_sync_time()
+        self.report_cycle(results)
+        print(f"🎉 Synchronisation terminée à {datetime.now()}")
+    
+    def import_files(self, file_keys):
+        """Importe une liste de fichiers (pool de workers si IMPORT_WORKERS > 1) ; retourne les résultats."""
+        if IMPORT_WORKERS > 1:
+            return import_files_parallel(file_keys, self.s3_bucket, workers=IMPORT_WORKERS)
+        results = []
+        for file_key in file_keys:
             print(f"  - {file_key}")
             try:
-                self.importer.import_csv_to_mongo(file_key, self.s3_bucket)
-                print(f"  ✅ {file_key} importé avec succès")
+                result = self.importer.import_csv_to_mongo(file_key, self.s3_bucket)
+                if result["status"] == "error":
+                    print(f"  ❌ Erreur lors de l'import de {file_key}: {result['error']}")
+                else:
+                    print(f"  ✅ {file_key} importé avec succès")
             except Exception as e:
                 print(f"  ❌ Erreur lors de l'import de {file_key}: {e}")
-        
-        self.update_last_sync_time()
-        print(f"🎉 Synchronisation terminée à {datetime.now()}")
+                result = {"key": file_key, "status": "error", "error": str(e)}
+            results.append(result)
+        return results
+    
+    def report_cycle(self, results):
+        """Résumé et métriques d'un cycle de synchronisation (durées par étape cumulées)."""
+        metrics.inc("weather_sync_cycles_total")
+        metrics.inc("weather_sync_files_total", len(results))
+        stages = merge_stages(results)
+        if stages:
+            print(f"⏱️ Cycle: {len(results)} fichiers, "
+                  f"{sum(r.get('weather', 0) for r in results)} mesures | {format_stages(stages)}")
+        metrics.dump_json()
+    
+    def advance_checkpoints(self, results):
+        """Avance la dernière clé traitée de chaque préfixe jusqu'au premier fichier en échec."""
+        failed = {result["key"] for result in results if result["status"] == "error"}
+        blocked = set()
+        checkpoints = {}
+        for key in sorted(self.listed_keys):
+            prefix = self.lister.prefix_of(key)
+            if prefix in blocked:
+                continue
+            if key in failed:
+                blocked.add(prefix)
+                continue
+            checkpoints[prefix] = key
+        for prefix, key in checkpoints.items():
+            self.importer.manifest.set_checkpoint(prefix, key)
     
     def start_monitoring(self):
         """Démarre la surveillance continue."""
         try:
             force_log(f"🚀 Démarrage de la surveillance S3 (intervalle: {self.check_interval}s)")
+            start_metrics_server()
             force_log(f"📂 Bucket surveillé: {self.s3_bucket}")
             
             # Import initial au démarrage si la DB est vide
@@ -115,10 +163,18 @@ class S3SyncMonitor:
             self.initial_import_if_empty()
             force_log("✅ initial_import_if_empty terminé")
             
+            if SYNC_TRIGGER != 'poll':
+                # Mode événementiel : import à la notification, listing en réconciliation seulement
+                run_event_driven(self)
+                return
+            
+            cycle = 0
             while True:
                 try:
+                    cycle += 1
                     force_log(f"\n⏰ Vérification à {datetime.now()}")
-                    self.sync_new_files()
+                    # Listing complet périodique pour réconcilier les objets réécrits
+                    self.sync_new_files(full_listing=cycle % S3_FULL_LISTING_EVERY == 0)
                     
                     force_log(f"😴 Attente de {self.check_interval} secondes...")
                     time.sleep(self.check_interval)
@@ -137,21 +193,26 @@ class S3SyncMonitor:
             raise
     
     def initial_import_if_empty(self):
-        """Import initial si les collections sont vides."""
-        stations_count = self.db['stations'].count_documents({})
-        weather_count = self.db['weather'].count_documents({})
+        """Import initial complet si les collections sont vides, sinon synchronisation incrémentale."""
+        weather_count = self.db[weather_collection()].count_documents({}, limit=1)
+        
+        if weather_count:
+            # Base déjà alimentée : seuls les fichiers nouveaux ou modifiés sont importés
+            print("|| -- Base existante - Synchronisation incrémentale -- ||")
+            if not self.db['weather_daily'].count_documents({}, limit=1):
+                # Base antérieure aux agrégats : reconstruction unique depuis weather
+                print("📊 Reconstruction des agrégats horaires/journaliers...")
+                self.importer.rollups.rebuild()
+            self.sync_new_files(full_listing=True)
+            return
         
-
         print("|| -- Import initial complet - Mode MAIN -- ||")
         
-        # Vider les collections (comme dans main.py)
-        print("🧹 Vidage des collections MongoDB...")
-        self.importer.clear_collections()
-        
         # Import complet
         print("🌱 Import initial en cours...")
         self.importer.import_all_csv_files(self.s3_bucket)
         self.update_last_sync_time()
+        metrics.dump_json()
         print("✅ Import initial terminé!")
         
         # Analyse qualité des données (comme dans main.py)
@@ -162,15 +223,6 @@ class S3SyncMonitor:
         print("\n🌧️ Analyse des précipitations...")
         self.analyzer.get_station_with_most_precipitation()
         
-        # Benchmarks automatiques (comme dans main.py)
-        print("\n⚡ BENCHMARKS DE PERFORMANCE:")
-        for sid in ["07015", "ILAMAD25", "IICHTE19"]:
-            date = self.station_manager.get_first_date_for_station(sid)
-            if date:
-                self.analyzer.benchmark_weather_query(sid, date)
-            else:
-                print(f"/!\ Aucune donnée trouvée pour la station {sid}")
-        
         print("\n🎉 Import initial et analyse terminés - Passage en mode surveillance")
         
 
@@ -186,6 +238,12 @@ if __name__ == "__main__":
         
         force_log(f"⚙️ Configuration: Bucket={S3_BUCKET}, Interval={CHECK_INTERVAL}s")
         
+        if SYNC_MODE == 'async':
+            force_log("🏗️ Surveillance asynchrone (SYNC_MODE=async)...")
+            from async_importer import run_async_monitor
+            run_async_monitor(S3_BUCKET, CHECK_INTERVAL)
+            sys.exit(0)
+        
         force_log("🏗️ Création du monitor...")
         monitor = S3SyncMonitor(S3_BUCKET, CHECK_INTERVAL)
         force_log("✅ Monitor créé, démarrage de la surveillance...")
@@ -0,0 +1,104 @@
+import numpy as np
+from utils import f_to_c
+
+class UnitConversion:
+    """Conversion vers l'unité cible d'un champ : échelle/décalage, fonction ou constante.
+
+    S'applique indifféremment à un scalaire ou à un tableau NumPy. Une
+    conversion constante (points cardinaux) ne dépend pas de la valeur
+    numérique, absente de ce type de cellule.
+    """
+
+    __slots__ = ('target', 'scale', 'offset', 'func', 'constant')
+
+    def __init__(self, target, scale=1.0, offset=0.0, func=None, constant=None):
+        self.target = target
+        self.scale = scale
+        self.offset = offset
+        self.func = func
+        self.constant = constant
+
+    @property
+    def needs_value(self):
+        """Vrai si la conversion a besoin de la valeur numérique de la cellule."""
+        return self.constant is None
+
+    def __call__(self, value):
+        if self.constant is not None:
+            if isinstance(value, np.ndarray):
+                return np.full(value.shape, self.constant, dtype=float)
+            return self.constant
+        if self.func is not None:
+            return self.func(value)
+        if self.offset:
+            return value * self.scale + self.offset
+        return value * self.scale
+
+    def __repr__(self):
+        return f"UnitConversion(target={self.target!r})"
+
+# Points cardinaux Weather Underground -> degrés
+COMPASS_POINTS = {
+    "N": 0.0, "NNE": 22.5, "NE": 45.0, "ENE": 67.5,
+    "E": 90.0, "ESE": 112.5, "SE": 135.0, "SSE": 157.5,
+    "S": 180.0, "SSW": 202.5, "SW": 225.0, "WSW": 247.5,
+    "W": 270.0, "WNW": 292.5, "NW": 315.0, "NNW": 337.5,
+    "North": 0.0, "East": 90.0, "South": 180.0, "West": 270.0
+}
+
+# Conversions par unité source, partagées par les champs d'une même grandeur
+_TEMPERATURE = {
+    "°F": UnitConversion("degC", func=f_to_c),
+    "°C": UnitConversion("degC")
+}
+_PRESSURE = {
+    "in": UnitConversion("hPa", scale=33.8639),
+    "inHg": UnitConversion("hPa", scale=33.8639),
+    "mb": UnitConversion("hPa")
+}
+_SPEED = {
+    "mph": UnitConversion("km/h", scale=1.60934),
+    "m/s": UnitConversion("km/h", scale=3.6),
+    "knots": UnitConversion("km/h", scale=1.852),
+    "kt": UnitConversion("km/h", scale=1.852),
+    "kts": UnitConversion("km/h", scale=1.852)
+}
+_PRECIPITATION = {
+    "in": UnitConversion("mm", scale=25.4)
+}
+_DIRECTION = {
+    point: UnitConversion("deg", constant=degrees) for point, degrees in COMPASS_POINTS.items()
+}
+
+# Registre (champ canonique, unité source) -> conversion
+UNIT_CONVERSIONS = {
+    (field, unit): conversion
+    for fields, conversions in (
+        (("Temperature", "Dew Point"), _TEMPERATURE),
+        (("Pressure",), _PRESSURE),
+        (("Speed", "Gust"), _SPEED),
+        (("Precip. Rate.", "Precip. Accum."), _PRECIPITATION),
+        (("Wind",), _DIRECTION)
+    )
+    for field in fields
+    for unit, conversion in conversions.items()
+}
+
+# Index par champ pour le chemin colonne
+CONVERSIONS_BY_FIELD = {}
+for (_field, _unit), _conversion in UNIT_CONVERSIONS.items():
+    CONVERSIONS_BY_FIELD.setdefault(_field, {})[_unit] = _conversion
+
+# Unité implicite des champs sans unité (mesures horaires infoclimat)
+UNIT_DEFAULTS = {
+    "Temperature": "degC",
+    "Dew Point": "degC",
+    "Pressure": "hPa",
+    "Speed": "km/h",
+    "Gust": "km/h",
+    "Precip. Rate.": "mm",
+    "Precip. Accum.": "mm",
+    "Humidity": "%",
+    "Solar": "w/m²",
+    "Wind": "deg"
+}
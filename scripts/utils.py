@@ -1,6 +1,55 @@
 import re
+import numpy as np
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, time, timedelta
+from functools import lru_cache
+from config import SOURCE_ALIASES, PARSE_CACHE_SIZE, WU_START_DATES
+
+# Motifs d'extraction valeur / unité (partagés par les chemins ligne et colonne)
+VALUE_REGEX = r'([-+]?\d*\.?\d+)'
+UNIT_REGEX = r'([a-zA-Z%°/]+)'
+_VALUE_PATTERN = re.compile(VALUE_REGEX)
+_UNIT_PATTERN = re.compile(UNIT_REGEX)
+
+def _parse_string(val):
+    """Valeur et unité d'une chaîne : nombre seul ("7.6" infoclimat) sans cache, sinon analyse mémoïsée."""
+    if val[-1:].isdigit() and _VALUE_PATTERN.fullmatch(val):
+        return float(val), None
+    return _parse_unit_string(val)
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def _parse_unit_string(val):
+    """Valeur et unité (None si absente) d'une chaîne ; mémoïsé, le vocabulaire des exports étant réduit."""
+    cleaned = val.replace(',', '.')
+    match = _VALUE_PATTERN.search(cleaned)
+    unit_match = _UNIT_PATTERN.search(cleaned)
+    return (float(match.group(1)) if match else None,
+            unit_match.group(1) if unit_match else None)
+
+@lru_cache(maxsize=PARSE_CACHE_SIZE)
+def cached_conversion(convert, value):
+    """Applique une conversion d'unité scalaire (f_to_c...) avec mémoïsation du résultat."""
+    return convert(value)
+
+def parse_cache_info():
+    """Compteurs des caches d'analyse et de conversion (hits, misses, taille, taux de succès)."""
+    info = {}
+    for name, cached in (("parse", _parse_unit_string), ("conversion", cached_conversion)):
+        stats = cached.cache_info()
+        calls = stats.hits + stats.misses
+        info[name] = {
+            "hits": stats.hits,
+            "misses": stats.misses,
+            "size": stats.currsize,
+            "maxsize": stats.maxsize,
+            "hit_rate": stats.hits / calls if calls else 0.0
+        }
+    return info
+
+def clear_parse_cache():
+    """Vide les caches d'analyse et de conversion (et remet les compteurs à zéro)."""
+    _parse_unit_string.cache_clear()
+    cached_conversion.cache_clear()
 
 def extract_value_unit(val, default_unit=None):
     """Extrait la valeur et l'unité d'une chaîne de caractères."""
@@ -9,14 +58,61 @@ def extract_value_unit(val, default_unit=None):
     if isinstance(val, (int, float)):
         return float(val), default_unit, str(val)
     if isinstance(val, str):
-        original = val
-        match = re.search(r'([-+]?\d*\.?\d+)', val.replace(',', '.'))
-        value = float(match.group(1)) if match else None
-        unit_match = re.search(r'([a-zA-Z%°/]+)', val.replace(',', '.'))
-        unit = unit_match.group(1) if unit_match else default_unit
-        return value, unit, original
+        value, unit = _parse_string(val)
+        return value, unit or default_unit, val
     return None, default_unit, str(val)
 
+def value_types(raw):
+    """Types Python des cellules d'un tableau objet (plus rapide que Series.map(type))."""
+    return np.fromiter(map(type, raw), dtype=object, count=len(raw))
+
+def present_mask(series, kinds=None):
+    """Masque des cellules présentes d'une Series objet (NaN = clé absente du payload)."""
+    raw = series.to_numpy(dtype=object)
+    if kinds is None:
+        kinds = value_types(raw)
+    return ~((kinds == float) & pd.isna(raw))
+
+def extract_value_unit_series(series, default_unit=None):
+    """Version colonne de extract_value_unit sur une Series de type objet.
+
+    Retourne quatre tableaux alignés sur la Series : présence de la clé
+    (NaN = clé absente du payload), valeurs (float, NaN si None), unités
+    et chaînes d'origine.
+    """
+    raw = series.to_numpy(dtype=object)
+    kinds = value_types(raw)
+    is_float = kinds == float
+    present = present_mask(series, kinds)
+
+    values = np.full(len(raw), np.nan)
+    units = np.full(len(raw), default_unit, dtype=object)
+    originals = np.full(len(raw), None, dtype=object)
+
+    # Nombres : valeur directe, unité par défaut
+    numeric = present & ((kinds == int) | is_float | (kinds == bool))
+    if numeric.any():
+        values[numeric] = np.array(raw[numeric], dtype=float)
+        originals[numeric] = [str(v) for v in raw[numeric]]
+
+    # Chaînes : analyse (mémoïsée) du vocabulaire distinct de la colonne
+    is_str = kinds == str
+    if is_str.any():
+        codes, uniques = pd.factorize(raw[is_str])
+        parsed_uniques = [_parse_string(text) for text in uniques]
+        parsed = np.array([value if value is not None else np.nan for value, _ in parsed_uniques], dtype=float)
+        str_units = np.array([unit if unit is not None else default_unit for _, unit in parsed_uniques], dtype=object)
+        values[is_str] = parsed[codes]
+        units[is_str] = str_units[codes]
+        originals[is_str] = raw[is_str]
+
+    # Autres types (listes, dictionnaires...) : représentation texte
+    other = present & ~numeric & ~is_str & (kinds != type(None))
+    if other.any():
+        originals[other] = [str(v) for v in raw[other]]
+
+    return present, values, units, originals
+
 def f_to_c(f):
     """Convertit Fahrenheit en Celsius."""
     return (f - 32) * 5.0/9.0
@@ -33,11 +129,91 @@ def in_to_mm(inches):
     """Convertit pouces en millimètres."""
     return inches * 25.4
 
+def parse_dh_utc(value):
+    """Convertit une date "YYYY-MM-DD HH:MM:SS" en datetime (None si invalide)."""
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).strip())
+    except ValueError:
+        return None
+
+class DayRolloverResolver:
+    """Reconstruit la date complète des heures Weather Underground ("HH:MM:SS").
+
+    Les exports contiennent une feuille par jour, concaténées dans l'ordre :
+    la date avance d'un jour chaque fois que l'heure revient en arrière.
+    Sans `start_date`, le jour vient de la première date complète : une
+    heure rencontrée avant lève ValueError.
+    """
+
+    def __init__(self, start_date=None):
+        self.current_date = datetime.fromisoformat(str(start_date)).date() if start_date else None
+        self.previous_time = None
+
+    def resolve(self, value):
+        """Retourne le datetime complet de `value` (None si absent ou invalide)."""
+        if value is None or value == '':
+            return None
+        if not isinstance(value, datetime) and len(str(value).strip()) <= 8:
+            try:
+                hour = time.fromisoformat(str(value).strip())
+            except ValueError:
+                return None
+            if self.current_date is None:
+                raise ValueError(f"heure {value} sans date de début connue (WU_START_DATES)")
+            if self.previous_time is not None and hour < self.previous_time:
+                self.current_date += timedelta(days=1)
+            self.previous_time = hour
+            return datetime.combine(self.current_date, hour)
+        
+        # Date déjà complète (exports nettoyés) : on recale le jour courant
+        dh_utc = parse_dh_utc(value)
+        if dh_utc is not None:
+            self.current_date = dh_utc.date()
+            self.previous_time = dh_utc.time()
+        return dh_utc
+
+# Flux Airbyte reconnus dans les clés S3
+SOURCE_TYPES = ('StationsMeteorologiques', 'WeatherBE', 'WeatherFR')
+
+def source_type(s3_key):
+    """Retourne le flux Airbyte d'une clé S3 ou d'un fichier local (None si non reconnu)."""
+    for source in SOURCE_TYPES:
+        if source in s3_key:
+            return source
+    for pattern, source in SOURCE_ALIASES.items():
+        if pattern in s3_key:
+            return source
+    return None
+
+_ISO_DATE = re.compile(r'\d{4}-\d{2}-\d{2}')
+
+def wu_start_date(s3_key):
+    """Date du premier jour d'un export Weather Underground : réglage WU_START_DATES du fichier,
+    sinon date AAAA-MM-JJ de son nom (None si inconnue)."""
+    for pattern, start_date in WU_START_DATES.items():
+        if pattern in s3_key:
+            return start_date
+    match = _ISO_DATE.search(s3_key.rsplit('/', 1)[-1])
+    return match.group(0) if match else None
+
+def weather_doc_id(station_id, dh_utc, s3_key, row_index=None, hour_index=None):
+    """Clé déterministe d'une mesure : station + horodatage + flux source.
+
+    Sans horodatage, la position dans le fichier source sert de clé.
+    """
+    if isinstance(dh_utc, datetime):
+        return f"{station_id}|{dh_utc.isoformat()}|{source_type(s3_key)}"
+    return f"{station_id}|{s3_key}|{row_index}|{hour_index}"
+
 def build_weather_doc(record, s3_key, row_index, hour_index=None, station_id=None):
     """Construit un document météorologique pour MongoDB."""
+    dh_utc = parse_dh_utc(record.get('dh_utc') or record.get('Time'))
     doc = {
+        "_id": weather_doc_id(station_id, dh_utc, s3_key, row_index, hour_index),
         "station_id": station_id,
-        "dh_utc": record.get('dh_utc') or record.get('Time'),
+        "dh_utc": dh_utc,
         "measurements": {
             "temperature": record.get("Temperature"),
             "dew_point": record.get("Dew Point"),
@@ -47,7 +223,7 @@ def build_weather_doc(record, s3_key, row_index, hour_index=None, station_id=Non
                 "speed_unit": record.get("Speed", {}).get("unit"),
                 "gust": record.get("Gust", {}).get("value"),
                 "gust_unit": record.get("Gust", {}).get("unit"),
-                "direction": record.get("vent_direction", {}).get("value"),
+                "direction": record.get("Wind", {}).get("value"),
                 "direction_original": record.get("vent_direction_original")
             },
             "pressure": record.get("Pressure"),
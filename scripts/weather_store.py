@@ -0,0 +1,428 @@
+import sys
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pymongo import UpdateOne, ASCENDING
+from pymongo.errors import BulkWriteError, PyMongoError
+from batch_writer import BatchWriter
+from config import WEATHER_STORAGE_MODE, WEATHER_TS_COLLECTION, WEATHER_BUCKETS_COLLECTION
+
+# Modes de stockage des mesures : documents imbriqués (weather), collection time-series
+# ou documents par station et par jour (tableaux de valeurs parallèles)
+STORAGE_MODES = ('documents', 'timeseries', 'buckets')
+
+# Grandeurs d'une mesure à plat : nom -> (chemin dans measurements, unité)
+READING_FIELDS = {
+    "temperature": (("temperature", "value"), "degC"),
+    "dew_point": (("dew_point", "value"), "degC"),
+    "humidity": (("humidity", "value"), "%"),
+    "wind_speed": (("wind", "speed"), "km/h"),
+    "wind_gust": (("wind", "gust"), "km/h"),
+    "wind_direction": (("wind", "direction"), "deg"),
+    "pressure": (("pressure", "value"), "hPa"),
+    "precip_rate": (("precipitation", "rate"), "mm"),
+    "precip_accum": (("precipitation", "accumulation"), "mm"),
+    "solar_radiation": (("solar_radiation", "value"), "w/m²"),
+    "uv_index": (("uv_index",), None)
+}
+
+# Unités des grandeurs, portées par les stations hors mode documents
+READING_UNITS = {name: unit for name, (_, unit) in READING_FIELDS.items() if unit}
+
+def _mode(mode):
+    mode = mode or WEATHER_STORAGE_MODE
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"WEATHER_STORAGE_MODE inconnu : {mode}")
+    return mode
+
+def weather_collection(mode=None):
+    """Nom de la collection des mesures du mode de stockage."""
+    return {
+        'documents': 'weather',
+        'timeseries': WEATHER_TS_COLLECTION,
+        'buckets': WEATHER_BUCKETS_COLLECTION
+    }[_mode(mode)]
+
+def bucket_id(station_id, dh_utc):
+    """Clé du document d'une station pour le jour de `dh_utc`."""
+    return f"{station_id}|{dh_utc.date().isoformat()}"
+
+def to_reading(doc):
+    """Mesure à plat (sans unités ni valeurs d'origine) d'un document weather."""
+    measurements = doc.get("measurements") or {}
+    reading = {
+        "station_id": doc.get("station_id"),
+        "dh_utc": doc.get("dh_utc"),
+        "source_file": (doc.get("metadata") or {}).get("source_file")
+    }
+    for name, (path, _) in READING_FIELDS.items():
+        value = measurements
+        for part in path:
+            value = value.get(part) if isinstance(value, dict) else None
+        reading[name] = value
+    return reading
+
+def from_reading(reading):
+    """Document weather (schéma imbriqué, unités normalisées) d'une mesure à plat."""
+    def measure(name):
+        value = reading.get(name)
+        return None if value is None else {"value": value, "unit": READING_UNITS[name]}
+
+    return {
+        "station_id": reading.get("station_id"),
+        "dh_utc": reading.get("dh_utc"),
+        "measurements": {
+            "temperature": measure("temperature"),
+            "dew_point": measure("dew_point"),
+            "humidity": measure("humidity"),
+            "wind": {
+                "speed": reading.get("wind_speed"),
+                "speed_unit": READING_UNITS["wind_speed"],
+                "gust": reading.get("wind_gust"),
+                "gust_unit": READING_UNITS["wind_gust"],
+                "direction": reading.get("wind_direction")
+            },
+            "pressure": measure("pressure"),
+            "precipitation": {
+                "rate": reading.get("precip_rate"),
+                "accumulation": reading.get("precip_accum"),
+                "unit": READING_UNITS["precip_accum"]
+            },
+            "solar_radiation": measure("solar_radiation"),
+            "uv_index": reading.get("uv_index")
+        },
+        "metadata": {"source_file": reading.get("source_file")}
+    }
+
+def ensure_weather_store(db, mode=None):
+    """Crée la collection du mode de stockage (idempotent) et reporte les unités sur les stations."""
+    mode = _mode(mode)
+    if mode == 'documents':
+        return
+    name = weather_collection(mode)
+    if mode == 'timeseries':
+        if name not in db.list_collection_names():
+            db.create_collection(name, timeseries={
+                "timeField": "dh_utc",
+                "metaField": "station_id",
+                "granularity": "minutes"
+            })
+    else:
+        db[name].create_index([("station_id", ASCENDING), ("day", ASCENDING)], name="station_id_day")
+    set_station_units(db['stations'])
+
+def set_station_units(stations):
+    """Reporte les unités des grandeurs sur les stations qui ne les portent pas encore."""
+    stations.update_many({"units": {"$exists": False}}, {"$set": {"units": READING_UNITS}})
+
+def reading_stages(mode=None):
+    """Étapes d'agrégation produisant une mesure à plat par document (station_id, dh_utc, source_file, grandeurs)."""
+    mode = _mode(mode)
+    if mode == 'timeseries':
+        return []
+    if mode == 'buckets':
+        return [
+            {"$unwind": {"path": "$times", "includeArrayIndex": "position"}},
+            {"$project": {
+                "_id": 0,
+                "station_id": 1,
+                "dh_utc": "$times",
+                "source_file": {"$arrayElemAt": ["$values.source", "$position"]},
+                **{name: {"$arrayElemAt": [f"$values.{name}", "$position"]} for name in READING_FIELDS}
+            }}
+        ]
+    return [{"$project": {
+        "_id": 0,
+        "station_id": 1,
+        "dh_utc": 1,
+        "source_file": "$metadata.source_file",
+        **{name: "$measurements." + ".".join(path) for name, (path, _) in READING_FIELDS.items()}
+    }}]
+
+def iter_weather_docs(db, mode=None, batch_size=1000):
+    """Parcourt toutes les mesures datées au format document weather, quel que soit le mode."""
+    mode = _mode(mode)
+    collection = db[weather_collection(mode)]
+    if mode == 'documents':
+        yield from collection.find({"dh_utc": {"$ne": None}}).batch_size(batch_size)
+    elif mode == 'timeseries':
+        for reading in collection.find({}, {"_id": 0}).batch_size(batch_size):
+            yield from_reading(reading)
+    else:
+        for reading in collection.aggregate(reading_stages(mode), batchSize=batch_size):
+            yield from_reading(reading)
+
+def readings_between(db, start, end, station_ids=None, mode=None):
+    """Mesures à plat (reading_stages) dont dh_utc est dans [start, end), quel que soit le mode.
+
+    `station_ids` restreint aux stations listées (et sert l'index station_id + date).
+    """
+    mode = _mode(mode)
+    stations = {"station_id": {"$in": list(station_ids)}} if station_ids is not None else {}
+    window = {"$match": {"dh_utc": {"$gte": start, "$lt": end}}}
+    if mode == 'buckets':
+        first_day = datetime.combine(start.date(), datetime.min.time())
+        pipeline = [{"$match": {**stations, "day": {"$gte": first_day, "$lt": end}}}] + reading_stages(mode) + [window]
+    else:
+        window["$match"].update(stations)
+        pipeline = [window] + reading_stages(mode)
+    return db[weather_collection(mode)].aggregate(pipeline)
+
+def first_reading_time(db, station_id, mode=None):
+    """Horodatage de la première mesure d'une station (None si aucune)."""
+    mode = _mode(mode)
+    collection = db[weather_collection(mode)]
+    if mode == 'buckets':
+        bucket = collection.find_one({"station_id": station_id}, {"times": 1}, sort=[("day", 1)])
+        return min(bucket["times"]) if bucket and bucket.get("times") else None
+    doc = collection.find_one({"station_id": station_id, "dh_utc": {"$ne": None}}, sort=[("dh_utc", 1)])
+    return doc.get("dh_utc") if doc else None
+
+class _ReadingWriter(BatchWriter, ABC):
+    """Écriture des mesures à plat, une par (station, horodatage).
+
+    Les lots reçoivent les documents weather de l'import ; `on_written` reçoit
+    ces mêmes documents, mesures nouvelles et mesures remplacées (agrégats).
+    Comme en mode documents, une mesure déjà stockée prend les valeurs de la
+    nouvelle (ré-import d'un fichier corrigé) et compte comme mise à jour.
+    Les unités, absentes des mesures, sont reportées sur les stations à la
+    fermeture du writer. Une mesure sans horodatage ne peut pas être stockée.
+    """
+
+    def __init__(self, collection, stations=None, **kwargs):
+        super().__init__(collection, **kwargs)
+        self.stations = stations
+
+    def flush(self):
+        pending = self._take()
+        if pending is None:
+            return 0
+
+        batch, batch_number = pending
+        start = time.perf_counter()
+        rejected = []
+        latest = {}
+        for doc, context in batch:
+            if not isinstance(doc.get("dh_utc"), datetime):
+                rejected.append(self._error(batch_number, context, None, "dh_utc manquant"))
+                continue
+            # Une mesure répétée dans le lot : la dernière occurrence l'emporte
+            latest[(doc.get("station_id"), doc["dh_utc"])] = (doc, context)
+
+        errors = list(rejected)
+        try:
+            created, replaced = [], []
+            if latest:
+                created, replaced, write_errors = self._write(list(latest.values()), self._existing(latest),
+                                                              batch_number)
+                errors.extend(write_errors)
+            # Occurrences répétées dans le lot : comptées comme mises à jour
+            repeated = len(batch) - len(rejected) - len(latest)
+        except PyMongoError as e:
+            # Échec global (réseau, timeout...) : toutes les mesures datées du lot sont en erreur
+            created, replaced, repeated = [], [], 0
+            errors.extend(self._error(batch_number, context, getattr(e, 'code', None), str(e))
+                          for doc, context in batch if isinstance(doc.get("dh_utc"), datetime))
+        self._account(len(batch), batch_number, start, len(created), len(replaced) + repeated, errors)
+
+        self._notify([doc for doc, _ in created], [doc for doc, _ in replaced])
+        return self.batches[-1]["inserted"] + self.batches[-1]["updated"]
+
+    @staticmethod
+    def _error(batch_number, context, code, message):
+        return {"batch": batch_number, "context": context, "code": code, "message": message}
+
+    def close(self):
+        summary = super().close()
+        if self.stations is not None:
+            set_station_units(self.stations)
+        return summary
+
+    @abstractmethod
+    def _existing(self, latest):
+        """État stocké des mesures `latest` du lot ({(station, horodatage): (document, contexte)}), transmis à _write."""
+
+    @abstractmethod
+    def _write(self, items, existing, batch_number):
+        """Écrit les mesures (document, contexte) du lot ; retourne (créées, remplacées, erreurs)."""
+
+class TimeSeriesWriter(_ReadingWriter):
+    """Mesures à plat dans une collection time-series (metaField station_id, timeField dh_utc).
+
+    Une mesure déjà stockée est supprimée puis réinsérée (suppression hors
+    metaField : MongoDB 7.0 ou plus). Une collection time-series n'a pas
+    d'index unique : deux imports simultanés d'une même mesure peuvent la
+    stocker deux fois.
+    """
+
+    def _existing(self, latest):
+        times = [dh_utc for _, dh_utc in latest]
+        found = self.collection.find(
+            {"station_id": {"$in": list({station_id for station_id, _ in latest})},
+             "dh_utc": {"$gte": min(times), "$lte": max(times)}},
+            {"_id": 0, "station_id": 1, "dh_utc": 1}
+        )
+        return {(doc.get("station_id"), doc["dh_utc"]) for doc in found}
+
+    def _write(self, items, existing, batch_number):
+        stale = {}
+        for doc, _ in items:
+            if (doc.get("station_id"), doc["dh_utc"]) in existing:
+                stale.setdefault(doc.get("station_id"), []).append(doc["dh_utc"])
+        if stale:
+            self.collection.delete_many({"$or": [
+                {"station_id": station_id, "dh_utc": {"$in": times}} for station_id, times in stale.items()
+            ]})
+
+        failed = {}
+        try:
+            self.collection.insert_many([to_reading(doc) for doc, _ in items], ordered=False)
+        except BulkWriteError as e:
+            failed = {err['index']: err for err in e.details.get('writeErrors', [])}
+        created, replaced, errors = [], [], []
+        for index, item in enumerate(items):
+            err = failed.get(index)
+            if err is not None:
+                errors.append(self._error(batch_number, item[1], err.get('code'), err.get('errmsg')))
+            elif (item[0].get("station_id"), item[0]["dh_utc"]) in existing:
+                replaced.append(item)
+            else:
+                created.append(item)
+        return created, replaced, errors
+
+class BucketWriter(_ReadingWriter):
+    """Un document par station et par jour : horodatages et valeurs en tableaux parallèles.
+
+    {_id: "station|jour", station_id, day, count, times: [...],
+     values: {source: [fichier], temperature: [...], ...}}
+
+    Les positions des tableaux d'un même document se correspondent et ne
+    changent jamais (les tableaux ne font que croître) : une mesure déjà
+    stockée est remplacée en place, à sa position. Les mesures nouvelles
+    d'un jour sont ajoutées en une opération conditionnée à l'absence de
+    leurs horodatages ; si un autre import en a ajouté un entre-temps, le
+    document du jour est relu et l'écriture rejouée.
+    """
+
+    # Tentatives d'écriture d'un document du jour modifié en concurrence
+    WRITE_ATTEMPTS = 3
+
+    def _existing(self, latest):
+        return self._positions({bucket_id(station_id, dh_utc) for station_id, dh_utc in latest})
+
+    def _positions(self, keys):
+        """Position de chaque horodatage stocké, par document du jour."""
+        return {
+            bucket["_id"]: {dh_utc: index for index, dh_utc in enumerate(bucket.get("times") or [])}
+            for bucket in self.collection.find({"_id": {"$in": list(keys)}}, {"times": 1})
+        }
+
+    def _write(self, items, existing, batch_number):
+        groups = {}
+        for item in items:
+            doc = item[0]
+            groups.setdefault(bucket_id(doc.get("station_id"), doc["dh_utc"]), []).append(item)
+
+        created, replaced, errors = [], [], []
+        for attempt in range(1, self.WRITE_ATTEMPTS + 1):
+            requests, operations = self._requests(groups, existing)
+            try:
+                self.collection.bulk_write(requests, ordered=False)
+                failed = {}
+            except BulkWriteError as e:
+                failed = {err['index']: err for err in e.details.get('writeErrors', [])}
+
+            conflicts = {}
+            for index, (key, appended, group) in enumerate(operations):
+                err = failed.get(index)
+                if err is None:
+                    (created if appended else replaced).extend(group)
+                elif appended and err.get('code') == 11000 and attempt < self.WRITE_ATTEMPTS:
+                    # Un horodatage a été ajouté par un autre import : le document du jour est à relire
+                    conflicts.setdefault(key, []).extend(group)
+                else:
+                    errors.extend(self._error(batch_number, context, err.get('code'), err.get('errmsg'))
+                                  for _, context in group)
+            if not conflicts:
+                break
+            groups = conflicts
+            existing = self._positions(conflicts)
+        return created, replaced, errors
+
+    def _requests(self, groups, existing):
+        """Opérations bulk_write par document du jour : (requêtes, [(clé, ajout ?, mesures)])."""
+        requests = []
+        operations = []
+        for key, group in groups.items():
+            positions = existing.get(key, {})
+            group.sort(key=lambda item: item[0]["dh_utc"])
+            stored = [item for item in group if item[0]["dh_utc"] in positions]
+            fresh = [item for item in group if item[0]["dh_utc"] not in positions]
+
+            if stored:
+                values = {}
+                for doc, _ in stored:
+                    reading = to_reading(doc)
+                    index = positions[doc["dh_utc"]]
+                    values[f"values.source.{index}"] = reading["source_file"]
+                    values.update((f"values.{name}.{index}", reading[name]) for name in READING_FIELDS)
+                requests.append(UpdateOne({"_id": key}, {"$set": values}))
+                operations.append((key, False, stored))
+
+            if fresh:
+                readings = [to_reading(doc) for doc, _ in fresh]
+                times = [reading["dh_utc"] for reading in readings]
+                push = {"times": {"$each": times},
+                        "values.source": {"$each": [reading["source_file"] for reading in readings]}}
+                for name in READING_FIELDS:
+                    push[f"values.{name}"] = {"$each": [reading[name] for reading in readings]}
+                # Sans correspondance (horodatage déjà présent), l'upsert échoue sur _id : conflit rejoué
+                requests.append(UpdateOne({"_id": key, "times": {"$nin": times}}, {
+                    "$setOnInsert": {
+                        "station_id": readings[0]["station_id"],
+                        "day": datetime.combine(times[0].date(), datetime.min.time())
+                    },
+                    "$inc": {"count": len(readings)},
+                    "$push": push
+                }, upsert=True))
+                operations.append((key, True, fresh))
+        return requests, operations
+
+def create_weather_writer(db, label="weather", on_written=None, timer=None, mode=None, **kwargs):
+    """Writer des mesures selon le mode de stockage (documents weather upsertés par défaut)."""
+    mode = _mode(mode)
+    if mode == 'documents':
+        return BatchWriter(db['weather'], label=label, upsert_key="_id", on_written=on_written, timer=timer, **kwargs)
+    writer_class = TimeSeriesWriter if mode == 'timeseries' else BucketWriter
+    return writer_class(db[weather_collection(mode)], stations=db['stations'], label=label,
+                        on_written=on_written, timer=timer, **kwargs)
+
+def migrate_weather(db, mode=None, batch_size=None, drop_source=False):
+    """Copie les documents de la collection weather vers le mode de stockage `mode`.
+
+    Reprise possible : les mesures déjà migrées sont réécrites. Les agrégats
+    existants sont conservés (on_written n'est pas appelé). Avec
+    `drop_source`, weather est supprimée si aucune mesure n'a échoué.
+    """
+    mode = _mode(mode)
+    if mode == 'documents':
+        raise ValueError("la migration cible le mode timeseries ou buckets")
+    ensure_weather_store(db, mode)
+    writer = create_weather_writer(db, label=f"migration {mode}", mode=mode, batch_size=batch_size)
+    for doc in db['weather'].find({}).sort([("station_id", ASCENDING), ("dh_utc", ASCENDING)]):
+        writer.add(doc, {"_id": doc["_id"]})
+    summary = writer.close()
+    writer.print_summary()
+    if drop_source and not summary["failed"]:
+        db['weather'].drop()
+        print("🗑️ Collection weather supprimée")
+    return summary
+
+if __name__ == "__main__":
+    # python weather_store.py migrate [timeseries|buckets] [--drop]
+    from database import db_connector
+    if len(sys.argv) < 2 or sys.argv[1] != 'migrate':
+        print("Usage : python weather_store.py migrate [timeseries|buckets] [--drop]")
+        sys.exit(1)
+    target = next((arg for arg in sys.argv[2:] if arg in STORAGE_MODES), None)
+    migrate_weather(db_connector.get_database(), target, drop_source='--drop' in sys.argv)
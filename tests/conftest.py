@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'))
+
+mongomock = pytest.importorskip("mongomock")
+
+from mongomock_support import ignore_bulk_sort
+
+ignore_bulk_sort()
+
+
+@pytest.fixture
+def db():
+    """Base MongoDB en mémoire, vide pour chaque test."""
+    return mongomock.MongoClient()['tests']
+
+
+def weather_doc(station_id, dh_utc, temperature, source="fileA"):
+    """Document weather minimal (schéma de build_weather_doc)."""
+    return {
+        "_id": f"{station_id}|{dh_utc.isoformat()}",
+        "station_id": station_id,
+        "dh_utc": dh_utc,
+        "measurements": {"temperature": {"value": temperature, "unit": "degC"},
+                         "precipitation": {"accumulation": 0.5, "unit": "mm"}},
+        "metadata": {"source_file": source}
+    }
+
+
+@pytest.fixture
+def make_weather_doc():
+    return weather_doc
+
+
+@pytest.fixture
+def connector(db):
+    """Connecteur sur la base en mémoire et une source de fichiers en mémoire (connector.storage.files)."""
+    from database import DatabaseConnector
+    from storage import MemoryStorage
+
+    connector = DatabaseConnector()
+    connector.mongo_client = db.client
+    connector.db = db
+    connector.storage = MemoryStorage()
+    return connector
+
+
+SAMPLE_EXPORT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                             'data', 'WeatherBE', '2025_07_06_1751818021048_0.csv')
+
+
+@pytest.fixture
+def weather_be_export():
+    """Export Airbyte WeatherBE réduit aux `rows` premières lignes ; `edit(payload)` modifie chaque _airbyte_data."""
+    import json
+    import pandas as pd
+
+    def export(rows=40, edit=None):
+        frame = pd.read_csv(SAMPLE_EXPORT, nrows=rows)
+        if edit is not None:
+            frame["_airbyte_data"] = [json.dumps(edit(json.loads(payload))) for payload in frame["_airbyte_data"]]
+        return frame.to_csv(index=False).encode()
+    return export
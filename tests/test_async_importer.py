@@ -0,0 +1,76 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from async_importer import AsyncBatchWriter, AsyncWeatherDataImporter
+from importer import WeatherDataImporter
+from storage import AsyncStorageAdapter, create_async_storage
+
+
+class AsyncCollection:
+    """Collection asyncio (API AsyncMongoClient) au-dessus d'une collection synchrone."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.name = collection.name
+
+    async def bulk_write(self, requests, **kwargs):
+        return self.collection.bulk_write(requests, **kwargs)
+
+    async def insert_many(self, docs, **kwargs):
+        return self.collection.insert_many(docs, **kwargs)
+
+
+class AsyncDatabase:
+    def __init__(self, db):
+        self.db = db
+
+    def __getitem__(self, name):
+        return AsyncCollection(self.db[name])
+
+
+def test_async_storage_uses_the_connector_source(connector):
+    connector.storage.files["WeatherBE/a.csv"] = b"_airbyte_data\n{}\n"
+    storage = create_async_storage(connector)
+    assert isinstance(storage, AsyncStorageAdapter)
+    assert storage.storage is connector.storage
+
+    obj = asyncio.run(storage.get_object(Bucket="bucket", Key="WeatherBE/a.csv"))
+    assert obj["Body"].read() == b"_airbyte_data\n{}\n"
+
+
+def test_async_writer_passes_replaced_docs_to_rollups(connector, make_weather_doc):
+    importer = WeatherDataImporter(connector)
+    engine = AsyncWeatherDataImporter(connector, importer=importer)
+    db = connector.get_database()
+    engine.db = AsyncDatabase(db)
+    start = datetime(2025, 7, 6, 10, 0)
+
+    async def write(docs):
+        writer = AsyncBatchWriter(engine.db['weather'], writes=asyncio.Semaphore(1), batch_size=2,
+                                  upsert_key="_id", on_written=engine.apply_rollups)
+        for doc in docs:
+            await writer.add(doc)
+        return await writer.close()
+
+    docs = [make_weather_doc("IICHTE19", start + timedelta(minutes=10 * i), 18.0) for i in range(3)]
+    assert asyncio.run(write(docs))["inserted"] == 3
+    docs[1]["measurements"]["temperature"]["value"] = 100.0
+    summary = asyncio.run(write(docs))
+    assert (summary["inserted"], summary["updated"], summary["callback_errors"]) == (0, 3, [])
+
+    daily = db['weather_daily'].find_one()
+    assert (daily["samples"], daily["temperature_max"], daily["temperature_sum"]) == (3, 100.0, 136.0)
+
+
+def test_async_writer_records_rollup_failures(db, make_weather_doc):
+    async def failing(created, replaced):
+        raise RuntimeError("agrégats indisponibles")
+
+    async def write():
+        writer = AsyncBatchWriter(AsyncCollection(db['weather']), upsert_key="_id", on_written=failing)
+        await writer.add(make_weather_doc("07015", datetime(2025, 7, 6), 20.0))
+        return await writer.close()
+
+    summary = asyncio.run(write())
+    assert (summary["written"], summary["failed"]) == (1, 0)
+    assert [err["message"] for err in summary["callback_errors"]] == ["agrégats indisponibles"]
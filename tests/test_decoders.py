@@ -0,0 +1,125 @@
+import json
+import os
+
+import pytest
+
+import decoders
+from config import HOURLY_TO_BE_FR
+from decoders import iter_stations_payload
+
+STATIONS_SAMPLE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                               'data', 'StationsMeteorologiques.json')
+
+
+def eager_events(raw):
+    """Référence : payload décodé d'un bloc par json.loads, mêmes événements que iter_stations_payload."""
+    events = []
+    for key, value in json.loads(raw).items():
+        if key in ('hourly', 'stations') and isinstance(value, str):
+            value = json.loads(value)
+        if key == 'hourly':
+            for station_id, records in (value or {}).items():
+                if station_id.startswith('_') or not isinstance(records, list):
+                    continue
+                events.extend(
+                    ("hourly", station_id, index, {name: record[name] for name in HOURLY_TO_BE_FR if name in record})
+                    for index, record in enumerate(records) if isinstance(record, dict)
+                )
+        elif key == 'stations':
+            events.extend(("station", None, index, station)
+                          for index, station in enumerate(value or []) if isinstance(station, dict))
+        else:
+            events.append(("field", key, None, value))
+    return events
+
+
+def streamed_events(raw):
+    return [
+        (kind, key, index, dict(value.items()) if kind == "hourly" else value)
+        for kind, key, index, value in iter_stations_payload(raw)
+    ]
+
+
+@pytest.fixture(scope="module")
+def sample():
+    with open(STATIONS_SAMPLE, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def double_encoded(payload, ensure_ascii=False):
+    """Sections hourly/stations encodées en chaînes JSON, comme dans les exports Airbyte."""
+    return dict(payload, **{key: json.dumps(payload[key], ensure_ascii=ensure_ascii)
+                            for key in ('hourly', 'stations') if not isinstance(payload.get(key, ""), str)})
+
+
+@pytest.mark.parametrize("encode", [
+    lambda payload: json.dumps(payload),
+    lambda payload: json.dumps(double_encoded(payload)),
+    lambda payload: json.dumps(double_encoded(payload, ensure_ascii=True), indent=2),
+    lambda payload: json.dumps(double_encoded(payload)).encode('utf-8'),
+])
+def test_sample_matches_json_loads(sample, encode):
+    raw = encode(sample)
+    assert streamed_events(raw) == eager_events(raw)
+    assert sum(1 for event in streamed_events(raw) if event[0] == "hourly") == 1143
+
+
+@pytest.mark.parametrize("block_size", [7, 13, 64])
+def test_double_encoded_sections_are_read_in_blocks(monkeypatch, block_size):
+    monkeypatch.setattr(decoders, "NESTED_BLOCK_SIZE", block_size)
+    hourly = {"S1": [{"temperature": 10 ** 12 + 0.5, "vent_direction": "Né \"\\\" 🌧️ é", "humidite": None},
+                     {"temperature": -1e-3, "pression": 1013}],
+              "_params": ["temperature"]}
+    stations = [{"id": "S1", "name": "Lille 🌧️", "license": {"source": "x\ny"}}]
+    for ensure_ascii in (False, True):
+        raw = json.dumps({"hourly": json.dumps(hourly, ensure_ascii=ensure_ascii),
+                          "stations": json.dumps(stations, ensure_ascii=ensure_ascii), "status": "OK"})
+        assert streamed_events(raw) == eager_events(raw)
+
+
+@pytest.mark.parametrize("payload", [
+    {},
+    {"hourly": None, "stations": None, "status": "OK"},
+    {"hourly": {}, "stations": []},
+    {"hourly": "{}", "stations": "[]"},
+    {"hourly": " { } ", "stations": " [ ] "},
+    {"hourly": {"S1": [], "S2": None, "S3": [1, None, {"temperature": 3}], "_params": ["temperature"]}},
+    {"data": [{"nested": [1, 2, {"a": None}]}], "metadata": {"temperature": {"unit": "C"}}},
+])
+def test_edge_cases_match_json_loads(payload):
+    for raw in (json.dumps(payload), json.dumps(double_encoded(payload))):
+        assert streamed_events(raw) == eager_events(raw)
+
+
+@pytest.mark.parametrize("raw", [
+    '{"a":1}garbage',
+    '{"a":1} {"b":2}',
+    '{"hourly":"{}x"}',
+    '{"hourly":"{\\"S1\\": [{\\"temperature\\": 1}]} ]"}',
+    '{"hourly":"{}"',
+    '{"hourly":"',
+    '{"hourly":"{\\"S1\\": [}"}',
+    '{"stations":"{}"}',
+    '{"stations":""}',
+    '{"status" "OK"}',
+    '{"status": "OK",}',
+    '[]',
+    '',
+])
+def test_malformed_input_is_rejected(raw):
+    with pytest.raises(ValueError):
+        list(iter_stations_payload(raw))
+
+
+def test_flat_objects_go_through_the_configured_decoder(sample, monkeypatch):
+    calls = []
+
+    def spy(raw):
+        calls.append(raw)
+        return json.loads(raw)
+    monkeypatch.setattr(decoders, "DECODER_NAME", "spy")
+    monkeypatch.setattr(decoders, "loads", spy)
+
+    raw = json.dumps(double_encoded(sample))
+    assert streamed_events(raw) == eager_events(raw)
+    assert len(calls) >= 1143
@@ -0,0 +1,94 @@
+import random
+
+import pytest
+
+import geo
+from geo import StationIndex, haversine_km
+
+
+@pytest.fixture(params=["numpy", "scipy"])
+def index_kind(request, monkeypatch):
+    """Index KD-tree (scipy) ou passage vectorisé numpy (sans scipy)."""
+    if request.param == "numpy":
+        monkeypatch.setattr(geo, "cKDTree", None)
+    elif geo.cKDTree is None:
+        pytest.skip("scipy n'est pas installé")
+    return request.param
+
+
+@pytest.fixture(scope="module")
+def stations():
+    rng = random.Random(7)
+    located = [{"id": f"S{index}", "latitude": rng.uniform(42, 52), "longitude": rng.uniform(-5, 8),
+                "elevation": rng.choice([10, 100, 500])} for index in range(300)]
+    # Sans coordonnées exploitables : jamais retournées
+    missing = [{"id": "NOLAT", "longitude": 3.0}, {"id": "NONE", "latitude": None, "longitude": None},
+               {"id": "TEXT", "latitude": "abc", "longitude": "3"}, {"id": "RANGE", "latitude": 95, "longitude": 3}]
+    return located + missing
+
+
+def brute_force(stations, latitude, longitude, where=None):
+    located = [station for station in stations if geo.geojson_point(station.get("latitude"), station.get("longitude"))]
+    distances = haversine_km(latitude, longitude, [s["latitude"] for s in located], [s["longitude"] for s in located])
+    return sorted(((station, float(distance)) for station, distance in zip(located, distances)
+                   if where is None or where(station)), key=lambda result: result[1])
+
+
+def ids(results):
+    return [station["id"] for station, _ in results]
+
+
+@pytest.mark.parametrize("k", [1, 5, 300, 1000])
+def test_nearest_matches_brute_force(index_kind, stations, k):
+    index = StationIndex(stations)
+    assert len(index) == 300
+
+    for latitude, longitude in [(50.63, 3.06), (44.0, 0.0), (60.0, -20.0)]:
+        results = index.nearest(latitude, longitude, k=k)
+        expected = brute_force(stations, latitude, longitude)[:k]
+        assert ids(results) == ids(expected)
+        assert [distance for _, distance in results] == pytest.approx([distance for _, distance in expected])
+
+
+def test_nearest_with_filter_and_radius(index_kind, stations):
+    index = StationIndex(stations)
+
+    def high(station):
+        return station["elevation"] == 500
+    expected = brute_force(stations, 50.63, 3.06, where=high)
+
+    assert ids(index.nearest(50.63, 3.06, k=4, where=high)) == ids(expected[:4])
+    within_200 = [result for result in expected if result[1] <= 200]
+    assert ids(index.nearest(50.63, 3.06, k=1000, where=high, max_km=200)) == ids(within_200)
+    # Aucune station retenue par le filtre
+    assert index.nearest(50.63, 3.06, k=3, where=lambda station: False) == []
+    assert index.nearest(50.63, 3.06, k=3, max_km=0.001) == []
+    assert index.nearest(50.63, 3.06, k=0) == []
+
+
+@pytest.mark.parametrize("radius_km", [0, 50, 300, 20000])
+def test_within_matches_brute_force(index_kind, stations, radius_km):
+    index = StationIndex(stations)
+    expected = [result for result in brute_force(stations, 47.0, 2.0) if result[1] <= radius_km]
+
+    assert ids(index.within(47.0, 2.0, radius_km)) == ids(expected)
+    assert ids(index.within(47.0, 2.0, radius_km, where=lambda station: station["elevation"] == 10)) == \
+        [station["id"] for station, _ in expected if station["elevation"] == 10]
+
+
+def test_station_on_the_query_point(index_kind):
+    index = StationIndex([{"id": "A", "latitude": 50.0, "longitude": 3.0},
+                          {"id": "B", "latitude": "50.1", "longitude": "3.0"}])
+
+    assert index.nearest(50.0, 3.0, k=2)[0] == ({"id": "A", "latitude": 50.0, "longitude": 3.0}, 0.0)
+    assert ids(index.within(50.0, 3.0, 0)) == ["A"]
+    assert ids(index.within(50.0, 3.0, 12)) == ["A", "B"]
+
+
+@pytest.mark.parametrize("stations", [[], [{"id": "X"}, {"id": "Y", "latitude": None, "longitude": 2}]])
+def test_empty_index(index_kind, stations):
+    index = StationIndex(stations)
+
+    assert len(index) == 0
+    assert index.nearest(50.0, 3.0, k=3) == []
+    assert index.within(50.0, 3.0, 1000) == []
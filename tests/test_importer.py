@@ -0,0 +1,87 @@
+from importer import WeatherDataImporter
+from metrics import metrics
+
+KEY = "WeatherBE/2025_07_06_1751818021048_0.csv"
+
+
+def listed(connector):
+    return connector.storage.list_objects_v2()["Contents"][0]
+
+
+def hotter(payload):
+    if payload.get("Temperature"):
+        payload["Temperature"] = "212 °F"
+    return payload
+
+
+def test_changed_file_is_reimported_in_place(connector, weather_be_export):
+    connector.storage.files[KEY] = weather_be_export()
+    importer = WeatherDataImporter(connector)
+    db = connector.get_database()
+
+    first = importer.import_csv_to_mongo(KEY, "bucket")
+    assert first["status"] == "imported" and first["weather"] > 0
+    count = db['weather'].count_documents({})
+    entry = importer.manifest.entries([KEY])[KEY]
+    assert (entry["status"], entry["etag"]) == ("imported", listed(connector)["ETag"])
+    assert not importer.manifest.needs_import(listed(connector))
+
+    # Nouvelle version du fichier (ETag différent) : ré-importée sans doublon
+    connector.storage.files[KEY] = weather_be_export(edit=hotter)
+    assert importer.manifest.needs_import(listed(connector))
+    second = importer.import_csv_to_mongo(KEY, "bucket")
+    assert second["status"] == "imported"
+    assert second["weather"] == first["weather"]
+    assert db['weather'].count_documents({}) == count
+    temperatures = {doc["measurements"]["temperature"]["value"]
+                    for doc in db['weather'].find({"measurements.temperature.value": {"$ne": None}})}
+    assert temperatures == {100.0}
+    assert {doc["temperature_max"] for doc in db['weather_daily'].find()} == {100.0}
+
+
+def test_time_only_exports_are_dated_per_file(connector, weather_be_export):
+    october, november = "WeatherBE/2024-10-01_export.csv", "WeatherBE/2024-11-01_export.csv"
+    connector.storage.files[october] = weather_be_export()
+    connector.storage.files[november] = weather_be_export()
+    importer = WeatherDataImporter(connector)
+    db = connector.get_database()
+
+    first = importer.import_csv_to_mongo(october, "bucket")
+    second = importer.import_csv_to_mongo(november, "bucket")
+
+    # Mêmes heures, autre jour : le second export n'écrase pas le premier
+    assert first["status"] == second["status"] == "imported"
+    assert db['weather'].count_documents({}) == first["weather"] + second["weather"]
+    days = {doc["dh_utc"].strftime("%Y-%m-%d") for doc in db['weather'].find({"dh_utc": {"$ne": None}})}
+    assert days == {"2024-10-01", "2024-11-01"}
+
+
+def test_time_only_export_without_start_date_is_rejected(connector, weather_be_export):
+    key = "WeatherBE/next_drop.csv"
+    connector.storage.files[key] = weather_be_export()
+    importer = WeatherDataImporter(connector)
+
+    result = importer.import_csv_to_mongo(key, "bucket")
+
+    assert result["status"] == "error"
+    assert "WU_START_DATES" in result["error"]
+    assert connector.get_database()['weather'].count_documents({}) == 0
+
+
+def row_errors():
+    return metrics.counters.get(("weather_import_row_errors_total", (("source", "WeatherBE"),)), 0)
+
+
+def test_row_errors_are_counted_when_their_log_is_suppressed(connector, weather_be_export, capsys):
+    def unitless(payload):
+        payload["Temperature"] = "°F"
+        return payload
+    connector.storage.files[KEY] = weather_be_export(rows=40, edit=unitless)
+    importer = WeatherDataImporter(connector)
+    before = row_errors()
+
+    result = importer.import_csv_to_mongo(KEY, "bucket")
+
+    assert result["status"] == "imported" and result["weather"] == 0
+    assert row_errors() - before == 40
+    assert capsys.readouterr().out.count("event=row_error") < 40
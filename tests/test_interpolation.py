@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+
+from interpolation import SpatialInterpolator, regular_grid
+
+STATIONS = [{"id": str(i), "latitude": 50 + (i % 10) * 0.1, "longitude": 3 + (i // 10) * 0.1} for i in range(60)]
+
+
+@pytest.mark.parametrize("method", ["idw", "kriging"])
+def test_sparse_readings_fill_the_whole_grid(method):
+    latitudes, longitudes = regular_grid((49.9, 2.9, 51.0, 3.6), (50, 40))
+    interpolator = SpatialInterpolator(STATIONS, latitudes, longitudes, method=method, neighbors=4)
+    values = np.full(len(STATIONS), np.nan)
+    values[[0, 25, 59]] = [10.0, 15.0, 20.0]
+
+    grid = interpolator.interpolate(values)
+    assert grid.shape == (50, 40)
+    assert not np.isnan(grid).any()
+    assert 10.0 - 1e-3 <= grid.min() and grid.max() <= 20.0 + 1e-3
+
+
+def test_idw_weights_are_cached_per_available_stations():
+    interpolator = SpatialInterpolator(STATIONS, [50.0, 50.45], [3.0, 3.25], neighbors=3, max_cached=2)
+    values = np.arange(len(STATIONS), dtype=float)
+    full = interpolator.interpolate(values)
+    assert full[0, 0] == pytest.approx(0.0)
+
+    values[0] = np.nan
+    assert interpolator.interpolate(values)[0, 0] > 0
+    assert len(interpolator._idw) == 2
+    values[1] = np.nan
+    interpolator.interpolate(values)
+    assert len(interpolator._idw) == 2
+    assert np.isnan(interpolator.interpolate(np.full(len(STATIONS), np.nan))).all()
@@ -0,0 +1,83 @@
+import io
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from config import HOURLY_TO_BE_FR
+from normalizer import WeatherDataNormalizer
+
+# Cas limites : unité sans valeur (erreur), nombres bruts, booléen, liste, nulls, clés absentes
+EDGE_PAYLOADS = [
+    {"Temperature": "°F", "Wind": "12.5", "UV": True, "Pressure": "29,9 in", "Speed": 5, "Extra": [1, 2]},
+    {"Time": None},
+    {},
+    {"Temperature": "abc", "Gust": "-3.2mph", "Solar": None, "station_id": "X", "Wind": None},
+    {"Temperature": "68 °F", "Wind": "NNE", "UV": 3, "Solar": "120 w/m²", "Time": "12:05 AM"},
+]
+
+
+def row_path(payload):
+    """normalize_be_fr_record, None pour une ligne en erreur (comme le chemin colonne)."""
+    try:
+        return WeatherDataNormalizer.normalize_be_fr_record(payload)
+    except Exception:
+        return None
+
+
+@pytest.fixture
+def sample_payloads(weather_be_export):
+    frame = pd.read_csv(io.BytesIO(weather_be_export(rows=None)))
+    return [json.loads(payload) for payload in frame["_airbyte_data"]]
+
+
+@pytest.mark.parametrize("edges", [False, True])
+def test_frame_path_matches_row_path(sample_payloads, edges):
+    payloads = sample_payloads + (EDGE_PAYLOADS if edges else [])
+
+    norms, errors = WeatherDataNormalizer.normalize_be_fr_frame(WeatherDataNormalizer.payload_frame(payloads))
+
+    assert norms == [row_path(payload) for payload in payloads]
+    assert [pos for pos, _ in errors] == [pos for pos, norm in enumerate(norms) if norm is None]
+
+
+def test_frame_path_reports_conversion_errors():
+    norms, errors = WeatherDataNormalizer.normalize_be_fr_frame(WeatherDataNormalizer.payload_frame(EDGE_PAYLOADS))
+
+    assert norms[0] is None
+    assert errors == [(0, "Temperature: valeur numérique absente pour l'unité °F")]
+    assert norms[2] == {}
+    assert norms[4]["vent_direction_original"] == "NNE"
+    assert norms[4]["UV"] == {"value": 3.0}
+
+
+def test_hourly_record_units():
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data',
+                           'StationsMeteorologiques.json'), encoding='utf-8') as f:
+        hourly = json.load(f)["hourly"]
+    record = {name: value for name, value in hourly["07015"][0].items() if name in HOURLY_TO_BE_FR}
+
+    norm = WeatherDataNormalizer.normalize_hourly_record(record)
+
+    assert {key: value for key, value in norm.items() if isinstance(value, dict)} == {
+        "Time": {"value": 2024.0, "unit": None, "original": "2024-10-05 00:00:00"},
+        "Temperature": {"value": 7.6, "unit": "degC", "original": "7.6"},
+        "Pressure": {"value": 1020.7, "unit": "hPa", "original": "1020.7"},
+        "Humidity": {"value": 89.0, "unit": "%", "original": "89"},
+        "Dew Point": {"value": 5.9, "unit": "degC", "original": "5.9"},
+        "Visibility": {"value": 6000.0, "unit": None, "original": "6000"},
+        "Speed": {"value": 3.6, "unit": "km/h", "original": "3.6"},
+        "Gust": {"value": 7.2, "unit": "km/h", "original": "7.2"},
+        # Direction en degrés : unité "deg" (None avant la table UNIT_DEFAULTS)
+        "Wind": {"value": 90.0, "unit": "deg", "original": "90"},
+        "Precip. Accum.": {"value": 0.0, "unit": "mm", "original": "0"},
+        "Precip. Rate.": {"value": 0.0, "unit": "mm", "original": "0"},
+        "Cloud Cover": {"value": None, "unit": None, "original": ""},
+        "Weather Code": {"value": None, "unit": None, "original": None},
+    }
+    assert (norm["vent_direction_original"], norm["dh_utc"]) == ("90", "2024-10-05 00:00:00")
+    winds = [WeatherDataNormalizer.normalize_hourly_record({"vent_direction": record["vent_direction"]})["Wind"]
+             for records in hourly.values() if isinstance(records, list)
+             for record in records if isinstance(record, dict) and record.get("vent_direction") not in (None, "")]
+    assert winds and {wind["unit"] for wind in winds} == {"deg"}
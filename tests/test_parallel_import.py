@@ -0,0 +1,22 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import pytest
+
+import parallel_import
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="démarrage des workers par fork")
+def test_process_workers_close_their_connectors_on_exit(tmp_path, monkeypatch):
+    def close_worker_connectors():
+        (tmp_path / str(os.getpid())).touch()
+    # Hérité par les workers démarrés par fork
+    monkeypatch.setattr(parallel_import, "close_worker_connectors", close_worker_connectors)
+
+    with ProcessPoolExecutor(max_workers=2, mp_context=get_context("fork"),
+                             initializer=parallel_import._init_worker) as executor:
+        pids = {executor.submit(os.getpid).result() for _ in range(4)}
+
+    assert pids
+    assert pids <= {int(path.name) for path in tmp_path.iterdir()}
@@ -0,0 +1,129 @@
+import json
+import os
+import re
+import shutil
+import zipfile
+
+import pandas as pd
+import pytest
+
+import preprocess
+from importer import WeatherDataImporter
+from preprocess import Preprocessor, sheet_hashes
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data')
+WORKBOOK = "Weather+Underground+-+Ichtegem,+BE.xlsx"
+SHEETS = ['011024', '021024', '031024', '041024', '051024', '061024', '071024']
+
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = tmp_path / WORKBOOK
+    shutil.copy(os.path.join(DATA_DIR, WORKBOOK), path)
+    return str(path)
+
+
+@pytest.fixture
+def converted(monkeypatch):
+    """Feuilles relues par convert_sheet, dans l'ordre."""
+    sheets, convert_sheet = [], preprocess.convert_sheet
+
+    def spy(path, sheet_name, cache_path, engine=None):
+        sheets.append(sheet_name)
+        return convert_sheet(path, sheet_name, cache_path, engine)
+    monkeypatch.setattr(preprocess, "convert_sheet", spy)
+    return sheets
+
+
+def rewrite_member(path, name, edit):
+    """Réécrit un membre du classeur (zip) : edit(texte) -> texte."""
+    with zipfile.ZipFile(path) as archive:
+        members = {info.filename: archive.read(info) for info in archive.infolist()}
+    members[name] = edit(members[name].decode('utf-8')).encode('utf-8')
+    with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for member, data in members.items():
+            archive.writestr(member, data)
+
+
+def test_sheet_hashes(workbook):
+    hashes = sheet_hashes(workbook)
+    assert list(hashes) == SHEETS
+    assert len(set(hashes.values())) == len(SHEETS)
+    assert sheet_hashes(workbook) == hashes
+
+    # Une cellule modifiée dans la feuille 021024 (sheet2.xml) : seule son empreinte change
+    rewrite_member(workbook, 'xl/worksheets/sheet2.xml',
+                   lambda xml: xml.replace('<c r="B3" s="1" t="s"><v>77</v></c>', '<c r="B3" s="1" t="s"><v>78</v></c>', 1))
+    changed = sheet_hashes(workbook)
+    assert [sheet for sheet in SHEETS if changed[sheet] != hashes[sheet]] == ['021024']
+
+    # Chaînes partagées modifiées : toutes les feuilles sont invalidées
+    rewrite_member(workbook, 'xl/sharedStrings.xml', lambda xml: xml.replace('°F', '° F', 1))
+    assert all(sheet_hashes(workbook)[sheet] != changed[sheet] for sheet in SHEETS)
+
+
+def test_unchanged_sheets_are_not_read_again(workbook, tmp_path, converted):
+    output_dir = str(tmp_path / "Clean_data")
+
+    first = Preprocessor(output_dir, workers=1).run([workbook])
+    assert converted == SHEETS
+    assert first[0]["status"] == "converted" and first[0]["rows"] == 1906
+    output = first[0]["output"]
+    before = pd.read_csv(output)
+
+    # Nouveau processus (manifeste relu sur disque) : rien n'est relu ni réécrit
+    converted.clear()
+    second = Preprocessor(output_dir, workers=1).run([workbook])
+    assert converted == [] and second[0]["status"] == "unchanged"
+
+    rewrite_member(workbook, 'xl/worksheets/sheet2.xml',
+                   lambda xml: xml.replace('<c r="B3" s="1" t="s"><v>77</v></c>', '<c r="B3" s="1" t="s"><v>78</v></c>', 1))
+    third = Preprocessor(output_dir, workers=1).run([workbook])
+    assert converted == ['021024']
+    assert (third[0]["status"], third[0]["converted"], third[0]["rows"]) == ("converted", 1, 1906)
+    after = pd.read_csv(output)
+    assert (after["_airbyte_data"] != before["_airbyte_data"]).sum() == 1
+    assert after["_airbyte_raw_id"].tolist() == before["_airbyte_raw_id"].tolist()
+
+    # --force relit toutes les feuilles
+    converted.clear()
+    Preprocessor(output_dir, workers=1, force=True).run([workbook])
+    assert converted == SHEETS
+
+
+def test_removed_sheets_are_pruned(workbook, tmp_path, converted):
+    output_dir = str(tmp_path / "Clean_data")
+    preprocessor = Preprocessor(output_dir, workers=1)
+    preprocessor.run([workbook])
+    cache = os.path.dirname(preprocessor.cache_path(workbook, '071024'))
+    assert sorted(os.listdir(cache)) == [f"{sheet}.pkl" for sheet in SHEETS]
+
+    rewrite_member(workbook, 'xl/workbook.xml', lambda xml: re.sub(r'<sheet name="071024"[^>]*/>', '', xml))
+    converted.clear()
+    result = Preprocessor(output_dir, workers=1).run([workbook])
+
+    assert converted == []
+    assert sorted(os.listdir(cache)) == [f"{sheet}.pkl" for sheet in SHEETS[:-1]]
+    assert result[0]["rows"] == 1906 - 179
+    with open(os.path.join(output_dir, preprocess.CACHE_DIR, preprocess.MANIFEST_NAME), encoding='utf-8') as f:
+        assert list(json.load(f)[WORKBOOK]["sheets"]) == SHEETS[:-1]
+
+
+def test_airbyte_output_is_an_importable_export(workbook, tmp_path, connector):
+    result = Preprocessor(str(tmp_path / "Clean_data"), workers=1).run([workbook])
+    frame = pd.read_csv(result[0]["output"])
+
+    assert list(frame.columns) == ["_airbyte_raw_id", "_airbyte_extracted_at", "_airbyte_meta",
+                                   "_airbyte_generation_id", "_airbyte_data"]
+    assert frame["_airbyte_raw_id"].is_unique
+    payloads = [json.loads(payload) for payload in frame["_airbyte_data"]]
+    times = [payload["Time"] for payload in payloads if payload["Time"]]
+    assert times[0].startswith("2024-10-01 ") and times[-1].startswith("2024-10-07 ")
+
+    # Heures déjà datées : importable sans WU_START_DATES (deux premiers jours)
+    key = "WeatherBE/Ichtegem_with_date.csv"
+    connector.storage.files[key] = frame.head(400).to_csv(index=False).encode()
+    imported = WeatherDataImporter(connector).import_csv_to_mongo(key, "bucket")
+    assert imported["status"] == "imported" and imported["weather"] > 0
+    days = {doc["dh_utc"].date().isoformat() for doc in connector.get_database()['weather'].find({"dh_utc": {"$ne": None}})}
+    assert days == {"2024-10-01", "2024-10-02"}
@@ -0,0 +1,84 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from readers import iter_csv_chunks
+
+ROWS = 50000
+
+
+class FakeStreamingBody:
+    """Flux non seekable à la manière de botocore StreamingBody : read(amt), itération, close."""
+
+    def __init__(self, data, fail_after=None):
+        self.data = data
+        self.position = 0
+        self.fail_after = fail_after
+        self.closed = False
+
+    def read(self, amt=None):
+        if self.fail_after is not None and self.position >= self.fail_after:
+            raise ConnectionError("connexion S3 interrompue")
+        end = len(self.data) if amt is None or amt < 0 else min(len(self.data), self.position + amt)
+        chunk = self.data[self.position:end]
+        self.position = end
+        return chunk
+
+    def __iter__(self):
+        return iter(self.read().splitlines(keepends=True))
+
+    def close(self):
+        self.closed = True
+
+
+def csv_bytes(rows=ROWS):
+    frame = pd.DataFrame({"_airbyte_raw_id": [f"id-{i}" for i in range(rows)],
+                          "_airbyte_data": [f'{{"Temperature": "{i % 40} °F"}}' for i in range(rows)]})
+    return frame.to_csv(index=False).encode()
+
+
+def prefetch_threads():
+    return [thread for thread in threading.enumerate() if thread.name == "csv-prefetch"]
+
+
+def test_chunks_cover_the_whole_file():
+    data = csv_bytes(2500)
+    chunks = list(iter_csv_chunks(FakeStreamingBody(data), chunksize=1000, prefetch=2))
+    assert [len(chunk) for chunk in chunks] == [1000, 1000, 500]
+    frame = pd.concat(chunks)
+    assert list(frame.index) == list(range(2500))
+    assert frame["_airbyte_raw_id"].iloc[-1] == "id-2499"
+    assert not prefetch_threads()
+
+
+def test_prefetch_is_bounded_while_the_consumer_is_slow():
+    data = csv_bytes()
+    body = FakeStreamingBody(data)
+    chunks = iter_csv_chunks(body, chunksize=100, prefetch=2)
+    next(chunks)
+    time.sleep(0.3)
+    # File pleine : le thread de lecture attend, le fichier n'est pas lu en entier
+    assert body.position < len(data) / 2
+    chunks.close()
+
+
+def test_early_close_stops_the_prefetch_thread():
+    body = FakeStreamingBody(csv_bytes())
+    chunks = iter_csv_chunks(body, chunksize=100, prefetch=1)
+    next(chunks)
+    chunks.close()
+    assert not prefetch_threads()
+    position = body.position
+    time.sleep(0.1)
+    assert body.position == position
+
+
+def test_read_errors_reach_the_consumer():
+    data = csv_bytes()
+    chunks = iter_csv_chunks(FakeStreamingBody(data, fail_after=len(data) // 3), chunksize=1000, prefetch=2)
+    with pytest.raises(ConnectionError):
+        for _ in chunks:
+            pass
+    assert not prefetch_threads()
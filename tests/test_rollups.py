@@ -0,0 +1,55 @@
+from datetime import datetime, timedelta
+
+from batch_writer import BatchWriter
+from rollups import RollupUpdater
+
+
+def write(db, docs, on_written):
+    writer = BatchWriter(db['weather'], batch_size=3, upsert_key="_id", on_written=on_written)
+    for doc in docs:
+        writer.add(doc)
+    return writer.close()
+
+
+def test_reimport_recomputes_replaced_periods(db, make_weather_doc):
+    rollups = RollupUpdater(db)
+    start = datetime(2025, 7, 6, 10, 0)
+    times = [start + timedelta(minutes=20 * i) for i in range(6)]
+    write(db, [make_weather_doc("IICHTE19", t, 18.0 + i * 0.1) for i, t in enumerate(times)], rollups.apply)
+
+    daily = db['weather_daily'].find_one()
+    assert daily["samples"] == 6
+    assert daily["temperature_max"] == 18.5
+
+    # Fichier corrigé : la première mesure passe à 100 °C, une mesure nouvelle s'ajoute
+    corrected = [make_weather_doc("IICHTE19", t, 18.0 + i * 0.1) for i, t in enumerate(times)]
+    corrected[0]["measurements"]["temperature"]["value"] = 100.0
+    corrected.append(make_weather_doc("IICHTE19", start + timedelta(hours=3), 17.0))
+    summary = write(db, corrected, rollups.apply)
+    assert (summary["inserted"], summary["updated"]) == (1, 6)
+
+    daily = db['weather_daily'].find_one({"_id": "IICHTE19|2025-07-06T00:00:00"})
+    assert daily["samples"] == 7
+    assert daily["temperature_max"] == 100.0
+    assert daily["temperature_min"] == 17.0
+    assert daily["temperature_sum"] == sum(18.0 + i * 0.1 for i in range(1, 6)) + 100.0 + 17.0
+    assert daily["precipitation_total"] == 3.5
+
+    hourly = db['weather_hourly'].find_one({"_id": "IICHTE19|2025-07-06T10:00:00"})
+    assert hourly["samples"] == 3
+    assert hourly["temperature_max"] == 100.0
+
+    rebuilt = {doc["_id"]: doc for doc in db['weather_daily'].find()}
+    rollups.rebuild()
+    assert rebuilt == {doc["_id"]: doc for doc in db['weather_daily'].find()}
+
+
+def test_on_written_failure_is_recorded_not_raised(db, make_weather_doc):
+    def failing(created, replaced):
+        raise RuntimeError("agrégats indisponibles")
+
+    summary = write(db, [make_weather_doc("07015", datetime(2025, 7, 6, h), 20.0) for h in range(4)], failing)
+    assert summary["written"] == 4
+    assert summary["failed"] == 0
+    assert summary["errors"] == []
+    assert [err["message"] for err in summary["callback_errors"]] == ["agrégats indisponibles"] * 2
@@ -0,0 +1,88 @@
+import importlib
+
+import pytest
+
+import config
+from s3_listing import S3Lister
+from storage import MemoryStorage
+
+KEYS = ([f"WeatherBE/{index:02d}.csv" for index in range(7)]
+        + [f"WeatherBE/2025/{index:02d}.csv" for index in range(3)]
+        + [f"WeatherFR/{index:02d}.csv" for index in range(5)]
+        + ["StationsMeteorologiques/00.json", "other.txt"])
+
+
+class RecordingStorage(MemoryStorage):
+    """Source en mémoire qui garde les paramètres de chaque page demandée."""
+
+    def __init__(self, files):
+        super().__init__(files)
+        self.calls = []
+
+    def list_objects_v2(self, **params):
+        self.calls.append(params)
+        return super().list_objects_v2(**params)
+
+
+@pytest.fixture
+def storage():
+    return RecordingStorage({key: key.encode() for key in KEYS})
+
+
+def listed(lister, **kwargs):
+    return sorted(obj['Key'] for obj in lister.iter_objects(**kwargs))
+
+
+def test_single_prefix_is_paginated(storage):
+    lister = S3Lister(storage, "bucket", prefixes=["WeatherBE/"], page_size=3)
+
+    assert [obj['Key'] for obj in lister.iter_objects()] == KEYS[:10]
+    assert [call.get("ContinuationToken") for call in storage.calls] == \
+        [None, "WeatherBE/02.csv", "WeatherBE/05.csv", "WeatherBE/2025/01.csv"]
+    assert all(call["MaxKeys"] == 3 and call["Prefix"] == "WeatherBE/" for call in storage.calls)
+
+
+def test_prefixes_are_listed_once_each(storage):
+    lister = S3Lister(storage, "bucket", prefixes=["WeatherFR/", "WeatherBE/", "WeatherBE/2025/", ""], page_size=2)
+
+    assert listed(lister) == sorted(KEYS)
+    assert listed(lister, suffix=(".csv",)) == sorted(key for key in KEYS if key.endswith(".csv"))
+
+
+def test_start_after_checkpoints(storage):
+    lister = S3Lister(storage, "bucket", prefixes=["WeatherBE/", "WeatherBE/2025/", "WeatherFR/"], page_size=2)
+    checkpoints = {"WeatherBE/": "WeatherBE/04.csv", "WeatherBE/2025/": "WeatherBE/2025/02.csv"}
+
+    assert listed(lister, start_after=checkpoints) == \
+        ["WeatherBE/05.csv", "WeatherBE/06.csv"] + [f"WeatherFR/{index:02d}.csv" for index in range(5)]
+    # StartAfter n'est passé qu'à la première page, les suivantes reprennent au jeton
+    for call in storage.calls:
+        assert not ("StartAfter" in call and "ContinuationToken" in call)
+        if "StartAfter" in call:
+            assert call["StartAfter"] == checkpoints[call["Prefix"]]
+
+
+def test_listing_error_is_raised(storage, monkeypatch):
+    def failing(**params):
+        if params["Prefix"] == "WeatherFR/":
+            raise RuntimeError("accès refusé")
+        return MemoryStorage.list_objects_v2(storage, **params)
+    monkeypatch.setattr(storage, "list_objects_v2", failing)
+    lister = S3Lister(storage, "bucket", prefixes=["WeatherBE/", "WeatherFR/"], page_size=2)
+
+    with pytest.raises(RuntimeError, match="accès refusé"):
+        listed(lister)
+
+
+@pytest.mark.parametrize("value, prefixes", [
+    ("", [""]),
+    (" , ,", [""]),
+    ("WeatherBE/,,WeatherFR/ ", ["WeatherBE/", "WeatherFR/"]),
+])
+def test_s3_prefixes_setting(monkeypatch, value, prefixes):
+    monkeypatch.setenv("S3_PREFIXES", value)
+    try:
+        assert importlib.reload(config).S3_PREFIXES == prefixes
+    finally:
+        monkeypatch.undo()
+        importlib.reload(config)
@@ -0,0 +1,70 @@
+import os
+
+import staging_cache
+from importer import WeatherDataImporter
+from staging_cache import StagingCache
+
+KEY = "WeatherBE/2025_07_06_1751818021048_0.csv"
+
+
+def weather_docs(db):
+    return sorted(db['weather'].find(), key=lambda doc: doc["_id"])
+
+
+def test_second_import_is_replayed_from_the_cache(connector, weather_be_export, tmp_path):
+    connector.storage.files[KEY] = weather_be_export()
+    importer = WeatherDataImporter(connector)
+    importer.staging = StagingCache(str(tmp_path), file_format='bson')
+    db = connector.get_database()
+
+    first = importer.import_csv_to_mongo(KEY, "bucket")
+    assert first["status"] == "imported"
+    assert len(os.listdir(tmp_path)) == 1
+    imported = weather_docs(db)
+
+    importer.clear_collections()
+
+    def no_download(**params):
+        raise AssertionError("un hit du cache ne télécharge pas le fichier")
+    connector.storage.get_object = no_download
+    second = importer.import_csv_to_mongo(KEY, "bucket")
+    assert second["status"] == "imported"
+    assert (second["rows"], second["weather"]) == (first["rows"], first["weather"])
+    assert "staging_read" in second["stages"]
+    assert weather_docs(db) == imported
+
+
+def test_cache_key_changes_with_staging_version(tmp_path, monkeypatch):
+    cache = StagingCache(str(tmp_path), file_format='bson')
+    staged = cache.open(KEY, '"etag"')
+    list(staged.docs(iter([("weather", {"_id": "a"}, {})]), {"rows": 1}))
+    staged.commit()
+    assert cache.open(KEY, '"etag"').hit
+    assert not cache.open(KEY, '"other"').hit
+
+    monkeypatch.setattr(staging_cache, 'STAGING_VERSION', staging_cache.STAGING_VERSION + 1)
+    assert not cache.open(KEY, '"etag"').hit
+
+
+def test_abort_discards_partial_recording(tmp_path):
+    cache = StagingCache(str(tmp_path), file_format='bson')
+    staged = cache.open(KEY, '"etag"')
+    docs = staged.docs(iter([("weather", {"_id": index}, {}) for index in range(3)]), {"rows": 3})
+    next(docs)
+    staged._flush()
+    staged.abort()
+    assert os.listdir(tmp_path) == []
+    assert cache.open(KEY, '"etag"') is not None and not cache.open(KEY, '"etag"').hit
+
+
+def test_evict_removes_least_recently_used_files(tmp_path):
+    cache = StagingCache(str(tmp_path), file_format='bson')
+    for etag, used_at in (('"a"', 10), ('"b"', 30), ('"c"', 20)):
+        staged = cache.open(KEY, etag)
+        list(staged.docs(iter([("weather", {"_id": etag}, {})]), {"rows": 1}))
+        staged.commit()
+        os.utime(staged.path, (used_at, used_at))
+
+    cache.max_bytes = os.path.getsize(cache.path(KEY, '"b"')) + os.path.getsize(cache.path(KEY, '"c"'))
+    assert cache.evict() == 1
+    assert [cache.open(KEY, etag).hit for etag in ('"a"', '"b"', '"c"')] == [False, True, True]
@@ -0,0 +1,47 @@
+from station_manager import StationRegistry
+
+
+def station(station_id, name, latitude=50.95, longitude=3.1, source="fileA"):
+    return {"id": station_id, "name": name, "latitude": latitude, "longitude": longitude,
+            "source_file": source}
+
+
+def test_upsert_many_writes_only_new_or_changed_stations(db):
+    collection = db['stations']
+    registry = StationRegistry(collection, ttl=0)
+    summary = registry.upsert_many([
+        (station("IICHTE19", "Ichtegem"), "ligne 1"),
+        (station("ILAMAD25", "La Madeleine", 50.66, 3.07), "ligne 2"),
+        (station("IICHTE19", "WeerstationBS"), "ligne 3")  # répétée : la dernière version l'emporte
+    ])
+    assert (summary["inserted"], summary["updated"], summary["unchanged"]) == (2, 0, 0)
+    assert collection.count_documents({}) == 2
+    assert collection.find_one({"id": "IICHTE19"})["name"] == "WeerstationBS"
+    assert collection.find_one({"id": "IICHTE19"})["location"] == {"type": "Point", "coordinates": [3.1, 50.95]}
+
+    version = registry.version
+    writes = []
+    original = collection.bulk_write
+    collection.bulk_write = lambda requests, **kwargs: writes.append(len(requests)) or original(requests, **kwargs)
+    summary = registry.upsert_many([
+        (station("IICHTE19", "WeerstationBS", source="fileB"), "ligne 1"),
+        (station("ILAMAD25", "La Madeleine (FR)", 50.66, 3.07), "ligne 2")
+    ])
+    assert (summary["inserted"], summary["updated"], summary["unchanged"]) == (0, 1, 1)
+    assert writes == [1]
+    assert registry.version > version
+    # Champ fixé à la création : non réécrit
+    assert collection.find_one({"id": "IICHTE19"})["source_file"] == "fileA"
+    assert registry.get("ILAMAD25")["name"] == "La Madeleine (FR)"
+
+
+def test_registry_serves_reads_from_memory_until_invalidated(db):
+    collection = db['stations']
+    collection.insert_one(station("07015", "Lille-Lesquin", 50.57, 3.1))
+    registry = StationRegistry(collection, ttl=0)
+    assert registry.get("07015")["name"] == "Lille-Lesquin"
+
+    collection.update_one({"id": "07015"}, {"$set": {"name": "Lille"}})
+    assert registry.get("07015")["name"] == "Lille-Lesquin"
+    registry.invalidate()
+    assert registry.get("07015")["name"] == "Lille"
@@ -0,0 +1,58 @@
+import os
+
+import storage
+from storage import LocalStorage
+
+
+def write_tree(root, keys):
+    for key in keys:
+        path = root / key
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(key.encode())
+
+
+def listed_keys(backend, page_size, prefix=''):
+    keys, params = [], {"Prefix": prefix, "MaxKeys": page_size}
+    while True:
+        page = backend.list_objects_v2(**params)
+        keys += [obj['Key'] for obj in page['Contents']]
+        if not page['IsTruncated']:
+            return keys
+        params["ContinuationToken"] = page['NextContinuationToken']
+
+
+def test_derived_and_raw_duplicates_are_not_listed(tmp_path):
+    write_tree(tmp_path, [
+        "Clean_data/Weather+Underground+-+Ichtegem,+BE_with_date.xlsx",
+        "Clean_data/Weather+Underground+-+La+Madeleine,+FR_with_date.xlsx",
+        "Weather+Underground+-+Ichtegem,+BE.xlsx",
+        "Weather+Underground+-+La+Madeleine,+FR.xlsx",
+        "WeatherBE/2025_07_06_1751818021048_0.csv",
+        "StationsMeteorologiques.json",
+    ])
+
+    assert listed_keys(LocalStorage(tmp_path), 1000) == [
+        "StationsMeteorologiques.json",
+        "Weather+Underground+-+La+Madeleine,+FR.xlsx",
+        "WeatherBE/2025_07_06_1751818021048_0.csv",
+    ]
+
+
+def test_directory_is_walked_once_per_listing(tmp_path, monkeypatch):
+    keys = [f"WeatherBE/{index:03d}.csv" for index in range(25)] + ["WeatherFR/000.csv"]
+    write_tree(tmp_path, keys)
+    walks, os_walk = [], os.walk
+
+    def walk(top):
+        walks.append(top)
+        return os_walk(top)
+    monkeypatch.setattr(storage.os, "walk", walk)
+    backend = LocalStorage(tmp_path)
+
+    assert listed_keys(backend, 4) == keys
+    assert listed_keys(backend, 4, prefix="WeatherBE/") == keys[:25]
+    assert len(walks) == 2
+    # Reprise après une clé (checkpoint) : nouveau listing
+    page = backend.list_objects_v2(StartAfter="WeatherBE/023.csv", MaxKeys=4)
+    assert [obj['Key'] for obj in page['Contents']] == keys[24:]
+    assert len(walks) == 3
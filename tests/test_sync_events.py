@@ -0,0 +1,169 @@
+import json
+import threading
+import time
+
+import pytest
+
+from sync_events import EventDrivenSync, EventSource, MemoryEventSource, SqsEventSource
+
+
+class FakeManifest:
+    def __init__(self, entries=None):
+        self.stored = entries or {}
+
+    def entries(self, keys):
+        return {key: self.stored[key] for key in keys if key in self.stored}
+
+
+class FakeImporter:
+    def __init__(self, entries=None):
+        self.manifest = FakeManifest(entries)
+
+
+class FakeMonitor:
+    """S3SyncMonitor réduit à ce qu'utilise EventDrivenSync."""
+
+    def __init__(self, entries=None, failing=()):
+        self.importer = FakeImporter(entries)
+        self.failing = set(failing)
+        self.imported = []
+        self.reconciled = []
+        self.imported_event = threading.Event()
+
+    def import_files(self, keys):
+        self.imported.append(list(keys))
+        self.imported_event.set()
+        return [{"key": key, "status": "error" if key in self.failing else "imported"} for key in keys]
+
+    def update_last_sync_time(self):
+        pass
+
+    def report_cycle(self, results):
+        pass
+
+    def sync_new_files(self, full_listing=False):
+        self.reconciled.append(full_listing)
+
+
+def make_sync(monitor=None, **options):
+    source = MemoryEventSource()
+    options = {"debounce": 5, "max_wait": 60, "max_batch": 3, "reconcile_interval": 3600, **options}
+    return EventDrivenSync(monitor or FakeMonitor(), source, **options), source
+
+
+def test_event_source_is_abstract():
+    with pytest.raises(TypeError):
+        EventSource()
+
+
+def test_debounce_and_max_wait():
+    sync, source = make_sync()
+    source.publish("WeatherBE/a.csv")
+    sync.add(source.receive(0))
+    # Horodatages exacts en flottant : t + 60 - t vaut 60 (pas 59.999...)
+    sync.first_event = sync.last_event = 1000.0
+    assert not sync.ready(1004.9)
+    assert sync.ready(1005.0)
+
+    # Des événements continus repoussent le debounce, pas max_wait
+    sync.last_event = 1058.0
+    assert not sync.ready(1059.0)
+    assert sync.ready(1060.0)
+
+
+def test_max_batch_and_same_key_coalescing():
+    sync, source = make_sync()
+    for key in ("WeatherBE/a.csv", "WeatherBE/a.csv", "WeatherFR/b.csv"):
+        source.publish(key)
+    sync.add(source.receive(0))
+    assert len(sync.pending) == 2
+    assert not sync.ready(sync.last_event)
+
+    source.publish("StationsMeteorologiques/c.json")
+    sync.add(source.receive(0))
+    assert sync.ready(sync.last_event)
+
+
+def test_unsupported_files_are_acked_without_import():
+    sync, source = make_sync()
+    source.publish("WeatherBE/readme.txt")
+    sync.add(source.receive(0))
+    assert sync.pending == {}
+    assert [event["key"] for event in source.acked] == ["WeatherBE/readme.txt"]
+
+
+def test_flush_skips_already_imported_etag_and_acks_only_successes():
+    monitor = FakeMonitor(
+        entries={"WeatherBE/a.csv": {"etag": '"v1"', "status": "imported"}},
+        failing={"WeatherFR/b.csv"}
+    )
+    sync, source = make_sync(monitor)
+    source.publish("WeatherBE/a.csv", etag="v1")      # notification redélivrée
+    source.publish("WeatherFR/b.csv", etag="v1")      # import en échec
+    source.publish("WeatherFR/c.csv", etag="v2")
+    sync.add(source.receive(0))
+
+    results = sync.flush()
+    assert monitor.imported == [["WeatherFR/b.csv", "WeatherFR/c.csv"]]
+    assert [result["status"] for result in results] == ["error", "imported"]
+    assert sorted(event["key"] for event in source.acked) == ["WeatherBE/a.csv", "WeatherFR/c.csv"]
+    assert sync.pending == {}
+
+
+def test_run_imports_after_debounce_and_flushes_on_stop():
+    monitor = FakeMonitor()
+    sync, source = make_sync(monitor, debounce=0.05)
+    thread = threading.Thread(target=sync.run)
+    thread.start()
+    try:
+        source.publish("WeatherBE/a.csv")
+        assert monitor.imported_event.wait(5)
+    finally:
+        sync.max_receive_wait = 0.05
+        sync.stop()
+        source.publish("WeatherBE/ignored.txt")
+        thread.join(5)
+    assert not thread.is_alive()
+    assert monitor.imported == [["WeatherBE/a.csv"]]
+
+
+class FakeSqs:
+    def __init__(self, messages):
+        self.messages = messages
+        self.deleted = []
+
+    def receive_message(self, **params):
+        messages, self.messages = self.messages, []
+        return {"Messages": messages}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self.deleted.extend(entry["ReceiptHandle"] for entry in Entries)
+
+
+def s3_record(key, etag, bucket="weather", event="ObjectCreated:Put"):
+    return {"eventName": event, "s3": {"bucket": {"name": bucket}, "object": {"key": key, "eTag": etag}}}
+
+
+def test_sqs_source_parses_sns_envelope_and_deletes_after_all_acks():
+    notification = {"Records": [s3_record("WeatherBE/2025+07+06.csv", "e1"), s3_record("WeatherFR/b.csv", "e2"),
+                                s3_record("WeatherFR/other.csv", "e3", bucket="other")]}
+    messages = [
+        {"MessageId": "1", "ReceiptHandle": "h1",
+         "Body": json.dumps({"Type": "Notification", "Message": json.dumps(notification)})},
+        {"MessageId": "2", "ReceiptHandle": "h2", "Body": json.dumps({"Event": "s3:TestEvent"})},
+        {"MessageId": "3", "ReceiptHandle": "h3", "Body": "pas du json"}
+    ]
+    sqs = FakeSqs(messages)
+    source = SqsEventSource(sqs, "queue", s3_bucket="weather")
+
+    events = source.receive(1)
+    assert [(event["key"], event["etag"]) for event in events] == [
+        ("WeatherBE/2025 07 06.csv", '"e1"'), ("WeatherFR/b.csv", '"e2"')
+    ]
+    # Événement de test et message illisible : supprimés aussitôt
+    assert sqs.deleted == ["h2", "h3"]
+
+    source.ack(events[:1])
+    assert sqs.deleted == ["h2", "h3"]
+    source.ack(events[1:])
+    assert sqs.deleted == ["h2", "h3", "h1"]
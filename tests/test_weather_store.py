@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import weather_store
+from rollups import RollupUpdater
+from weather_store import (BucketWriter, TimeSeriesWriter, _ReadingWriter, bucket_id, readings_between,
+                           weather_collection)
+
+START = datetime(2025, 7, 6, 10, 0)
+END = START + timedelta(days=1)
+
+
+def readings(db, mode):
+    return sorted(readings_between(db, START, END, mode=mode), key=lambda reading: reading["dh_utc"])
+
+
+def test_reading_writer_is_abstract(db):
+    with pytest.raises(TypeError):
+        _ReadingWriter(db[weather_collection('buckets')])
+
+
+@pytest.mark.parametrize("writer_class, mode", [(BucketWriter, 'buckets'), (TimeSeriesWriter, 'timeseries')])
+def test_reimport_replaces_stored_values(db, make_weather_doc, monkeypatch, writer_class, mode):
+    monkeypatch.setattr(weather_store, 'WEATHER_STORAGE_MODE', mode)
+    collection = db[weather_collection(mode)]
+    rollups = RollupUpdater(db)
+    times = [START + timedelta(minutes=5 * i) for i in range(3)]
+
+    writer = writer_class(collection, on_written=rollups.apply)
+    for i, dh_utc in enumerate(times):
+        writer.add(make_weather_doc("IICHTE19", dh_utc, 18.0 + i))
+    assert writer.close()["inserted"] == 3
+
+    writer = writer_class(collection, on_written=rollups.apply)
+    writer.add(make_weather_doc("IICHTE19", times[1], 100.0, source="fileB"))
+    summary = writer.close()
+    assert (summary["inserted"], summary["updated"], summary["failed"]) == (0, 1, 0)
+
+    stored = readings(db, mode)
+    assert [reading["temperature"] for reading in stored] == [18.0, 100.0, 20.0]
+    assert [reading["source_file"] for reading in stored] == ["fileA", "fileB", "fileA"]
+
+    daily = db['weather_daily'].find_one()
+    assert (daily["samples"], daily["temperature_max"], daily["temperature_sum"]) == (3, 100.0, 138.0)
+
+
+def test_bucket_sources_are_kept_per_reading(db, make_weather_doc):
+    collection = db[weather_collection('buckets')]
+    first = BucketWriter(collection)
+    second = BucketWriter(collection)
+    first.add(make_weather_doc("IICHTE19", START, 18.0, source="fileA"))
+    second.add(make_weather_doc("IICHTE19", START + timedelta(minutes=5), 19.0, source="fileB"))
+    first.close()
+    second.close()
+
+    bucket = collection.find_one({"_id": bucket_id("IICHTE19", START)})
+    assert bucket["count"] == 2
+    assert bucket["values"]["source"] == ["fileA", "fileB"]
+    assert [reading["source_file"] for reading in readings(db, 'buckets')] == ["fileA", "fileB"]
+
+
+def test_bucket_concurrent_append_is_replayed(db, make_weather_doc):
+    collection = db[weather_collection('buckets')]
+    writer = BucketWriter(collection)
+    late = make_weather_doc("IICHTE19", START, 18.0, source="fileA")
+    latest = {("IICHTE19", START): (late, {"row": 1})}
+    # État lu avant qu'un autre import n'ajoute la même mesure
+    existing = writer._existing(latest)
+
+    other = BucketWriter(collection)
+    other.add(make_weather_doc("IICHTE19", START, 17.0, source="fileB"))
+    other.close()
+
+    created, replaced, errors = writer._write(list(latest.values()), existing, 1)
+    assert (len(created), len(replaced), errors) == (0, 1, [])
+    bucket = collection.find_one({"_id": bucket_id("IICHTE19", START)})
+    assert bucket["times"] == [START]
+    assert bucket["count"] == 1
+    assert bucket["values"]["source"] == ["fileA"]
+    assert bucket["values"]["temperature"] == [18.0]